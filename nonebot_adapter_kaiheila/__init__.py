@@ -9,8 +9,9 @@ Kaiheila 协议适配
 """
 
 from .event import *
-from .permission import *
 from .message import Message, MessageSegment
-from .utils import log, escape, unescape, _b2s
-from .bot import Bot, _check_at_me, _check_nickname, _check_reply, _handle_api_result
-from .exception import CQHTTPAdapterException, ApiNotAvailable, ActionFailed, NetworkError
+from .card import Card, CardTemplate, var
+from .utils import log, escape, unescape
+from .shard import Supervisor
+from .bot import Bot, _check_addressing, _check_reply, _handle_api_result
+from .exception import KaiheilaAdapterException, ApiNotAvailable, ActionFailed, NetworkError
@@ -0,0 +1,212 @@
+from typing import Any, List, Type, Generic, TypeVar, Optional
+
+from pydantic import BaseModel, Field
+from pydantic.generics import GenericModel
+
+from .event import Role, User, Guild, Reply, Emoji, Channel
+
+T = TypeVar("T")
+M = TypeVar("M", bound=BaseModel)
+
+
+class Meta(BaseModel):
+    page: Optional[int] = None
+    page_total: Optional[int] = None
+    page_size: Optional[int] = None
+    total: Optional[int] = None
+
+
+class Page(GenericModel, Generic[T]):
+    """分页列表接口的返回值"""
+    items: List[T] = []
+    meta: Optional[Meta] = None
+
+
+class GuildUserList(Page[User]):
+    user_count: Optional[int] = None
+    online_count: Optional[int] = None
+    offline_count: Optional[int] = None
+
+
+class Reaction(BaseModel):
+    emoji: Emoji
+    count: Optional[int] = None
+    me: Optional[bool] = None
+
+
+class MessageDetail(BaseModel):
+    """
+    ``/message/view``, ``/message/list`` 返回的消息
+    https://developer.kaiheila.cn/doc/http/message
+    """
+    id_: str = Field(alias="id")
+    type_: Optional[int] = Field(None, alias="type")
+    content: Optional[str] = None
+    author: Optional[User] = None
+    mention: Optional[List[str]] = None
+    mention_all: Optional[bool] = None
+    mention_roles: Optional[List[int]] = None
+    mention_here: Optional[bool] = None
+    quote: Optional[Reply] = None
+    reactions: Optional[List[Reaction]] = None
+    create_at: Optional[int] = None
+    updated_at: Optional[int] = None
+
+    class Config:
+        extra = "allow"
+
+
+class MessageCreateResult(BaseModel):
+    msg_id: str
+    msg_timestamp: Optional[int] = None
+    nonce: Optional[str] = None
+
+
+class Gateway(BaseModel):
+    url: str
+
+
+class KaiheilaAPI:
+    """
+    开黑啦 HTTP 接口的类型化封装，方法名为接口路径，如 ``/guild/user-list`` -> ``guild_user_list``。
+    未列出的接口仍可以通过 ``call_api`` 调用
+    https://developer.kaiheila.cn/doc/http
+    """
+
+    async def _api(self, endpoint: str, model: Optional[Type[M]] = None, method: str = "GET", **fields) -> Any:
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if method == "GET":
+            data = await self.call_api(endpoint, method=method, params=fields)
+        else:
+            data = await self.call_api(endpoint, method=method, json=fields)
+        if model is None or data is None:
+            return data
+        return self._parse_model(model, data)
+
+    # 用户
+    async def user_me(self) -> User:
+        return await self._api("/user/me", User)
+
+    async def user_view(self, user_id: str, guild_id: Optional[str] = None) -> User:
+        return await self._api("/user/view", User, user_id=user_id, guild_id=guild_id)
+
+    # 服务器
+    async def guild_list(self, page: Optional[int] = None, page_size: Optional[int] = None) -> Page[Guild]:
+        return await self._api("/guild/list", Page[Guild], page=page, page_size=page_size)
+
+    async def guild_view(self, guild_id: str) -> Guild:
+        return await self._api("/guild/view", Guild, guild_id=guild_id)
+
+    async def guild_user_list(self,
+                              guild_id: str,
+                              channel_id: Optional[str] = None,
+                              search: Optional[str] = None,
+                              role_id: Optional[int] = None,
+                              mobile_verified: Optional[int] = None,
+                              active_time: Optional[int] = None,
+                              joined_at: Optional[int] = None,
+                              page: Optional[int] = None,
+                              page_size: Optional[int] = None) -> GuildUserList:
+        return await self._api("/guild/user-list", GuildUserList, guild_id=guild_id, channel_id=channel_id,
+                               search=search, role_id=role_id, mobile_verified=mobile_verified,
+                               active_time=active_time, joined_at=joined_at, page=page, page_size=page_size)
+
+    async def guild_nickname(self, guild_id: str, nickname: Optional[str] = None, user_id: Optional[str] = None):
+        await self._api("/guild/nickname", method="POST", guild_id=guild_id, nickname=nickname, user_id=user_id)
+
+    async def guild_leave(self, guild_id: str):
+        await self._api("/guild/leave", method="POST", guild_id=guild_id)
+
+    async def guild_kickout(self, guild_id: str, target_id: str):
+        await self._api("/guild/kickout", method="POST", guild_id=guild_id, target_id=target_id)
+
+    # 服务器角色
+    async def guild_role_list(self, guild_id: str, page: Optional[int] = None,
+                              page_size: Optional[int] = None) -> Page[Role]:
+        return await self._api("/guild-role/list", Page[Role], guild_id=guild_id, page=page, page_size=page_size)
+
+    async def guild_role_grant(self, guild_id: str, user_id: str, role_id: int):
+        await self._api("/guild-role/grant", method="POST", guild_id=guild_id, user_id=user_id, role_id=role_id)
+
+    async def guild_role_revoke(self, guild_id: str, user_id: str, role_id: int):
+        await self._api("/guild-role/revoke", method="POST", guild_id=guild_id, user_id=user_id, role_id=role_id)
+
+    # 频道
+    async def channel_list(self, guild_id: str, type_: Optional[int] = None, page: Optional[int] = None,
+                           page_size: Optional[int] = None) -> Page[Channel]:
+        return await self._api("/channel/list", Page[Channel], guild_id=guild_id, type=type_, page=page,
+                               page_size=page_size)
+
+    async def channel_view(self, target_id: str) -> Channel:
+        return await self._api("/channel/view", Channel, target_id=target_id)
+
+    async def channel_create(self,
+                             guild_id: str,
+                             name: str,
+                             type_: Optional[int] = None,
+                             parent_id: Optional[str] = None,
+                             limit_amount: Optional[int] = None,
+                             voice_quality: Optional[int] = None) -> Channel:
+        return await self._api("/channel/create", Channel, "POST", guild_id=guild_id, name=name, type=type_,
+                               parent_id=parent_id, limit_amount=limit_amount, voice_quality=voice_quality)
+
+    async def channel_delete(self, channel_id: str):
+        await self._api("/channel/delete", method="POST", channel_id=channel_id)
+
+    # 频道消息
+    async def message_list(self,
+                           target_id: str,
+                           msg_id: Optional[str] = None,
+                           pin: Optional[int] = None,
+                           flag: Optional[str] = None,
+                           page_size: Optional[int] = None) -> Page[MessageDetail]:
+        return await self._api("/message/list", Page[MessageDetail], target_id=target_id, msg_id=msg_id, pin=pin,
+                               flag=flag, page_size=page_size)
+
+    async def message_view(self, msg_id: str) -> MessageDetail:
+        return await self._api("/message/view", MessageDetail, msg_id=msg_id)
+
+    async def message_create(self,
+                             target_id: str,
+                             content: str,
+                             type_: Optional[int] = None,
+                             quote: Optional[str] = None,
+                             nonce: Optional[str] = None,
+                             temp_target_id: Optional[str] = None) -> MessageCreateResult:
+        return await self._api("/message/create", MessageCreateResult, "POST", target_id=target_id,
+                               content=content, type=type_, quote=quote, nonce=nonce, temp_target_id=temp_target_id)
+
+    async def message_update(self, msg_id: str, content: str, quote: Optional[str] = None,
+                             temp_target_id: Optional[str] = None):
+        await self._api("/message/update", method="POST", msg_id=msg_id, content=content, quote=quote,
+                        temp_target_id=temp_target_id)
+
+    async def message_delete(self, msg_id: str):
+        await self._api("/message/delete", method="POST", msg_id=msg_id)
+
+    async def message_add_reaction(self, msg_id: str, emoji: str):
+        await self._api("/message/add-reaction", method="POST", msg_id=msg_id, emoji=emoji)
+
+    async def message_delete_reaction(self, msg_id: str, emoji: str, user_id: Optional[str] = None):
+        await self._api("/message/delete-reaction", method="POST", msg_id=msg_id, emoji=emoji, user_id=user_id)
+
+    # 私聊消息
+    async def direct_message_create(self,
+                                    content: str,
+                                    target_id: Optional[str] = None,
+                                    chat_code: Optional[str] = None,
+                                    type_: Optional[int] = None,
+                                    quote: Optional[str] = None,
+                                    nonce: Optional[str] = None) -> MessageCreateResult:
+        return await self._api("/direct-message/create", MessageCreateResult, "POST", content=content,
+                               target_id=target_id, chat_code=chat_code, type=type_, quote=quote, nonce=nonce)
+
+    async def direct_message_update(self, msg_id: str, content: str, quote: Optional[str] = None):
+        await self._api("/direct-message/update", method="POST", msg_id=msg_id, content=content, quote=quote)
+
+    async def direct_message_delete(self, msg_id: str):
+        await self._api("/direct-message/delete", method="POST", msg_id=msg_id)
+
+    # 网关
+    async def gateway_index(self, compress: bool = False) -> Gateway:
+        return await self._api("/gateway/index", Gateway, compress=int(compress))
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from .utils import log
+
+
+class AssetIndex:
+    """
+    已上传媒体的内容哈希到资源 url 的索引，相同内容再次发送时不必重新上传
+    ``path`` 为空时只保存在内存中
+    https://developer.kaiheila.cn/doc/http/asset
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._assets: Dict[str, Dict[str, Any]] = {}
+        self._uploading: Dict[str, "asyncio.Future[str]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+        if path is not None and path.exists():
+            try:
+                self._assets = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                log("WARNING", f"Failed to load asset index {path}: {e!r}")
+
+    def get(self, digest: str) -> Optional[str]:
+        asset = self._assets.get(digest)
+        if asset is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytes_saved += asset.get("size", 0)
+        return asset["url"]
+
+    def save(self, digest: str, url: str, size: int):
+        self.bytes_uploaded += size
+        self._assets[digest] = {"url": url, "size": size, "updated_at": time.time()}
+        self._dump()
+
+    def uploading(self, digest: str) -> Optional["asyncio.Future[str]"]:
+        """同一内容正在上传时返回其 Future，避免并发重复上传"""
+        return self._uploading.get(digest)
+
+    def begin(self, digest: str) -> "asyncio.Future[str]":
+        future = asyncio.get_running_loop().create_future()
+        self._uploading[digest] = future
+        return future
+
+    def end(self, digest: str):
+        self._uploading.pop(digest, None)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._assets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "uploading": len(self._uploading),
+            "bytes_uploaded": self.bytes_uploaded,
+            "bytes_saved": self.bytes_saved
+        }
+
+    def _dump(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(self._assets), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log("WARNING", f"Failed to save asset index {self.path}: {e!r}")
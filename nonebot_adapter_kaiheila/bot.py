@@ -1,8 +1,11 @@
 import re
 import sys
-import hmac
+import zlib
+import heapq
 import asyncio
-from typing import Any, Dict, Union, List, Optional, TYPE_CHECKING
+from functools import lru_cache
+from typing import (Any, Dict, Set, Type, Tuple, Union, List, Pattern, Callable, Optional, FrozenSet, Awaitable,
+                    AsyncIterator, TypeVar, TYPE_CHECKING)
 
 try:
     import ujson as json
@@ -10,39 +13,53 @@ except ImportError:
     import json
 
 import aiohttp
+from yarl import URL
+from pydantic import BaseModel
 from nonebot.log import logger
 from nonebot.typing import overrides
 from nonebot.message import handle_event
 from nonebot.adapters import Bot as BaseBot
 from nonebot.utils import escape_tag, DataclassEncoder
-from nonebot.drivers import WebSocket, ForwardDriver
+from nonebot.drivers import WebSocket, ForwardDriver, HTTPRequest, HTTPResponse
 from nonebot.drivers.aiohttp import WebSocketSetup
 
-from .utils import log, escape
-from .config import Config as KaiheilaConfig
+from .utils import log, ensure_url
+from .compress import Inflater
+from .decoder import FastDecodeError, json_loads, construct_model
+from .session import SessionStore
+from .asset import AssetIndex
+from .pool import HTTPPool
+from .webhook import WebhookDecoder, WebhookError
+from .dedup import Deduplicator, event_key
+from .ingest import IngestQueue, lane_of
+from .coalesce import Coalescer
+from .paginate import paginate
+from .api import KaiheilaAPI
+from .shard import current_shard, shard_of, shard_path, start_reporter
+from .heartbeat import Heartbeat
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .scheduler import SendScheduler
+from .cache import StateCache, MessageCache
+from .config import BotConfig, Config as KaiheilaConfig
 from .message import Message, MessageSegment
-from .event import Reply, Event, MessageEvent, get_event_model
+from .event import (User, Guild, Reply, Event, Channel, LazyExtra, MessageEvent, DeletedMessageEvent, DeletedPrivateMessageEvent,
+                    MESSAGE_SUB_TYPES, get_event_model, get_notice_type)
 from .exception import NetworkError, ApiNotAvailable, ActionFailed
 
 if TYPE_CHECKING:
     from nonebot.config import Config
-    from nonebot.drivers import Driver, WebSocket
+    from nonebot.drivers import Driver, WebSocket, HTTPConnection
 
-
-def get_auth_bearer(access_token: Optional[str] = None) -> Optional[str]:
-    if not access_token:
-        return None
-    scheme, _, param = access_token.partition(" ")
-    if scheme.lower() not in ["bearer", "token"]:
-        raise RequestDenied(401, "Not authenticated")
-    return param
+M = TypeVar("M", bound=BaseModel)
 
 
 async def _check_reply(bot: "Bot", event: "Event"):
     """
     :说明:
 
-      检查消息中存在的回复，去除并赋值 ``event.reply``, ``event.to_me``
+      检查消息是否引用了其它消息，赋值 ``event.reply``, ``event.to_me``。
+      优先使用最近消息缓存与事件自带的引用信息，都没有时才通过 API 查询
 
     :参数:
 
@@ -52,39 +69,55 @@ async def _check_reply(bot: "Bot", event: "Event"):
     if not isinstance(event, MessageEvent):
         return
 
-    try:
-        index = list(map(lambda x: x.type == "reply",
-                         event.message)).index(True)
-    except ValueError:
+    quote = event.extra.quote
+    if quote is None:
         return
-    msg_seg = event.message[index]
+
+    async def load() -> Reply:
+        if quote.author is not None:  # 事件已带有完整的引用信息
+            return quote
+        if event.message_type == "private":
+            result = await bot.call_api("/direct-message/view",
+                                        params={"chat_code": event.extra.code, "msg_id": quote.id_})
+            result = result["items"][0] if "items" in result else result
+        else:
+            result = await bot.call_api("/message/view", params={"msg_id": quote.id_})
+        return Reply.parse_obj(result)
+
     try:
-        event.reply = Reply.parse_obj(await
-                                      bot.get_msg(message_id=msg_seg.data["id"]
-                                                  ))
+        event.reply = await bot.message_cache.fetch(quote.id_, _message_channel(event), load)
     except Exception as e:
         log("WARNING", f"Error when getting message reply info: {repr(e)}", e)
         return
-    # ensure string comparation
-    if str(event.reply.sender.user_id) == str(event.self_id):
+    me = bot.state.me
+    if me is not None and event.reply.author is not None and event.reply.author.id_ == me.id_:
         event.to_me = True
-    del event.message[index]
-    if len(event.message) > index and event.message[index].type == "at":
-        del event.message[index]
-    if len(event.message) > index and event.message[index].type == "text":
-        event.message[index].data["text"] = event.message[index].data[
-            "text"].lstrip()
-        if not event.message[index].data["text"]:
-            del event.message[index]
-    if not event.message:
-        event.message.append(MessageSegment.text(""))
-
-
-def _check_at_me(bot: "Bot", event: "Event"):
+
+
+def _message_channel(event: MessageEvent) -> str:
+    """消息缓存的分组，频道消息为频道 id，私聊为 chat_code"""
+    return (event.extra.code or event.author_id) if event.message_type == "private" else event.target_id
+
+
+@lru_cache(maxsize=16)
+def _addressing_regex(nicknames: FrozenSet[str]) -> Optional[Pattern[str]]:
     """
     :说明:
 
-      检查消息开头或结尾是否存在 @机器人，去除并赋值 ``event.to_me``
+      编译匹配消息开头昵称的正则，只在 ``nickname`` 配置变化时重新编译。@机器人 已被拆分为 mention 消息段，不在这里匹配
+    """
+    if not nicknames:
+        return None
+    nickname_regex = "|".join(map(re.escape, sorted(nicknames, key=len, reverse=True)))
+    return re.compile(rf"^(?P<nickname>{nickname_regex})[\s,，]*", re.IGNORECASE)
+
+
+async def _check_addressing(bot: "Bot", event: "Event"):
+    """
+    :说明:
+
+      一次判断消息是否与机器人有关：私聊、回复了机器人的消息、``extra.mention`` 中包含机器人、以 @机器人 或昵称开头，
+      赋值 ``event.to_me``，并原地去除消息开头的 @机器人 与昵称以及末尾的 @机器人
 
     :参数:
 
@@ -94,81 +127,111 @@ def _check_at_me(bot: "Bot", event: "Event"):
     if not isinstance(event, MessageEvent):
         return
 
-    # ensure message not empty
-    if not event.message:
-        event.message.append(MessageSegment.text(""))
+    # 连接后 start_state 与分发同时开始，最先到达的消息在这里等待 /user/me
+    me = await bot.state.get_me(bot)
+    me = me.id_ if me else None
+    await _check_reply(bot, event)
 
-    if event.message_type == "private":
+    if event.message_type == "private" or (me and me in (event.extra.mention or ())):
         event.to_me = True
-    else:
-        at_me_seg = MessageSegment.at(event.self_id)
 
-        # check the first segment
-        if event.message[0] == at_me_seg:
+    message = event.message
+    if me:
+        # 开头的 @机器人 已被拆分为 mention 消息段
+        while message and message[0].type == "mention" and message[0].data["user_id"] == me:
+            event.to_me = True
+            del message[0]
+            _strip_segment(message, 0, str.lstrip)
+        while message and message[-1].type == "mention" and message[-1].data["user_id"] == me:
+            event.to_me = True
+            del message[-1]
+            _strip_segment(message, -1, str.rstrip)
+    # ensure message not empty
+    if not message:
+        message.append(MessageSegment.text(""))
+        return
+
+    regex = _addressing_regex(frozenset(filter(None, bot.config.nickname)))
+    first_seg = message[0]
+    if regex is not None and first_seg.type in (1, 9):
+        content: str = first_seg.data["content"]
+        m = regex.match(content)
+        if m:  # 以昵称开头
             event.to_me = True
-            del event.message[0]
-            if event.message and event.message[0].type == "text":
-                event.message[0].data["text"] = event.message[0].data[
-                    "text"].lstrip()
-                if not event.message[0].data["text"]:
-                    del event.message[0]
-            if event.message and event.message[0] == at_me_seg:
-                del event.message[0]
-                if event.message and event.message[0].type == "text":
-                    event.message[0].data["text"] = event.message[0].data[
-                        "text"].lstrip()
-                    if not event.message[0].data["text"]:
-                        del event.message[0]
-
-        if not event.to_me:
-            # check the last segment
-            i = -1
-            last_msg_seg = event.message[i]
-            if last_msg_seg.type == "text" and \
-                    not last_msg_seg.data["text"].strip() and \
-                    len(event.message) >= 2:
-                i -= 1
-                last_msg_seg = event.message[i]
-
-            if last_msg_seg == at_me_seg:
-                event.to_me = True
-                del event.message[i:]
-
-        if not event.message:
-            event.message.append(MessageSegment.text(""))
-
-
-def _check_nickname(bot: "Bot", event: "Event"):
+            log("DEBUG", f"User is calling me {m.group('nickname')}")
+            first_seg.data["content"] = content[m.end():]
+
+
+def _strip_segment(message: Message, index: int, strip: Callable[[str], str]):
+    """去除 ``message[index]`` 文字两侧的空白，为空则删除该消息段"""
+    if not message or message[index].type not in (1, 9):
+        return
+    content = strip(message[index].data["content"])
+    if content:
+        message[index].data["content"] = content
+    else:
+        del message[index]
+
+
+def _complete_event_data(bot: "Bot", data: Dict[str, Any]) -> str:
     """
     :说明:
 
-      检查消息开头是否存在，去除并赋值 ``event.to_me``
+      为事件数据补上与 onebot 兼容的 ``post_type``, ``notice_type``/``message_type``, ``sub_type`` 与 ``self_id``
 
-    :参数:
+    :返回:
 
-      * ``bot: Bot``: Bot 对象
-      * ``event: Event``: Event 对象
+      - ``str``: 事件名，如 ``notice.channel.added_reaction``, ``message.group.kmarkdown``
     """
-    if not isinstance(event, MessageEvent):
-        return
+    data["self_id"] = bot.self_id
+    if data.get("type") == 255:  # 系统消息
+        sub_type = str(data["extra"]["type"])
+        notice_type = get_notice_type(sub_type) or "unknown"
+        data.update(post_type="notice", notice_type=notice_type, sub_type=sub_type)
+        return f"notice.{notice_type}.{sub_type}"
+    message_type = "private" if data.get("channel_type") == "PERSON" else "group"
+    sub_type = MESSAGE_SUB_TYPES.get(data.get("type"), str(data.get("type")))
+    data.update(post_type="message", message_type=message_type, sub_type=sub_type)
+    return f"message.{message_type}.{sub_type}"
+
+
+def _message_payloads(message: Message) -> List[Dict[str, Any]]:
+    """
+    :说明:
 
-    first_msg_seg = event.message[0]
-    if first_msg_seg.type != "text":
-        return
+      将 ``Message`` 转换为 ``/message/create`` 的请求体，开黑啦一条消息只能有一种类型，
+      相邻的文字、KMarkdown 与 @、表情等消息段合并为一条 KMarkdown 消息，其它消息段各自发送一条
 
-    first_text = first_msg_seg.data["text"]
-
-    nicknames = set(filter(lambda n: n, bot.config.nickname))
-    if nicknames:
-        # check if the user is calling me with my nickname
-        nickname_regex = "|".join(nicknames)
-        m = re.search(rf"^({nickname_regex})([\s,，]*|$)", first_text,
-                      re.IGNORECASE)
-        if m:
-            nickname = m.group(1)
-            log("DEBUG", f"User is calling me {nickname}")
-            event.to_me = True
-            first_msg_seg.data["text"] = first_text[m.end():]
+    :参数:
+
+      * ``message: Message``: 要发送的消息
+    """
+    payloads: List[Dict[str, Any]] = []
+    group: List[MessageSegment] = []
+    for seg in message:
+        if seg.is_kmarkdown():
+            group.append(seg)
+            continue
+        if group:
+            payloads.append(_kmarkdown_payload(group))
+            group = []
+        payloads.append({"type": seg.type, **seg.data})
+    if group:
+        payloads.append(_kmarkdown_payload(group))
+    return payloads
+
+
+def _kmarkdown_payload(group: List[MessageSegment]) -> Dict[str, Any]:
+    """将相邻的文字、KMarkdown 消息段合并为一条消息，全为纯文字时仍以文字消息发送"""
+    payload: Dict[str, Any] = {}
+    for seg in group:
+        if isinstance(seg.type, int):
+            payload.update(seg.data)  # quote, nonce 等参数
+    if all(seg.type == 1 for seg in group):
+        payload.update(type=1, content="".join(seg.data["content"] for seg in group))
+    else:
+        payload.update(type=9, content=Message(group).to_kmarkdown())
+    return payload
 
 
 def _handle_api_result(result: Optional[Dict[str, Any]]) -> Any:
@@ -225,65 +288,233 @@ class ResultStore:
             del cls._futures[seq]
 
 
-class Buffer(list):
+class Buffer:
     """
     sn排序缓冲区
     第一个收到的sn假定为开始的sn
+    乱序到达的帧存放在以 sn 为键的小根堆中，每帧入堆 O(log n)
     https://developer.kaiheila.cn/doc/websocket
+
+    :参数:
+
+      * ``max_depth: int``: 缓冲区最多暂存的帧数，超出后放弃等待缺失的 sn
+      * ``gap_timeout: Optional[float]``: 等待缺失 sn 的最长秒数，超时后跳过缺口继续投递，``None`` 表示一直等待
     """
 
-    def __init__(self):
-        super().__init__()
-        self.sn: int = None  # 已经收到的sn 包括这个
+    def __init__(self, max_depth: int = 1000, gap_timeout: Optional[float] = 5.):
+        self.sn: Optional[int] = None  # 已经收到的sn 包括这个
+        self.max_depth = max_depth
+        self.gap_timeout = gap_timeout
+        self._heap: List[Tuple[int, Dict[str, Any]]] = []
+        self._pending: Set[int] = set()  # 堆中已有的sn 用于去重
         self._queue = asyncio.Queue()
+        self._gap_timer: Optional[asyncio.TimerHandle] = None
+        self._gap_sn: Optional[int] = None  # 计时器正在等待的sn
+
+        self.received = 0  # 收到的带sn的帧
+        self.duplicated = 0  # 重复或过期的帧
+        self.gaps = 0  # 放弃等待的缺口数
+        self.skipped = 0  # 因放弃等待而跳过的sn数
+        self.resyncs = 0  # s=5 导致的重置次数
+        self.peak_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """当前暂存的乱序帧数"""
+        return len(self._heap)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sn": self.sn,
+            "depth": self.depth,
+            "peak_depth": self.peak_depth,
+            "received": self.received,
+            "duplicated": self.duplicated,
+            "gaps": self.gaps,
+            "skipped": self.skipped,
+            "resyncs": self.resyncs
+        }
+
+    def reset(self):
+        """清空缓冲区，下一个收到的sn重新作为开始的sn"""
+        self._cancel_gap_timer()
+        self._heap.clear()
+        self._pending.clear()
+        self.sn = None
 
     def add_result(self, result: Dict[str, Any]):
         if result["s"] == 5:  # reconnect, 要求客户端断开当前连接重新连接
-            self.clear()
-            self.sn = None
+            self.reset()
+            self.resyncs += 1
             return
         if "sn" not in result:  # 该字段并不一定有，只在s=0时有，与webhook一致，没有就不处理了 (自己处理不交给插件
             return
 
+        sn: int = result["sn"]
+        self.received += 1
         if self.sn is None:
-            self.sn = result["sn"]
+            self.sn = sn
             self._queue.put_nowait(result)
             return
-        if result["sn"] <= self.sn:
+        if sn <= self.sn or sn in self._pending:
+            self.duplicated += 1
             return
-        self.append(result)
-        self.sort(key=lambda x: x["sn"])
-        while self and self[0]["sn"] == self.sn + 1:
-            self._queue.put_nowait(self[0])
-            del self[0]
-            self.sn += 1
+        heapq.heappush(self._heap, (sn, result))
+        self._pending.add(sn)
+        self.peak_depth = max(self.peak_depth, len(self._heap))
+        self._drain()
+        if len(self._heap) > self.max_depth:
+            self._skip_gap()
+        self._update_gap_timer()
+
+    def _drain(self):
+        while self._heap and self._heap[0][0] == self.sn + 1:
+            sn, result = heapq.heappop(self._heap)
+            self._pending.discard(sn)
+            self._queue.put_nowait(result)
+            self.sn = sn
+
+    def _skip_gap(self):
+        """放弃等待堆顶之前缺失的sn"""
+        head = self._heap[0][0]
+        missing = head - self.sn - 1
+        self.gaps += 1
+        self.skipped += missing
+        log("WARNING", f"Give up waiting for sn {self.sn + 1}~{head - 1}, "
+                       f"{missing} frame(s) lost")
+        self.sn = head - 1
+        self._drain()
+
+    def _update_gap_timer(self):
+        if not self._heap or self.gap_timeout is None:
+            self._cancel_gap_timer()
+            return
+        if self._gap_timer is None or self._gap_sn != self.sn + 1:
+            self._cancel_gap_timer()
+            self._gap_sn = self.sn + 1
+            self._gap_timer = asyncio.get_event_loop().call_later(
+                self.gap_timeout, self._on_gap_timeout)
+
+    def _cancel_gap_timer(self):
+        if self._gap_timer is not None:
+            self._gap_timer.cancel()
+        self._gap_timer = None
+        self._gap_sn = None
+
+    def _on_gap_timeout(self):
+        self._gap_timer = None
+        if self._heap:
+            self._skip_gap()
+        self._update_gap_timer()
+
+    def close(self):
+        """停止投递，正在等待的 ``async for`` 会结束"""
+        self._cancel_gap_timer()
+        self._queue.put_nowait(None)
 
     def __aiter__(self):
         return self
 
     async def __anext__(self):
-        return await self._queue.get()
+        result = await self._queue.get()
+        if result is None:
+            raise StopAsyncIteration
+        return result
 
 
-class Bot(BaseBot):
+class Bot(BaseBot, KaiheilaAPI):
     """
     Kaiheila 协议 Bot 适配。继承属性参考 `BaseBot <./#class-basebot>`_ 。
     """
     kaiheila_config: KaiheilaConfig
-    client_session: aiohttp.ClientSession
+    session_store: SessionStore
+    asset_index: AssetIndex
+    http_pool: HTTPPool
+    webhook_decoder: WebhookDecoder
+    _webhook_bots: Dict[str, "Bot"] = {}  # webhook 模式下负责投递事件的 Bot 实例
+    _rate_limiters: Dict[str, RateLimiter] = {}
+    _retry_policies: Dict[str, RetryPolicy] = {}
+    _send_schedulers: Dict[str, SendScheduler] = {}
+    _states: Dict[str, StateCache] = {}
+    _message_caches: Dict[str, MessageCache] = {}
+    _deduplicators: Dict[str, Deduplicator] = {}
+    _ingest_queues: Dict[str, IngestQueue] = {}
+    _coalescers: Dict[str, Coalescer] = {}
+    _unconfirmed_gateways: Set[str] = set()  # 网关地址已给出但还没收到 hello 的 Bot
     base_url: str = "https://www.kaiheila.cn/api/v3"
 
     def __init__(self,
                  self_id: str,  # client_id
-                 *,
-                 websocket: Optional["WebSocket"] = None):
-
-        super().__init__(self_id, websocket=websocket)
-        self.token = None
-        self.client_secret = None
-        self.client_session = aiohttp.ClientSession(json_serialize=json.dumps)
-        self.session_id: str = None  # ws连接成功后由hello包给出
-        self.buffer = Buffer()
+                 request: "HTTPConnection"):
+
+        super().__init__(self_id, request)
+        bot_config = self._bot_config(self_id)
+        self.token: str = bot_config["token"]
+        self.client_secret: Optional[str] = bot_config.get("client_secret")
+        self.auth_headers = {"Authorization": f"Bot {self.token}"}
+        self.session_id: Optional[str] = None  # ws连接成功后由hello包给出
+        self.resuming = False  # 是否正在 resume 上一个会话
+        self.buffer = Buffer(self.kaiheila_config.buffer_max_depth,
+                             self.kaiheila_config.buffer_gap_timeout)
+        # 每个连接一个解压上下文，是否压缩由请求网关时的 compress 决定，不逐帧判断
+        self.inflater = Inflater() if self.kaiheila_config.compress else None
+        # 限速状态属于 token 而不是连接，重连后继续使用
+        self.rate_limiter = self._rate_limiters.setdefault(self_id, RateLimiter())
+        self.retry_policy = self._retry_policies.get(self_id)
+        if self.retry_policy is None:
+            self.retry_policy = self._retry_policies[self_id] = RetryPolicy(
+                self.kaiheila_config.api_max_retries,
+                self.kaiheila_config.api_backoff_base,
+                self.kaiheila_config.api_backoff_max,
+                self.kaiheila_config.api_breaker_threshold,
+                self.kaiheila_config.api_breaker_reset_timeout)
+        self.send_scheduler = self._send_schedulers.get(self_id)
+        if self.send_scheduler is None:
+            self.send_scheduler = self._send_schedulers[self_id] = SendScheduler(
+                self.kaiheila_config.send_concurrency,
+                self.kaiheila_config.send_lane_idle_timeout)
+        self.state = self._states.get(self_id)
+        if self.state is None:
+            self.state = self._states[self_id] = StateCache(
+                self.kaiheila_config.user_cache_size,
+                self.kaiheila_config.user_cache_ttl,
+                on_channel=self._sync_slow_mode)
+        self.message_cache = self._message_caches.get(self_id)
+        if self.message_cache is None:
+            self.message_cache = self._message_caches[self_id] = MessageCache(
+                self.kaiheila_config.message_cache_size,
+                self.kaiheila_config.message_cache_channels)
+        # 去重状态跨连接与 webhook 共享
+        self.deduplicator = self._deduplicators.get(self_id)
+        if self.deduplicator is None:
+            self.deduplicator = self._deduplicators[self_id] = Deduplicator(
+                self.kaiheila_config.dedup_window,
+                self.kaiheila_config.dedup_capacity,
+                self.kaiheila_config.dedup_false_positive_rate)
+        self.ingest_queue = self._ingest_queues.get(self_id)
+        if self.ingest_queue is None:
+            self.ingest_queue = self._ingest_queues[self_id] = IngestQueue(
+                self.kaiheila_config.ingest_workers,
+                self.kaiheila_config.ingest_max_depth,
+                tuple(self.kaiheila_config.ingest_shed_lanes))
+        self.coalescer = self._coalescers.get(self_id)
+        if self.coalescer is None and self.kaiheila_config.coalesce_window:
+            self.coalescer = self._coalescers[self_id] = Coalescer(self.kaiheila_config.coalesce_window,
+                                                                   self.kaiheila_config.coalesce_max_pending)
+        self.heartbeat = Heartbeat(self,
+                                   self.kaiheila_config.heartbeat_interval,
+                                   self.kaiheila_config.heartbeat_timeout,
+                                   self.kaiheila_config.heartbeat_max_missed)
+        checkpoint = self.session_store.get(self_id)
+        if checkpoint:  # setup 已经带上 resume 参数 从检查点的 sn 继续
+            self.session_id = checkpoint["session_id"]
+            self.buffer.sn = checkpoint["sn"]
+            self.resuming = True
+
+    def _sync_slow_mode(self, channel: Channel):
+        """频道信息中的 ``slow_mode`` 为毫秒"""
+        self.send_scheduler.set_slow_mode(channel.id_, channel.slow_mode / 1000 if channel.slow_mode else None)
 
     @property
     @overrides(BaseBot)
@@ -296,156 +527,440 @@ class Bot(BaseBot):
     @staticmethod
     async def start_heartbeat(bot: "Bot"):
         """
-        每30s一次心跳
+        心跳，pong 超时则断开重连
+        :return:
+        """
+        await bot.heartbeat.run()
+
+    @staticmethod
+    async def start_dispatch(bot: "Bot"):
+        """
+        按sn顺序从缓冲区取出事件并处理，连接断开后退出
+        :return:
+        """
+        async for frame in bot.buffer:
+            await bot._handle_event_data(frame["d"])
+
+    @staticmethod
+    async def start_state(bot: "Bot"):
+        """
+        首次连接时获取机器人自身的用户信息（判断 @机器人 与回复需要），
+        启用状态缓存时再通过列表接口填充，之后由事件增量更新
         :return:
         """
-        while not bot.request.closed:
-            await bot.request.send(json.dumps({
-                "s": 2,
-                "sn": bot.buffer.sn  # 客户端目前收到的最新的消息 sn
-            }))
-            await asyncio.sleep(30)  # todo 心跳超時設計 怎么设计 加入ResultStore吗
+        await bot.state.get_me(bot)
+        if not bot.kaiheila_config.state_cache or bot.state.ready:
+            return
+        try:
+            await bot.state.fill(bot,
+                                 bot.kaiheila_config.state_fill_concurrency,
+                                 bot.kaiheila_config.state_fill_max_guilds)
+        except Exception as e:
+            log("ERROR", "Failed to fill state cache", e)
 
     @staticmethod
-    async def get_gateway(token: str) -> str:
-        async with aiohttp.ClientSession(json_serialize=json.dumps) as session:
-            async with session.get("https://www.kaiheila.cn/api/v3/gateway/index",
-                                   headers={"Authorization": f"Bot {token}"}) as resp:
-                result = await resp.json()
-                return _handle_api_result(result)["url"]
+    async def stop_dispatch(bot: "Bot"):
+        bot.buffer.close()
+
+    @property
+    def client_session(self) -> aiohttp.ClientSession:
+        """所有 Bot 共用连接池中的 ``ClientSession``"""
+        return self.http_pool.session
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """各组件的运行统计，``http_pool`` 与 ``assets`` 为所有 Bot 共用"""
+        return {
+            "buffer": self.buffer.stats,
+            "inflater": self.inflater.stats if self.inflater else None,
+            "heartbeat": self.heartbeat.stats,
+            "rate_limit": self.rate_limiter.stats,
+            "retry": self.retry_policy.stats,
+            "send": self.send_scheduler.stats,
+            "state": self.state.stats,
+            "messages": self.message_cache.stats,
+            "dedup": self.deduplicator.stats,
+            "ingest": self.ingest_queue.stats,
+            "coalesce": self.coalescer.stats if self.coalescer else None,
+            "assets": self.asset_index.stats,
+            "http_pool": self.http_pool.stats
+        }
+
+    @classmethod
+    def _bot_config(cls, self_id: str) -> BotConfig:
+        for bot in cls.kaiheila_config.bots:
+            if bot["client_id"] == self_id:
+                return bot
+        raise ValueError(f"Bot {self_id} is not configured")
+
+    @classmethod
+    async def get_gateway(cls, token: str, compress: bool = False) -> str:
+        async with cls.http_pool.session.get(f"{cls.base_url}/gateway/index",
+                                             params={"compress": int(compress)},
+                                             headers={"Authorization": f"Bot {token}"}) as resp:
+            result = await resp.json(loads=json.loads)
+            return _handle_api_result(result)["url"]
 
     @classmethod
     def register(cls, driver: "Driver", config: "Config"):
         super().register(driver, config)
         cls.kaiheila_config = KaiheilaConfig(**config.dict())
-        tasks = [asyncio.create_task(cls.get_gateway(bot["token"])) for bot in cls.kaiheila_config.bots]
-        ws_urls: List[str] = asyncio.get_event_loop().run_until_complete(asyncio.gather(*tasks))
-        # todo 检查ws_url的正确性
-        for index, bot in enumerate(cls.kaiheila_config.bots):
-            driver.setup_websocket(
-                WebSocketSetup(adapter="kaiheila",
-                               self_id=bot["client_id"],
-                               url=ws_urls[index],
-                               headers={"Authorization": f"Bot {bot['token']}"},
-                               http_version="1.1",
-                               reconnect_interval=5))
-
-        async def set_bot_attr(bot: Bot):
-            data: dict = filter(lambda x: x["client_id"] == bot.self_id, cls.kaiheila_config.bots)[0]
-            bot.token = data["token"]
-            bot.client_secret = data["client_secret"]
-
-        driver.on_bot_connect(set_bot_attr)
+        shard = current_shard()
+        bots = cls.kaiheila_config.bots
+        session_file = cls.kaiheila_config.session_file
+        asset_index_file = cls.kaiheila_config.asset_index_file
+        if shard is not None:
+            shard_id, shard_count = shard
+            bots = [bot for bot in bots if shard_of(bot, shard_count) == shard_id]
+            session_file = shard_path(session_file, shard_id)
+            asset_index_file = shard_path(asset_index_file, shard_id)
+            start_reporter(driver, shard_id, cls.kaiheila_config.shard_metrics_interval)
+            log("INFO", f"Running as shard {shard_id}/{shard_count} with {len(bots)} bots")
+        cls.session_store = SessionStore(session_file)
+        cls.asset_index = AssetIndex(asset_index_file)
+        cls.http_pool = HTTPPool(cls.kaiheila_config.http_pool_limit,
+                                 cls.kaiheila_config.http_pool_limit_per_host,
+                                 cls.kaiheila_config.http_keepalive_timeout,
+                                 cls.kaiheila_config.http_dns_cache_ttl)
+        LazyExtra.enabled = cls.kaiheila_config.lazy_extra
+        cls.webhook_decoder = WebhookDecoder(bots)
+        # 网关地址在各 Bot 的连接任务中获取，互不阻塞
+        for bot in bots:
+            driver.setup_websocket(cls._websocket_setup(bot))
+        driver.on_shutdown(cls.http_pool.close)
         driver.on_bot_connect(cls.start_heartbeat)
+        driver.on_bot_connect(cls.start_dispatch)
+        driver.on_bot_connect(cls.start_state)
+        driver.on_bot_disconnect(cls.stop_dispatch)
+        driver.on_bot_disconnect(cls.save_session)
+
+    @classmethod
+    def _websocket_setup(cls, bot: BotConfig) -> Callable[[], Awaitable[WebSocketSetup]]:
+        """
+        每次(重新)连接前调用，获取网关地址，存在检查点时在网关地址后加上 resume 参数
+        """
+
+        async def setup() -> WebSocketSetup:
+            ws_url = URL(await cls._resolve_gateway(bot))
+            checkpoint = cls.session_store.get(bot["client_id"])
+            if checkpoint:
+                ws_url = ws_url.update_query(resume=1,
+                                             sn=checkpoint["sn"],
+                                             session_id=checkpoint["session_id"])
+            return WebSocketSetup(adapter="kaiheila",
+                                  self_id=bot["client_id"],
+                                  url=str(ws_url),
+                                  headers={"Authorization": f"Bot {bot['token']}"},
+                                  reconnect_interval=cls.kaiheila_config.reconnect_interval)
+
+        return setup
+
+    @classmethod
+    async def _resolve_gateway(cls, bot: BotConfig) -> str:
+        """
+        优先复用 ``gateway_cache_ttl`` 内获取的网关地址；上次给出的地址没能连上时重新获取。
+        获取失败时按指数退避重试，只影响这一个 Bot
+        """
+        self_id = bot["client_id"]
+        config = cls.kaiheila_config
+        if self_id in cls._unconfirmed_gateways:
+            cls.session_store.clear_gateway(self_id)
+        url = cls.session_store.get_gateway(self_id, config.compress, config.gateway_cache_ttl)
+        attempt = 0
+        while url is None:
+            try:
+                url = await asyncio.wait_for(cls.get_gateway(bot["token"], config.compress), config.gateway_timeout)
+            except asyncio.TimeoutError:
+                log("WARNING", f"Getting gateway for bot {self_id} timed out")
+            except Exception as e:
+                log("WARNING", f"Failed to get gateway for bot {self_id}: {e!r}")
+            else:
+                cls.session_store.save_gateway(self_id, url, config.compress)
+                break
+            await asyncio.sleep(min(config.reconnect_interval * 2 ** attempt, 60.))
+            attempt += 1
+        cls._unconfirmed_gateways.add(self_id)
+        return url
+
+    @staticmethod
+    async def save_session(bot: "Bot"):
+        """
+        断开连接时保存检查点，下次连接时 resume
+        """
+        bot.session_store.save(bot.self_id, bot.session_id, bot.buffer.sn)
+
+    async def _handle_hello(self, data: Dict[str, Any]):
+        """
+        s=1 hello 包，code 不为0时 (如 resume 失败) 丢弃检查点并断开，重新建立新的会话
+        """
+        if data.get("code", 0) != 0:
+            log("WARNING", f"Gateway hello failed with code {data.get('code')}, "
+                           "dropping session and reconnecting")
+            await self._drop_session()
+            return
+        self._unconfirmed_gateways.discard(self.self_id)
+        if self.resuming and data.get("session_id") == self.session_id:
+            await self.request.send(json.dumps({"s": 4, "sn": self.buffer.sn}))
+        else:
+            if self.resuming:
+                log("INFO", "Session could not be resumed, started a new one")
+                self.buffer.reset()
+            self.resuming = False
+            self.session_id = data.get("session_id")
+            # 新会话还没有 sn，不清除的话重启后会再次 resume 旧会话
+            self.session_store.clear(self.self_id)
+        self.session_store.save(self.self_id, self.session_id, self.buffer.sn)
+
+    async def _drop_session(self):
+        """
+        丢弃当前会话与检查点并断开连接，由 driver 重新连接获取新的会话
+        """
+        self.session_store.clear(self.self_id)
+        self.session_id = None
+        self.resuming = False
+        self.buffer.reset()
+        if not self.request.closed:
+            await self.request.close()
 
     @classmethod
     @overrides(BaseBot)
-    async def check_permission(cls, driver: "Driver", connection_type: str,
-                               headers: dict, body: Optional[bytes]) -> str:  # todo abort
+    async def check_permission(cls, driver: "Driver",
+                               request: "HTTPConnection") -> Tuple[Optional[str], Optional[HTTPResponse]]:
         """
         :说明:
 
-          CQHTTP (OneBot) 协议鉴权。参考 `鉴权 <https://github.com/howmanybots/onebot/blob/master/v11/specs/communication/authorization.md>`_
-        """
-        x_self_id = headers.get("x-self-id")
-        x_signature = headers.get("x-signature")
-        token = get_auth_bearer(headers.get("authorization"))
-        cqhttp_config = KaiheilaConfig(**driver.config.dict())
-
-        # 检查连接方式
-        if connection_type not in ["http", "websocket"]:
-            log("WARNING", "Unsupported connection type")
-            raise RequestDenied(405, "Unsupported connection type")
-
-        # 检查self_id
-        if not x_self_id:
-            log("WARNING", "Missing X-Self-ID Header")
-            raise RequestDenied(400, "Missing X-Self-ID Header")
-
-        # 检查签名
-        secret = cqhttp_config.secret
-        if secret and connection_type == "http":
-            if not x_signature:
-                log("WARNING", "Missing Signature Header")
-                raise RequestDenied(401, "Missing Signature")
-            sig = hmac.new(secret.encode("utf-8"), body, "sha1").hexdigest()
-            if x_signature != "sha1=" + sig:
-                log("WARNING", "Signature Header is invalid")
-                raise RequestDenied(403, "Signature is invalid")
-
-        access_token = cqhttp_config.access_token
-        if access_token and access_token != token and connection_type == "websocket":
-            log(
-                "WARNING", "Authorization Header is invalid"
-                if token else "Missing Authorization Header")
-            raise RequestDenied(
-                403, "Authorization Header is invalid"
-                if token else "Missing Authorization Header")
-        return str(x_self_id)
+          webhook 鉴权：解压、解密请求体并以 ``verify_token`` 确定 Bot，回应 challenge。
+          WebSocket 由适配器主动连接，不接受反向连接
+        """
+        if not isinstance(request, HTTPRequest) or request.method != "POST":
+            return None, HTTPResponse(405, b"Unsupported connection type")
+        try:
+            self_id, frame = cls.webhook_decoder.decode(request.body)
+        except WebhookError as e:
+            log("WARNING", f"Webhook request rejected: {e.message}")
+            return None, HTTPResponse(e.status, e.message.encode())
+        if cls.webhook_decoder.is_challenge(frame):
+            cls.webhook_decoder.challenges += 1
+            return self_id, HTTPResponse(200, json.dumps({"challenge": frame["d"]["challenge"]}).encode(),
+                                         {"content-type": "application/json"})
+        cls.webhook_decoder.stash(request.body, self_id, frame)
+        return self_id, HTTPResponse(200)
+
+    async def _handle_webhook(self, body: bytes):
+        """
+        webhook 每个请求都会新建 Bot，帧交给该 Bot 第一个请求创建的实例，经同一个 sn 排序缓冲区投递
+        """
+        decoded = self.webhook_decoder.take(body)
+        if decoded is None:  # 没经过 check_permission 的请求体
+            try:
+                decoded = self.webhook_decoder.decode(body)
+            except WebhookError:
+                return
+        _, frame = decoded
+        if self.webhook_decoder.is_challenge(frame):
+            return
+        bot = self._webhook_bots.get(self.self_id)
+        if bot is None:
+            bot = self._webhook_bots[self.self_id] = self
+            asyncio.create_task(self.start_dispatch(self))
+            asyncio.create_task(self.start_state(self))
+        bot.buffer.add_result(frame)
 
     @overrides(BaseBot)
-    async def handle_message(self, message: dict):
+    async def handle_message(self, message: bytes):
         """
-        :说明:  todo 改寫
+        :说明:
 
-          调用 `_check_reply <#async-check-reply-bot-event>`_, `_check_at_me <#check-at-me-bot-event>`_, `_check_nickname <#check-nickname-bot-event>`_ 处理事件并转换为 `Event <#class-event>`_
+          处理网关帧或 webhook 请求体：解压、按信令分发，事件经 sn 排序缓冲区后转换为 `Event <#class-event>`_
         """
+        if self.request.type == "http":
+            await self._handle_webhook(message)
+            return
+        if self.inflater is not None:
+            try:
+                message = self.inflater.feed(message)
+            except zlib.error as e:
+                self.inflater.reset()
+                log("ERROR", "Failed to inflate gateway frame", e)
+                return
+            if message is None:  # 帧还不完整
+                return
+        try:
+            message = json_loads(message)
+        except Exception as e:  # 各 json 后端的异常类型不同
+            log("ERROR", f"Failed to decode gateway frame: {escape_tag(repr(message[:200]))}", e)
+            return
+        if not isinstance(message, dict):
+            log("ERROR", f"Gateway frame is not a json object: {escape_tag(repr(message))}")
+            return
         if not message:
             return
 
+        signal = message.get("s")
+        if signal == 0:  # 事件先经过sn排序缓冲区
+            self.buffer.add_result(message)
+            return
+        if signal == 1:
+            await self._handle_hello(message.get("d", {}))
+            return
+        if signal == 3:  # pong
+            self.heartbeat.on_pong()
+            return
+        if signal == 5:  # reconnect, 当前会话失效 需要重新建立新的会话
+            log("INFO", "Gateway requested reconnect, dropping session")
+            self.buffer.add_result(message)
+            await self._drop_session()
+            return
+        if signal == 6:  # resume ack
+            log("INFO", f"Session {self.session_id} resumed from sn {self.buffer.sn}")
+            self.resuming = False
+            self.session_store.save(self.self_id, self.session_id, self.buffer.sn)
+            return
+
         if "post_type" not in message:
             ResultStore.add_result(message)
             return
 
+        await self._handle_event_data(message)
+
+    def _parse_model(self, model: Type[M], data: Dict[str, Any]) -> M:
+        """
+        :说明:
+
+          ``event_decoder`` 为 ``fast`` 时跳过校验直接构造事件或接口返回值，缺少字段时回退到 ``parse_obj``
+        """
+        if self.kaiheila_config.event_decoder == "fast":
+            try:
+                return construct_model(model, data)
+            except FastDecodeError:
+                pass
+        return model.parse_obj(data)
+
+    async def _handle_event_data(self, message: dict):
+        """
+        :说明:
+
+          将按sn排好序的事件数据转换为 `Event <#class-event>`_ 并更新缓存，再按优先级通道排队交给 nonebot 处理
+        """
+        if not self.deduplicator.check(event_key(message)):
+            log("DEBUG", f"Dropped duplicated event {message.get('msg_id')}")
+            return
         try:
-            post_type = message['post_type']
-            detail_type = message.get(f"{post_type}_type")
-            detail_type = f".{detail_type}" if detail_type else ""
-            sub_type = message.get("sub_type")
-            sub_type = f".{sub_type}" if sub_type else ""
-            models = get_event_model(post_type + detail_type + sub_type)
+            event_name = _complete_event_data(self, message)
+            if self.coalescer is not None and self.coalescer.accepts(message):
+                self.coalescer.add(self, message)  # 窗口结束时合并为批量事件，不逐个解析
+                return
+            models = get_event_model(event_name)
             for model in models:
                 try:
-                    event = model.parse_obj(message)
+                    event = self._parse_model(model, message)
                     break
                 except Exception as e:
                     log("DEBUG", "Event Parser Error", e)
             else:
                 event = Event.parse_obj(message)
 
+            if self.kaiheila_config.state_cache:
+                self.state.update(event)
+            if isinstance(event, MessageEvent):
+                self.message_cache.add(_message_channel(event),
+                                       Reply.construct(id_=event.msg_id,
+                                                       type_=event.type_,
+                                                       content=event.content,
+                                                       create_at=event.msg_timestamp,
+                                                       author=event.extra.author))
+            elif isinstance(event, (DeletedMessageEvent, DeletedPrivateMessageEvent)):
+                self.message_cache.remove(event.extra.body.msg_id)
+        except Exception as e:
+            logger.opt(colors=True, exception=e).error(
+                f"<r><bg #f8bbd0>Failed to handle event. Raw: {message}</bg #f8bbd0></r>"
+            )
+            return
+        # 缓存在这里按 sn 顺序更新，之后的处理由工作协程并发进行，同一频道的事件仍按顺序处理
+        await self.ingest_queue.put(lane_of(message), lambda: self._deliver_event(event), message.get("target_id"))
+
+    async def _deliver_event(self, event: Event):
+        try:
             # Check whether user is calling me
-            await _check_reply(self, event)
-            _check_at_me(self, event)
-            _check_nickname(self, event)
+            await _check_addressing(self, event)
 
             await handle_event(self, event)
         except Exception as e:
             logger.opt(colors=True, exception=e).error(
-                f"<r><bg #f8bbd0>Failed to handle event. Raw: {message}</bg #f8bbd0></r>"
+                f"<r><bg #f8bbd0>Failed to handle event {escape_tag(event.get_event_name())}</bg #f8bbd0></r>"
             )
 
     @overrides(BaseBot)
     async def _call_api(self, endpoint: str, **data) -> Any:
         log("DEBUG", f"Calling API <y>{endpoint}</y>")
-        headers = {"Authorization": f"Bot {self.kaiheila_config.token}"}
-        try:
-            async with self.client_session.request(data.get("method", "GET"),
-                                                   self.base_url + endpoint,
-                                                   params=data.get("params"),
-                                                   data=data.get("data"),
-                                                   json=data.get("json"),
-                                                   headers=headers,
-                                                   timeout=data.get("timeout", self.config.api_timeout)) as response:
-
-                if 200 <= response.status < 300:
-                    result = await response.json()
-                    return _handle_api_result(result)
-                raise NetworkError(f"HTTP request received unexpected "
-                                   f"status code: {response.status_code}")
-        except aiohttp.InvalidURL:
-            raise NetworkError("API root url invalid")
-        except aiohttp.ClientError:
-            raise NetworkError("HTTP request failed")
+        method = data.get("method", "GET")
+        policy = self.retry_policy
+        policy.calls += 1
+        if not policy.allow(endpoint):
+            policy.failed += 1
+            raise NetworkError(f"API {endpoint} is failing, circuit breaker is open for another "
+                               f"{policy.breaker(endpoint).retry_after:.1f}s")
+        idempotent = policy.idempotent(method)
+        limited = retries = 0
+        while True:
+            waited = await self.rate_limiter.acquire(endpoint)
+            if waited > 0.001:
+                log("DEBUG", f"API <y>{endpoint}</y> waited {waited:.3f}s for rate limit")
+            policy.attempts += 1
+            retryable = idempotent
+            try:
+                async with self.client_session.request(method,
+                                                       self.base_url + endpoint,
+                                                       params=data.get("params"),
+                                                       data=data.get("data"),
+                                                       json=data.get("json"),
+                                                       headers=self.auth_headers,
+                                                       timeout=data.get("timeout", self.config.api_timeout)) as response:
+                    self.rate_limiter.update(endpoint, response.status, response.headers)
+                    if response.status == 429:  # 限速已记录 重新排队
+                        if limited < self.kaiheila_config.rate_limit_retries:
+                            limited += 1
+                            continue
+                        policy.success(endpoint)
+                        policy.failed += 1
+                        raise NetworkError(f"API {endpoint} is still rate limited after "
+                                           f"{self.kaiheila_config.rate_limit_retries} retries")
+                    if response.status < 500:  # 服务正常 4xx 不计入熔断也不重试
+                        policy.success(endpoint)
+                    if 200 <= response.status < 300:
+                        try:
+                            result = json_loads(await response.read())
+                        except Exception:  # 各 json 后端的异常类型不同
+                            policy.failed += 1
+                            raise NetworkError("HTTP response is not valid JSON")
+                        return _handle_api_result(result)
+                    error = NetworkError(f"HTTP request received unexpected "
+                                         f"status code: {response.status}")
+                    if response.status < 500:
+                        policy.failed += 1
+                        raise error
+            except aiohttp.InvalidURL:
+                policy.failure(endpoint)
+                policy.failed += 1
+                raise NetworkError("API root url invalid")
+            except aiohttp.ClientConnectorError:
+                error = NetworkError("HTTP connection failed")
+                retryable = True  # 请求未发出 非幂等请求也可以重试
+            except asyncio.TimeoutError:
+                error = NetworkError("HTTP request timed out")
+            except aiohttp.ClientError:
+                error = NetworkError("HTTP request failed")
+
+            # 超时、连接错误或 5xx
+            policy.failure(endpoint)
+            if not retryable or retries >= policy.max_retries or not policy.allow(endpoint):
+                policy.failed += 1
+                raise error
+            delay = policy.backoff(retries)
+            retries += 1
+            policy.retries += 1
+            log("DEBUG", f"API <y>{endpoint}</y> failed with {error.msg}, retry {retries} in {delay:.3f}s")
+            await asyncio.sleep(delay)
 
     @overrides(BaseBot)
     async def call_api(self, endpoint: str, **data) -> Any:
@@ -473,61 +988,126 @@ class Bot(BaseBot):
         """
         return await super().call_api(endpoint, **data)
 
+    def iter_guilds(self, concurrency: Optional[int] = None, **params) -> AsyncIterator[Guild]:
+        """
+        :说明:
+
+          逐个产生机器人加入的服务器，预取后续页面
+
+        :参数:
+
+          * ``concurrency: Optional[int]``: 同时请求的页数，默认为 ``page_concurrency`` 配置
+          * ``**params``: ``/guild/list`` 的其它参数
+        """
+        return paginate(self, "/guild/list", Guild, params,
+                        concurrency=concurrency or self.kaiheila_config.page_concurrency)
+
+    def iter_channels(self, guild_id: str, concurrency: Optional[int] = None, **params) -> AsyncIterator[Channel]:
+        """
+        :说明:
+
+          逐个产生服务器的频道
+
+        :参数:
+
+          * ``guild_id: str``: 服务器 id
+          * ``concurrency: Optional[int]``: 同时请求的页数，默认为 ``page_concurrency`` 配置
+          * ``**params``: ``/channel/list`` 的其它参数，如 ``type``
+        """
+        return paginate(self, "/channel/list", Channel, {"guild_id": guild_id, **params},
+                        concurrency=concurrency or self.kaiheila_config.page_concurrency)
+
+    def iter_guild_users(self, guild_id: str, concurrency: Optional[int] = None, **params) -> AsyncIterator[User]:
+        """
+        :说明:
+
+          逐个产生服务器的成员
+
+        :参数:
+
+          * ``guild_id: str``: 服务器 id
+          * ``concurrency: Optional[int]``: 同时请求的页数，默认为 ``page_concurrency`` 配置
+          * ``**params``: ``/guild/user-list`` 的其它参数，如 ``channel_id``, ``search``, ``role_id``
+        """
+        return paginate(self, "/guild/user-list", User, {"guild_id": guild_id, **params},
+                        concurrency=concurrency or self.kaiheila_config.page_concurrency)
+
     @overrides(BaseBot)
-    async def send(self,
-                   event: Event,
-                   message: Union[str, Message, MessageSegment],
-                   at_sender: bool = False,
-                   **kwargs) -> Any:
+    def send(self,
+             event: Event,
+             message: Union[str, Message, MessageSegment],
+             at_sender: bool = False,
+             **kwargs) -> "asyncio.Future[Any]":
         """
-        :说明:  todo 改寫
+        :说明:
 
-          根据 ``event``  向触发事件的主体发送消息。
+          根据 ``event``  向触发事件的频道或私聊对象发送消息。
+          同一 target_id 的消息按调用顺序发送，不同 target_id 之间并发发送。
 
         :参数:
 
           * ``event: Event``: Event 对象
           * ``message: Union[str, Message, MessageSegment]``: 要发送的消息
           * ``at_sender: bool``: 是否 @ 事件主体
-          * ``**kwargs``: 覆盖默认参数
+          * ``**kwargs``: 覆盖默认参数，如 ``quote``, ``nonce``, ``temp_target_id``
 
         :返回:
 
-          - ``Any``: API 调用返回数据
+          - ``asyncio.Future``: 发送完成后得到 API 调用返回数据
 
         :异常:
 
-          - ``ValueError``: 缺少 ``user_id``, ``group_id``
           - ``NetworkError``: 网络错误
           - ``ActionFailed``: API 调用失败
         """
-        message = escape(message, escape_comma=False) if isinstance(
-            message, str) else message
-        msg = message if isinstance(message, Message) else Message(message)
+        msg = message if isinstance(message, Message) else Message(
+            MessageSegment.text(message) if isinstance(message, str) else message)
+        private = event.channel_type == "PERSON"
+        target_id = event.author_id if private else event.target_id
+        if at_sender and not private:
+            msg = MessageSegment.mention(event.author_id) + MessageSegment.text(" ") + msg
+        return self.send_msg(target_id, msg, private=private, **kwargs)
+
+    def send_msg(self,
+                 target_id: str,
+                 message: Message,
+                 *,
+                 private: bool = False,
+                 **kwargs) -> "asyncio.Future[Any]":
+        """
+        :说明:
 
-        at_sender = at_sender and getattr(event, "user_id", None)
+          将消息排入 ``target_id`` 的发送通道
 
-        params = {}
-        if getattr(event, "user_id", None):
-            params["user_id"] = getattr(event, "user_id")
-        if getattr(event, "group_id", None):
-            params["group_id"] = getattr(event, "group_id")
-        params.update(kwargs)
+        :参数:
 
-        if "message_type" not in params:
-            if params.get("group_id", None):
-                params["message_type"] = "group"
-            elif params.get("user_id", None):
-                params["message_type"] = "private"
-            else:
-                raise ValueError("Cannot guess message type to reply!")
+          * ``target_id: str``: 频道 id，私聊时为用户 id
+          * ``message: Message``: 要发送的消息
+          * ``private: bool``: 是否为私聊
+          * ``**kwargs``: 其余 API 参数，如 ``quote``, ``nonce``, ``temp_target_id``
 
-        if at_sender and params["message_type"] != "private":
-            params["message"] = MessageSegment.at(params["user_id"]) + \
-                                MessageSegment.text(" ") + msg
-        else:
-            params["message"] = msg
-        return await self.send_msg(**params)
+        :返回:
 
-    async def send_msg(self, **params):
-        return await self.call_api("/message/create", **params)
+          - ``asyncio.Future``: 发送完成后得到 API 调用返回数据
+        """
+        endpoint = "/direct-message/create" if private else "/message/create"
+        return self.send_scheduler.submit(
+            target_id, lambda: self._send_now(endpoint, target_id, message, kwargs))
+
+    async def _send_now(self, endpoint: str, target_id: str, message: Message,
+                        params: Dict[str, Any]) -> Any:
+        results = []
+        for payload in _message_payloads(message):
+            if not isinstance(payload["content"], str):  # 图片 视频 文件 先上传，str 为 url
+                payload["content"] = await ensure_url(payload["content"], self)
+            payload.update(target_id=target_id, **params)
+            result = await self.call_api(endpoint, method="POST", json=payload)
+            if isinstance(result, dict) and result.get("msg_id"):
+                self.message_cache.add(target_id,
+                                       Reply.construct(id_=result["msg_id"],
+                                                       type_=payload["type"],
+                                                       content=payload["content"],
+                                                       create_at=result.get("msg_timestamp"),
+                                                       author=self.state.me))
+            results.append(result)
+        return results[0] if len(results) == 1 else results
@@ -0,0 +1,343 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import (Any, Dict, List, Tuple, Generic, TypeVar, Callable, Hashable, Optional, Awaitable,
+                    TYPE_CHECKING)
+
+from .utils import log
+from .event import (Role, User, Guild, Reply, Channel, Event, MessageEvent, AddedChannelEvent, UpdatedChannelEvent, DeletedChannelEvent, AddedRoleEvent, UpdatedRoleEvent,
+                    DeletedRoleEvent, UpdatedGuildEvent, DeletedGuildEvent, ExitedGuildEvent,
+                    UpdatedGuildMemberEvent)
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+# 会改变缓存状态的通知事件
+_STATE_EVENTS = (AddedChannelEvent, UpdatedChannelEvent, DeletedChannelEvent, AddedRoleEvent, UpdatedRoleEvent,
+                 DeletedRoleEvent, UpdatedGuildEvent, DeletedGuildEvent, ExitedGuildEvent, UpdatedGuildMemberEvent)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    带过期时间的 LRU 缓存
+
+    :参数:
+
+      * ``maxsize: int``: 最多保存的条目数
+      * ``ttl: Optional[float]``: 条目写入后多久过期（秒），``None`` 表示不过期
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class StateCache:
+    """
+    单个 bot 的服务器/频道/角色/用户状态缓存：连接后由列表接口填充一次，之后由事件增量更新。
+    服务器、频道与角色数量有限，全部保存；用户与服务器成员使用 LRU + TTL 限制内存
+
+    :参数:
+
+      * ``user_maxsize: int``: 最多缓存的用户与服务器成员数
+      * ``user_ttl: Optional[float]``: 用户与服务器成员信息的过期时间（秒）
+      * ``on_channel: Optional[Callable[[Channel], None]]``: 频道信息写入缓存时调用，如同步慢速模式
+    """
+
+    def __init__(self,
+                 user_maxsize: int = 10000,
+                 user_ttl: Optional[float] = 3600.,
+                 on_channel: Optional[Callable[[Channel], None]] = None):
+        self.me: Optional[User] = None
+        self.guilds: Dict[str, Guild] = {}
+        self.channels: Dict[str, Channel] = {}
+        self.roles: Dict[str, Dict[int, Role]] = {}  # guild_id -> role_id -> Role
+        self.users: LRUCache[str, User] = LRUCache(user_maxsize, user_ttl)
+        self.members: LRUCache[Tuple[str, str], User] = LRUCache(user_maxsize, user_ttl)  # (guild_id, user_id)
+        self.on_channel = on_channel
+        self.ready = False
+        self._me_task: Optional[asyncio.Future] = None
+
+    # 查询
+    def get_guild(self, guild_id: str) -> Optional[Guild]:
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id: str) -> Optional[Channel]:
+        return self.channels.get(channel_id)
+
+    def get_channels(self, guild_id: str) -> List[Channel]:
+        return [channel for channel in self.channels.values() if channel.guild_id == guild_id]
+
+    def get_roles(self, guild_id: str) -> List[Role]:
+        return list(self.roles.get(guild_id, {}).values())
+
+    def get_role(self, guild_id: str, role_id: int) -> Optional[Role]:
+        return self.roles.get(guild_id, {}).get(role_id)
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        return self.users.get(user_id)
+
+    def get_member(self, guild_id: str, user_id: str) -> Optional[User]:
+        """服务器成员，``nickname`` 与 ``roles`` 为该服务器内的值"""
+        return self.members.get((guild_id, user_id))
+
+    async def get_me(self, bot: "Bot") -> Optional[User]:
+        """
+        :说明:
+
+          机器人自身的用户信息，还没有时通过 ``/user/me`` 获取，并发的调用共享同一次查询。
+          获取失败时返回 ``None``，下次调用时重试
+        """
+        if self.me is not None:
+            return self.me
+        if self._me_task is None or self._me_task.done():
+            self._me_task = asyncio.ensure_future(bot.user_me())
+        try:
+            self.me = await asyncio.shield(self._me_task)
+        except Exception as e:
+            log("ERROR", "Failed to get bot user info", e)
+        return self.me
+
+    # 写入
+    def put_guild(self, guild: Guild):
+        self.guilds[guild.id_] = guild
+        if guild.roles is not None:
+            self.roles[guild.id_] = {role.role_id: role for role in guild.roles}
+        for channel in guild.channels or ():
+            if channel.guild_id is None:
+                channel.guild_id = guild.id_
+            self.put_channel(channel)
+
+    def put_channel(self, channel: Channel):
+        self.channels[channel.id_] = channel
+        if self.on_channel is not None:
+            self.on_channel(channel)
+
+    def remove_guild(self, guild_id: str):
+        self.guilds.pop(guild_id, None)
+        self.roles.pop(guild_id, None)
+        for channel in self.get_channels(guild_id):
+            del self.channels[channel.id_]
+
+    async def fill(self, bot: "Bot", concurrency: int = 2, max_guilds: Optional[int] = None):
+        """
+        :说明:
+
+          通过 ``/user/me``, ``/guild/list``, ``/guild/view`` 填充缓存。
+          ``/guild/view`` 经过限速器，同时最多 ``concurrency`` 个；只查询前 ``max_guilds`` 个服务器，
+          其余服务器与查询失败的服务器只缓存列表中的信息，频道与角色由之后的事件补充
+        """
+        await self.get_me(bot)
+        guilds = [guild async for guild in bot.iter_guilds()]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def view(guild: Guild):
+            async with semaphore:
+                try:
+                    guild = Guild.parse_obj(await bot.call_api("/guild/view", params={"guild_id": guild.id_}))
+                except Exception as e:
+                    log("WARNING", f"Failed to view guild {guild.id_}: {e!r}")
+            self.put_guild(guild)
+
+        viewed = guilds if max_guilds is None else guilds[:max_guilds]
+        for guild in guilds[len(viewed):]:
+            self.put_guild(guild)
+        await asyncio.gather(*map(view, viewed))
+        self.ready = True
+        log("INFO", f"State cache filled: {len(self.guilds)} guild(s) ({len(viewed)} viewed), "
+                    f"{len(self.channels)} channel(s)")
+
+    def update(self, event: Event):
+        """
+        :说明:
+
+          根据事件增量更新缓存
+        """
+        if isinstance(event, MessageEvent):
+            author = event.extra.author
+            if author is not None and author.id_:
+                self.users.set(author.id_, author)
+                guild_id = event.extra.guild_id
+                if guild_id:
+                    self.members.set((guild_id, author.id_), author)
+            return
+        if not isinstance(event, _STATE_EVENTS):
+            return
+        body = event.extra.body
+        if body is None:
+            return
+        data = body.dict(exclude_unset=True)
+        guild_id = event.target_id
+        if isinstance(event, (AddedChannelEvent, UpdatedChannelEvent)):
+            self.put_channel(Channel.parse_obj(data))
+        elif isinstance(event, DeletedChannelEvent):
+            self.channels.pop(data.get("id"), None)
+        elif isinstance(event, (AddedRoleEvent, UpdatedRoleEvent)):
+            role = Role.parse_obj(data)
+            self.roles.setdefault(guild_id, {})[role.role_id] = role
+        elif isinstance(event, DeletedRoleEvent):
+            self.roles.get(guild_id, {}).pop(data.get("role_id"), None)
+        elif isinstance(event, UpdatedGuildEvent):
+            guild = self.guilds.get(data.get("id"))
+            if guild is not None:  # 事件中不带角色与频道 保留原有的
+                data = {**guild.dict(by_alias=True), **data}
+            self.put_guild(Guild.parse_obj(data))
+        elif isinstance(event, DeletedGuildEvent):
+            self.remove_guild(data.get("id"))
+        elif isinstance(event, ExitedGuildEvent):
+            self.members.pop((guild_id, data.get("user_id")))
+        elif isinstance(event, UpdatedGuildMemberEvent):
+            member = self.members.get((guild_id, data.get("user_id")))
+            if member is not None and "nickname" in data:
+                member.nickname = data["nickname"]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "guilds": len(self.guilds),
+            "channels": len(self.channels),
+            "roles": sum(len(roles) for roles in self.roles.values()),
+            "users": self.users.stats,
+            "members": self.members.stats
+        }
+
+
+class MessageCache:
+    """
+    最近收到与发出的消息缓存，按频道分组，每个频道只保留最近 ``per_channel`` 条，最多保留 ``max_channels`` 个频道。
+    同一条消息同时被多次请求时只发起一次查询
+
+    :参数:
+
+      * ``per_channel: int``: 每个频道保留的消息数
+      * ``max_channels: int``: 最多保留的频道数
+    """
+
+    def __init__(self, per_channel: int = 200, max_channels: int = 1000):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[str, OrderedDict[str, Reply]]" = OrderedDict()
+        self._index: Dict[str, str] = {}  # msg_id -> channel_id
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # 等待了已在进行中的查询的次数
+
+    def add(self, channel_id: str, message: Reply):
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = OrderedDict()
+            while len(self._channels) > self.max_channels:
+                _, evicted = self._channels.popitem(last=False)
+                for msg_id in evicted:
+                    self._index.pop(msg_id, None)
+        else:
+            self._channels.move_to_end(channel_id)
+        channel[message.id_] = message
+        self._index[message.id_] = channel_id
+        while len(channel) > self.per_channel:
+            msg_id, _ = channel.popitem(last=False)
+            self._index.pop(msg_id, None)
+
+    def get(self, msg_id: str) -> Optional[Reply]:
+        channel_id = self._index.get(msg_id)
+        if channel_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._channels[channel_id][msg_id]
+
+    def remove(self, msg_id: str):
+        channel_id = self._index.pop(msg_id, None)
+        if channel_id is not None:
+            self._channels[channel_id].pop(msg_id, None)
+
+    async def fetch(self, msg_id: str, channel_id: str, loader: Callable[[], Awaitable[Reply]]) -> Reply:
+        """
+        :说明:
+
+          先查缓存，未命中时调用 ``loader`` 查询并写入缓存；同一 ``msg_id`` 的并发请求共享同一次查询
+        """
+        message = self.get(msg_id)
+        if message is not None:
+            return message
+        future = self._inflight.get(msg_id)
+        if future is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():  # 自身被取消
+                    raise
+            # 发起查询的调用被取消，由本次调用重新查询
+            return await self.fetch(msg_id, channel_id, loader)
+        future = self._inflight[msg_id] = asyncio.get_event_loop().create_future()
+        try:
+            message = await loader()
+            self.add(channel_id, message)
+            future.set_result(message)
+            return message
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他等待者时不要报 never retrieved
+            raise
+        finally:
+            if not future.done():  # loader 被取消
+                future.cancel()
+            if self._inflight.get(msg_id) is future:
+                del self._inflight[msg_id]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self._index),
+            "channels": len(self._channels),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "inflight": len(self._inflight)
+        }
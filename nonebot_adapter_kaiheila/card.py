@@ -0,0 +1,189 @@
+import re
+import json
+from typing import Any, Dict, List, Union, Mapping, Iterable, Optional
+
+from typing_extensions import Literal
+
+# https://developer.kaiheila.cn/doc/cardmessage
+Theme = Literal["primary", "secondary", "success", "danger", "warning", "info", "none"]
+Size = Literal["xs", "sm", "md", "lg"]
+
+_VAR_MARK = "\x1a"
+# json.dumps 会把控制字符转义为 \u001a，占位符在序列化后的 JSON 中以此形式出现
+_VAR_PATTERN = re.compile(r"\\u001a(\w+)\\u001a")
+
+
+def var(name: str) -> str:
+    """
+    :说明:
+
+      模板占位符，可以单独作为字段值，也可以嵌入字符串中，如 ``f"你好 {var('name')}"``。
+      单独作为字段值时渲染为值本身的 JSON，可以用于 ``end_time``, ``emoji`` 等数字或布尔字段；嵌入字符串时渲染为 ``str(value)``
+
+    :参数:
+
+      * ``name: str``: 占位符名称，渲染时以同名参数替换
+    """
+    return f"{_VAR_MARK}{name}{_VAR_MARK}"
+
+
+def plain_text(content: str, emoji: bool = True) -> Dict[str, Any]:
+    return {"type": "plain-text", "content": content, "emoji": emoji}
+
+
+def kmarkdown(content: str) -> Dict[str, Any]:
+    return {"type": "kmarkdown", "content": content}
+
+
+def image(src: str, alt: str = "", size: Optional[Size] = None, circle: bool = False) -> Dict[str, Any]:
+    element = {"type": "image", "src": src, "alt": alt, "circle": circle}
+    if size:
+        element["size"] = size
+    return element
+
+
+def button(text: Union[str, Dict[str, Any]],
+           value: str = "",
+           click: Literal["", "link", "return-val"] = "",
+           theme: Theme = "primary") -> Dict[str, Any]:
+    return {"type": "button", "theme": theme, "value": value, "click": click,
+            "text": plain_text(text) if isinstance(text, str) else text}
+
+
+def _text(text: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return kmarkdown(text) if isinstance(text, str) else text
+
+
+class Card:
+    """
+    卡片消息构造器，模块方法均返回自身以便链式调用::
+
+        card = Card(theme="info").header("标题").section("内容").divider().buttons(button("确定", "ok", "return-val"))
+
+    多次发送相同布局时用 ``compile`` 得到 ``CardTemplate``，只序列化一次
+    """
+
+    def __init__(self, theme: Theme = "secondary", size: Size = "lg", color: Optional[str] = None):
+        self.theme = theme
+        self.size = size
+        self.color = color
+        self.modules: List[Dict[str, Any]] = []
+
+    def module(self, type_: str, **fields) -> "Card":
+        self.modules.append({"type": type_, **fields})
+        return self
+
+    def header(self, text: str) -> "Card":
+        return self.module("header", text=plain_text(text))
+
+    def section(self,
+                text: Union[str, Dict[str, Any]],
+                accessory: Optional[Dict[str, Any]] = None,
+                mode: Literal["left", "right"] = "right") -> "Card":
+        """``text`` 为字符串时按 KMarkdown 处理"""
+        if accessory is None:
+            return self.module("section", text=_text(text))
+        return self.module("section", text=_text(text), mode=mode, accessory=accessory)
+
+    def divider(self) -> "Card":
+        return self.module("divider")
+
+    def images(self, *srcs: str) -> "Card":
+        return self.module("image-group", elements=[image(src) for src in srcs])
+
+    def container(self, *srcs: str) -> "Card":
+        return self.module("container", elements=[image(src) for src in srcs])
+
+    def context(self, *elements: Union[str, Dict[str, Any]]) -> "Card":
+        return self.module("context", elements=[_text(element) for element in elements])
+
+    def buttons(self, *buttons: Dict[str, Any]) -> "Card":
+        return self.module("action-group", elements=list(buttons))
+
+    def file(self, type_: Literal["file", "audio", "video"], src: str, title: str = "",
+             cover: Optional[str] = None) -> "Card":
+        if cover is None:
+            return self.module(type_, src=src, title=title)
+        return self.module(type_, src=src, title=title, cover=cover)
+
+    def countdown(self, end_time: int, mode: Literal["day", "hour", "second"] = "day") -> "Card":
+        """``end_time`` 为毫秒时间戳"""
+        return self.module("countdown", mode=mode, endTime=end_time)
+
+    def invite(self, code: str) -> "Card":
+        return self.module("invite", code=code)
+
+    def dict(self) -> Dict[str, Any]:
+        card = {"type": "card", "theme": self.theme, "size": self.size, "modules": self.modules}
+        if self.color:
+            card["color"] = self.color
+        return card
+
+    def compile(self) -> "CardTemplate":
+        return CardTemplate(self)
+
+
+class CardTemplate:
+    """
+    预编译的卡片消息模板
+
+    构造时将卡片序列化为 JSON 并在占位符处切分为片段，
+    ``render`` 只需转义替换值并拼接片段，不再遍历卡片结构
+    """
+
+    def __init__(self, cards: Union[Card, Iterable[Card]]):
+        content = _dumps(cards)
+        parts = _VAR_PATTERN.split(content)
+        self._fragments: List[str] = parts[0::2]
+        self._names: List[str] = parts[1::2]
+        # 占位符是否独占整个 JSON 字符串，是则连同两侧引号一起替换为值的 JSON
+        self._whole: List[bool] = []
+        for i in range(len(self._names)):
+            before, after = self._fragments[i], self._fragments[i + 1]
+            whole = _ends_with_quote(before) and after.startswith('"')
+            if whole:
+                self._fragments[i], self._fragments[i + 1] = before[:-1], after[1:]
+            self._whole.append(whole)
+        self.names = frozenset(self._names)
+
+    def render(self, values: Optional[Mapping[str, Any]] = None, **kwargs) -> str:
+        """
+        :说明:
+
+          以 ``values`` 与关键字参数替换占位符，得到 ``content`` 字符串
+
+        :参数:
+
+          * ``values: Optional[Mapping[str, Any]]``: 占位符的值，单独作为字段值时序列化为 JSON，嵌入字符串时转为字符串
+        """
+        if values:
+            kwargs.update(values)
+        missing = self.names.difference(kwargs)
+        if missing:
+            raise ValueError(f"Missing card template values: {', '.join(sorted(missing))}")
+        fragments = self._fragments
+        parts = [fragments[0]]
+        for name, whole, fragment in zip(self._names, self._whole, fragments[1:]):
+            value = kwargs[name]
+            if whole:
+                parts.append(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+            else:
+                parts.append(json.dumps(str(value), ensure_ascii=False)[1:-1])
+            parts.append(fragment)
+        return "".join(parts)
+
+
+def _ends_with_quote(fragment: str) -> bool:
+    """``fragment`` 以未转义的引号结尾，即 JSON 字符串从这里开始"""
+    if not fragment.endswith('"'):
+        return False
+    backslashes = len(fragment) - 1 - len(fragment[:-1].rstrip("\\"))
+    return backslashes % 2 == 0
+
+
+def _dumps(cards: Union[Card, Iterable[Card]]) -> str:
+    if isinstance(cards, Card):
+        cards = (cards,)
+    return json.dumps([card.dict() if isinstance(card, Card) else card for card in cards],
+                      ensure_ascii=False,
+                      separators=(",", ":"))
@@ -0,0 +1,142 @@
+import asyncio
+from typing import Any, Dict, List, Tuple, Optional, TYPE_CHECKING
+
+from .utils import log
+from .decoder import construct_model
+from .event import ReactionBatchEvent, GuildMemberPresenceBatchEvent
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+# sub_type -> 事件发生后的状态
+PRESENCE_STATES = {"guild_member_online": True, "guild_member_offline": False}
+REACTION_STATES = {"added_reaction": True, "deleted_reaction": False}
+
+# [窗口开始前的状态, 最后的状态, 最后一个事件的数据]
+Entry = List[Any]
+
+
+class Coalescer:
+    """
+    把上下线与 reaction 通知在 ``window`` 秒的时间窗口内合并：按 (服务器, 用户) 或 (消息, 表情, 用户) 只保留净变化，
+    状态回到窗口开始前的（如上线后又下线）视为抵消。窗口结束时每个服务器、频道各投递一个批量事件。
+    这些事件不再逐个解析，只在窗口结束时构造批量事件
+
+    :参数:
+
+      * ``window: float``: 时间窗口（秒）
+      * ``max_pending: int``: 窗口内最多暂存的键数，超出后提前结束窗口
+    """
+
+    def __init__(self, window: float, max_pending: int = 10000):
+        self.window = window
+        self.max_pending = max_pending
+        self._presence: Dict[Tuple[str, str], Entry] = {}
+        self._reactions: Dict[Tuple[str, str, str], Entry] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._bot: Optional["Bot"] = None
+
+        self.received = 0
+        self.collapsed = 0
+        self.batches = 0
+
+    @staticmethod
+    def accepts(data: Dict[str, Any]) -> bool:
+        sub_type = data.get("sub_type")
+        return sub_type in PRESENCE_STATES or sub_type in REACTION_STATES
+
+    def add(self, bot: "Bot", data: Dict[str, Any]):
+        """暂存一个已由 ``_complete_event_data`` 补全的通知"""
+        self._bot = bot
+        self.received += 1
+        body = data["extra"]["body"]
+        sub_type = data["sub_type"]
+        if sub_type in PRESENCE_STATES:
+            state = PRESENCE_STATES[sub_type]
+            pending, key = self._presence, (data["target_id"], body["user_id"])
+        else:
+            state = REACTION_STATES[sub_type]
+            pending, key = self._reactions, (body["msg_id"], body["emoji"]["id"], body["user_id"])
+        entry = pending.get(key)
+        if entry is None:
+            pending[key] = [not state, state, data]
+        else:
+            entry[1] = state
+            entry[2] = data
+
+        if len(self._presence) + len(self._reactions) >= self.max_pending:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """结束当前窗口，投递批量事件"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        presence, self._presence = self._presence, {}
+        reactions, self._reactions = self._reactions, {}
+        if self._bot is None:
+            return
+        events = [("presence", event) for event in self._presence_batches(presence) if event is not None]
+        events += [("reaction", event) for event in self._reaction_batches(reactions) if event is not None]
+        self.batches += len(events)
+        if events:
+            asyncio.create_task(self._deliver(self._bot, events))
+
+    @staticmethod
+    async def _deliver(bot: "Bot", events: List[Tuple[str, Any]]):
+        for lane, event in events:
+            await bot.ingest_queue.put(lane, lambda event=event: bot._deliver_event(event), event.target_id)
+
+    def _presence_batches(self, pending: Dict[Tuple[str, str], Entry]) -> List[Optional[GuildMemberPresenceBatchEvent]]:
+        guilds: Dict[str, Tuple[List[Dict[str, Any]], Dict[str, Any]]] = {}
+        collapsed: Dict[str, int] = {}
+        for (guild_id, user_id), (before, after, data) in pending.items():
+            if before == after:
+                collapsed[guild_id] = collapsed.get(guild_id, 0) + 1
+                continue
+            changes, _ = guilds.get(guild_id) or ([], None)
+            changes.append({"user_id": user_id, "online": after, "event_time": data["extra"]["body"].get("event_time")})
+            guilds[guild_id] = (changes, data)
+        self.collapsed += sum(collapsed.values())
+        return [self._batch(GuildMemberPresenceBatchEvent, data, changes, collapsed.get(guild_id, 0))
+                for guild_id, (changes, data) in guilds.items()]
+
+    def _reaction_batches(self, pending: Dict[Tuple[str, str, str], Entry]) -> List[Optional[ReactionBatchEvent]]:
+        channels: Dict[str, Tuple[Dict[Tuple[str, str], Dict[str, Any]], Dict[str, Any]]] = {}
+        collapsed: Dict[str, int] = {}
+        for (msg_id, emoji_id, user_id), (before, after, data) in pending.items():
+            channel_id = data["target_id"]
+            if before == after:
+                collapsed[channel_id] = collapsed.get(channel_id, 0) + 1
+                continue
+            changes, _ = channels.get(channel_id) or ({}, None)
+            change = changes.get((msg_id, emoji_id))
+            if change is None:
+                change = changes[(msg_id, emoji_id)] = {"msg_id": msg_id, "emoji": data["extra"]["body"]["emoji"],
+                                                       "added": [], "deleted": []}
+            change["added" if after else "deleted"].append(user_id)
+            channels[channel_id] = (changes, data)
+        self.collapsed += sum(collapsed.values())
+        return [self._batch(ReactionBatchEvent, data, list(changes.values()), collapsed.get(channel_id, 0))
+                for channel_id, (changes, data) in channels.items()]
+
+    @staticmethod
+    def _batch(model, data: Dict[str, Any], changes: List[Dict[str, Any]], collapsed: int):
+        """以窗口内最后一个事件的公共字段构造批量事件"""
+        try:
+            return construct_model(model, {**data, "sub_type": model.__fields__["sub_type"].default,
+                                           "changes": changes, "collapsed": collapsed})
+        except Exception as e:
+            log("ERROR", f"Failed to build {model.__name__}", e)
+            return None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "collapsed": self.collapsed,
+            "batches": self.batches,
+            "pending": len(self._presence) + len(self._reactions)
+        }
@@ -0,0 +1,78 @@
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"  # Z_SYNC_FLUSH 分帧标记
+
+
+class Inflater:
+    """
+    每个 WebSocket 连接独享的增量解压器
+
+    开黑啦开启压缩后每帧是一段完整的 zlib 数据；若服务端以 ``Z_SYNC_FLUSH`` 分帧（zlib-stream），
+    同一连接共享解压上下文，未以分帧标记结尾的数据会暂存到下一帧
+    https://developer.kaiheila.cn/doc/websocket
+    """
+
+    def __init__(self):
+        self._zobj = zlib.decompressobj()
+        self._buffer = bytearray()
+
+        self.frames = 0  # 解压出的完整帧数
+        self.bytes_in = 0  # 收到的压缩字节数
+        self.bytes_out = 0  # 解压后的字节数
+        self.inflate_time = 0.  # 解压耗费的时间（秒）
+
+    @staticmethod
+    def is_compressed(data: bytes) -> bool:
+        """
+        未压缩的请求体一定是 JSON 对象。只适用于完整的一段数据（如 webhook 请求体），
+        zlib-stream 的后续分片可能以 ``{`` 开头，网关连接按 ``compress`` 配置决定是否解压
+        """
+        return data[:1] != b"{"
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_out - self.bytes_in,
+            "ratio": self.bytes_in / self.bytes_out if self.bytes_out else None,
+            "inflate_time": self.inflate_time,
+            "inflate_time_per_mb": self.inflate_time / self.bytes_out * 1024 * 1024 if self.bytes_out else None
+        }
+
+    def reset(self):
+        """丢弃解压上下文与未完成的数据，解压出错后调用"""
+        self._zobj = zlib.decompressobj()
+        self._buffer.clear()
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """
+        :说明:
+
+          喂入一段压缩数据
+
+        :返回:
+
+          - ``Optional[bytes]``: 解压出的完整帧，数据不完整时返回 ``None``
+
+        :异常:
+
+          - ``zlib.error``: 数据损坏
+        """
+        start = time.perf_counter()
+        self.bytes_in += len(data)
+        self._buffer += self._zobj.decompress(data)
+        if self._zobj.eof:  # 独立压缩的帧 每帧一个新的上下文
+            self._zobj = zlib.decompressobj()
+        elif not data.endswith(ZLIB_SUFFIX):
+            self.inflate_time += time.perf_counter() - start
+            return None
+        frame = bytes(self._buffer)
+        self._buffer.clear()
+        self.frames += 1
+        self.bytes_out += len(frame)
+        self.inflate_time += time.perf_counter() - start
+        return frame
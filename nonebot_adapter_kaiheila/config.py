@@ -1,14 +1,22 @@
+from pathlib import Path
 from typing import Dict, Optional, TypedDict, List
+from typing_extensions import Literal
 
 from pydantic import Field, BaseModel, AnyUrl
 
 
-class BotConfig(TypedDict):
+class _RequiredBotConfig(TypedDict):
     client_id: str
     token: str
     client_secret: str
 
 
+class BotConfig(_RequiredBotConfig, total=False):
+    shard: int  # 分片运行时固定分配到的分片
+    verify_token: str  # webhook 模式的 Verify Token
+    encrypt_key: str  # webhook 模式的 Encrypt Key，需要安装 cryptography
+
+
 # priority: alias > origin
 class Config(BaseModel):
     """
@@ -19,8 +27,97 @@ class Config(BaseModel):
       - ``client_id`` : Kaiheila 开发者中心获得
       - ``token`` : Kaiheila 开发者中心获得
       - ``client_secret`` : Kaiheila 开发者中心获得
+      - ``compress`` / ``kaiheila_compress`` : 是否请求网关下发压缩后的数据
+      - ``session_file`` / ``kaiheila_session_file`` : session_id 与 sn 检查点文件，为空时只在内存中保存，重启后无法 resume
+      - ``reconnect_interval`` / ``kaiheila_reconnect_interval`` : 断线重连间隔（秒），也是获取网关失败后重试的初始间隔
+      - ``gateway_timeout`` / ``kaiheila_gateway_timeout`` : 获取网关地址的超时时间（秒）
+      - ``gateway_cache_ttl`` / ``kaiheila_gateway_cache_ttl`` : 网关地址的复用时间（秒），重启或重连时在此时间内不重新获取
+      - ``heartbeat_interval`` / ``kaiheila_heartbeat_interval`` : 心跳间隔（秒）
+      - ``heartbeat_timeout`` / ``kaiheila_heartbeat_timeout`` : 等待 pong 的超时时间（秒）
+      - ``heartbeat_max_missed`` / ``kaiheila_heartbeat_max_missed`` : 连续多少次 pong 超时后断开重连
+      - ``rate_limit_retries`` / ``kaiheila_rate_limit_retries`` : 仍然收到 429 时重新排队的次数
+      - ``send_concurrency`` / ``kaiheila_send_concurrency`` : 所有频道同时进行的消息发送数上限
+      - ``send_lane_idle_timeout`` / ``kaiheila_send_lane_idle_timeout`` : 频道发送通道空闲多久后回收（秒）
+      - ``event_decoder`` / ``kaiheila_event_decoder`` : 事件解码方式，``pydantic`` 完整校验，``fast`` 跳过校验直接构造
+      - ``lazy_extra`` / ``kaiheila_lazy_extra`` : 事件的 ``extra`` 保留原始数据，各字段在首次访问时才校验
+      - ``state_cache`` / ``kaiheila_state_cache`` : 是否在内存中缓存服务器、频道、角色与用户信息，开启后首次连接时查询各服务器详情
+      - ``state_fill_concurrency`` / ``kaiheila_state_fill_concurrency`` : 填充状态缓存时同时查询的服务器数
+      - ``state_fill_max_guilds`` / ``kaiheila_state_fill_max_guilds`` : 填充状态缓存时最多查询详情的服务器数，其余的只缓存列表信息，为空时不限制
+      - ``user_cache_size`` / ``kaiheila_user_cache_size`` : 最多缓存的用户与服务器成员数
+      - ``user_cache_ttl`` / ``kaiheila_user_cache_ttl`` : 用户与服务器成员信息的过期时间（秒），为空时不过期
+      - ``message_cache_size`` / ``kaiheila_message_cache_size`` : 每个频道缓存的最近消息数，用于解析回复
+      - ``message_cache_channels`` / ``kaiheila_message_cache_channels`` : 最多缓存最近消息的频道数
+      - ``asset_index_file`` / ``kaiheila_asset_index_file`` : 已上传媒体的内容哈希与 url 索引文件，为空时只在内存中保存
+      - ``upload_chunk_size`` / ``kaiheila_upload_chunk_size`` : 流式上传媒体时每块的字节数
+      - ``http_pool_limit`` / ``kaiheila_http_pool_limit`` : 所有 Bot 共用的 HTTP 连接池的连接数上限，0 为不限制
+      - ``http_pool_limit_per_host`` / ``kaiheila_http_pool_limit_per_host`` : 同一主机的连接数上限，0 为不限制
+      - ``http_keepalive_timeout`` / ``kaiheila_http_keepalive_timeout`` : 空闲连接保持的时间（秒）
+      - ``http_dns_cache_ttl`` / ``kaiheila_http_dns_cache_ttl`` : DNS 缓存时间（秒），为空时不缓存
+      - ``shard_metrics_interval`` / ``kaiheila_shard_metrics_interval`` : 分片运行时工作进程向 Supervisor 上报统计的间隔（秒）
+      - ``dedup_window`` / ``kaiheila_dedup_window`` : 按 msg_id 去除重复事件的时间窗口（秒）
+      - ``dedup_capacity`` / ``kaiheila_dedup_capacity`` : 去重最多记住的事件数
+      - ``dedup_false_positive_rate`` / ``kaiheila_dedup_false_positive_rate`` : 设置时改用 Bloom 过滤器去重，为其误判率
+      - ``ingest_workers`` / ``kaiheila_ingest_workers`` : 每个 Bot 并发处理事件的协程数
+      - ``ingest_max_depth`` / ``kaiheila_ingest_max_depth`` : ``message``, ``notice``, ``reaction``, ``presence`` 各通道最多排队的事件数
+      - ``ingest_shed_lanes`` / ``kaiheila_ingest_shed_lanes`` : 排满时丢弃最旧事件的通道，其它通道排满时暂停投递
+      - ``coalesce_window`` / ``kaiheila_coalesce_window`` : 设置时把该秒数内的上下线、reaction 通知合并为 ``GuildMemberPresenceBatchEvent``, ``ReactionBatchEvent``
+      - ``coalesce_max_pending`` / ``kaiheila_coalesce_max_pending`` : 合并窗口内最多暂存的用户数，超出后提前投递
+      - ``page_concurrency`` / ``kaiheila_page_concurrency`` : ``iter_guilds`` 等分页迭代器同时请求的页数
+      - ``api_max_retries`` / ``kaiheila_api_max_retries`` : 接口调用超时、连接失败或 5xx 时的重试次数，非幂等请求只在连接失败时重试
+      - ``api_backoff_base`` / ``kaiheila_api_backoff_base`` : 第一次重试的最长间隔（秒），之后每次翻倍并随机抖动
+      - ``api_backoff_max`` / ``kaiheila_api_backoff_max`` : 重试间隔上限（秒）
+      - ``api_breaker_threshold`` / ``kaiheila_api_breaker_threshold`` : 同一接口连续失败多少次后熔断、直接失败，0 为不熔断
+      - ``api_breaker_reset_timeout`` / ``kaiheila_api_breaker_reset_timeout`` : 熔断后多久放行一个试探请求（秒）
+      - ``buffer_max_depth`` / ``kaiheila_buffer_max_depth`` : sn排序缓冲区最多暂存的乱序帧数
+      - ``buffer_gap_timeout`` / ``kaiheila_buffer_gap_timeout`` : 等待缺失 sn 的最长秒数，为空时一直等待
     """
     bots: List[BotConfig] = Field(default_factory=list)
+    compress: bool = Field(False, alias="kaiheila_compress")
+    session_file: Optional[Path] = Field(None, alias="kaiheila_session_file")
+    reconnect_interval: float = Field(1., alias="kaiheila_reconnect_interval")
+    gateway_timeout: float = Field(10., alias="kaiheila_gateway_timeout")
+    gateway_cache_ttl: float = Field(60., alias="kaiheila_gateway_cache_ttl")
+    heartbeat_interval: float = Field(30., alias="kaiheila_heartbeat_interval")
+    heartbeat_timeout: float = Field(6., alias="kaiheila_heartbeat_timeout")
+    heartbeat_max_missed: int = Field(3, alias="kaiheila_heartbeat_max_missed")
+    rate_limit_retries: int = Field(2, alias="kaiheila_rate_limit_retries")
+    send_concurrency: int = Field(8, alias="kaiheila_send_concurrency")
+    send_lane_idle_timeout: float = Field(60., alias="kaiheila_send_lane_idle_timeout")
+    event_decoder: Literal["pydantic", "fast"] = Field("pydantic", alias="kaiheila_event_decoder")
+    lazy_extra: bool = Field(False, alias="kaiheila_lazy_extra")
+    state_cache: bool = Field(False, alias="kaiheila_state_cache")
+    state_fill_concurrency: int = Field(2, alias="kaiheila_state_fill_concurrency")
+    state_fill_max_guilds: Optional[int] = Field(100, alias="kaiheila_state_fill_max_guilds")
+    user_cache_size: int = Field(10000, alias="kaiheila_user_cache_size")
+    user_cache_ttl: Optional[float] = Field(3600., alias="kaiheila_user_cache_ttl")
+    message_cache_size: int = Field(200, alias="kaiheila_message_cache_size")
+    message_cache_channels: int = Field(1000, alias="kaiheila_message_cache_channels")
+    asset_index_file: Optional[Path] = Field(None, alias="kaiheila_asset_index_file")
+    upload_chunk_size: int = Field(64 * 1024, alias="kaiheila_upload_chunk_size")
+    http_pool_limit: int = Field(100, alias="kaiheila_http_pool_limit")
+    http_pool_limit_per_host: int = Field(0, alias="kaiheila_http_pool_limit_per_host")
+    http_keepalive_timeout: float = Field(15., alias="kaiheila_http_keepalive_timeout")
+    http_dns_cache_ttl: Optional[float] = Field(300., alias="kaiheila_http_dns_cache_ttl")
+    shard_metrics_interval: float = Field(10., alias="kaiheila_shard_metrics_interval")
+    dedup_window: float = Field(600., alias="kaiheila_dedup_window")
+    dedup_capacity: int = Field(100000, alias="kaiheila_dedup_capacity")
+    dedup_false_positive_rate: Optional[float] = Field(None, alias="kaiheila_dedup_false_positive_rate")
+    ingest_workers: int = Field(4, alias="kaiheila_ingest_workers")
+    ingest_max_depth: Dict[str, int] = Field(
+        default_factory=lambda: {"message": 1000, "notice": 1000, "reaction": 500, "presence": 200},
+        alias="kaiheila_ingest_max_depth")
+    ingest_shed_lanes: List[str] = Field(default_factory=lambda: ["reaction", "presence"],
+                                         alias="kaiheila_ingest_shed_lanes")
+    coalesce_window: Optional[float] = Field(None, alias="kaiheila_coalesce_window")
+    coalesce_max_pending: int = Field(10000, alias="kaiheila_coalesce_max_pending")
+    page_concurrency: int = Field(4, alias="kaiheila_page_concurrency")
+    api_max_retries: int = Field(2, alias="kaiheila_api_max_retries")
+    api_backoff_base: float = Field(0.5, alias="kaiheila_api_backoff_base")
+    api_backoff_max: float = Field(10., alias="kaiheila_api_backoff_max")
+    api_breaker_threshold: int = Field(5, alias="kaiheila_api_breaker_threshold")
+    api_breaker_reset_timeout: float = Field(30., alias="kaiheila_api_breaker_reset_timeout")
+    buffer_max_depth: int = Field(1000, alias="kaiheila_buffer_max_depth")
+    buffer_gap_timeout: Optional[float] = Field(5., alias="kaiheila_buffer_gap_timeout")
 
     class Config:
         extra = "ignore"
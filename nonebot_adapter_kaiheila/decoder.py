@@ -0,0 +1,137 @@
+from typing import Any, Dict, List, Type, Tuple, Callable, Optional, NamedTuple
+
+from pydantic import BaseModel, Extra
+from pydantic.typing import is_literal_type, all_literal_values
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+# 直接从原始帧 bytes 解码 按 msgspec > orjson > ujson > json 选择可用的最快后端
+try:
+    import msgspec
+
+    json_loads: Callable[[bytes], Any] = msgspec.json.Decoder().decode
+    JSON_BACKEND = "msgspec"
+except ImportError:
+    try:
+        import orjson
+
+        json_loads = orjson.loads
+        JSON_BACKEND = "orjson"
+    except ImportError:
+        try:
+            import ujson
+
+            json_loads = ujson.loads
+            JSON_BACKEND = "ujson"
+        except ImportError:
+            import json
+
+            json_loads = json.loads
+            JSON_BACKEND = "json"
+
+
+class FastDecodeError(ValueError):
+    """数据缺少必需字段、与 ``Literal`` 字段不符或没有通过校验器，无法走快速路径，应回退到 ``parse_obj``"""
+
+
+class _FieldPlan(NamedTuple):
+    name: str
+    alias: str
+    field: ModelField
+    sub_model: Optional[Type[BaseModel]]  # 需要递归构造的子 Model
+    is_list: bool
+    custom: Optional[Callable[[Any], Any]]  # 自定义类型的 construct
+    choices: Optional[frozenset]  # Literal 字段允许的值，用于区分事件类型
+    validated: bool  # 带有 @validator 的字段照常校验
+
+
+class _ModelPlan(NamedTuple):
+    fields: Tuple[_FieldPlan, ...]
+    aliases: frozenset
+    allow_extra: bool
+    root_validated: bool  # 带有 @root_validator 的 Model 不走快速路径
+
+
+_plans: Dict[Type[BaseModel], _ModelPlan] = {}
+
+
+def _compile(model: Type[BaseModel]) -> _ModelPlan:
+    fields: List[_FieldPlan] = []
+    for name, field in model.__fields__.items():
+        sub_model = None
+        is_list = False
+        custom = None
+        choices = frozenset(all_literal_values(field.type_)) if is_literal_type(field.type_) else None
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            if field.shape == SHAPE_SINGLETON:
+                sub_model = field.type_
+            elif field.shape == SHAPE_LIST:
+                sub_model = field.type_
+                is_list = True
+        elif field.shape == SHAPE_SINGLETON and hasattr(field.type_, "__get_validators__") \
+                and hasattr(field.type_, "construct"):
+            custom = field.type_.construct
+        fields.append(_FieldPlan(name, field.alias, field, sub_model, is_list, custom, choices,
+                                 bool(field.class_validators)))
+    plan = _ModelPlan(tuple(fields),
+                      frozenset(f.alias for f in fields),
+                      model.__config__.extra == Extra.allow,
+                      bool(model.__pre_root_validators__ or model.__post_root_validators__))
+    _plans[model] = plan
+    return plan
+
+
+def construct_model(model: Type[BaseModel], data: Dict[str, Any]) -> BaseModel:
+    """
+    :说明:
+
+      不经类型校验地从 ``data`` 构造 ``model``，字段按 alias 读取，得到的对象与 ``parse_obj`` 拥有相同的公开属性。
+      只有 Model, List[Model] 与提供 ``construct`` 的自定义类型字段会被递归构造，其余字段保持原样。
+      ``Literal`` 字段仍然检查取值，带有 ``@validator`` 的字段仍然完整校验，``get_event_model`` 给出的候选 Model 不符时回退
+
+    :异常:
+
+      - ``FastDecodeError``: 缺少必需字段、``Literal`` 字段取值不符、校验失败、子 Model 字段不是 dict 或 Model 带有 ``@root_validator``
+    """
+    plan = _plans.get(model) or _compile(model)
+    if plan.root_validated:
+        raise FastDecodeError(f"{model.__name__} has root validators")
+    values: Dict[str, Any] = {}
+    fields_set = set()
+    for name, alias, field, sub_model, is_list, custom, choices, validated in plan.fields:
+        if alias in data:
+            value = data[alias]
+            if choices is not None and value not in choices and not (value is None and field.allow_none):
+                raise FastDecodeError(f"{model.__name__}.{name} must be one of {sorted(choices)}")
+            if value is None:
+                pass
+            elif validated:
+                value, errors = field.validate(value, values, loc=alias, cls=model)
+                if errors:
+                    raise FastDecodeError(f"{model.__name__}.{name} is invalid")
+            elif sub_model is not None:
+                if is_list:
+                    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+                        raise FastDecodeError(f"{model.__name__}.{name} is not a list of objects")
+                    value = [construct_model(sub_model, item) for item in value]
+                elif isinstance(value, dict):
+                    value = construct_model(sub_model, value)
+                else:
+                    raise FastDecodeError(f"{model.__name__}.{name} is not an object")
+            elif custom is not None:
+                value = custom(value)
+            values[name] = value
+            fields_set.add(name)
+        elif field.required:
+            raise FastDecodeError(f"{model.__name__}.{name} is required")
+        else:
+            values[name] = field.get_default()
+    if plan.allow_extra:
+        for key, value in data.items():
+            if key not in plan.aliases:
+                values[key] = value
+                fields_set.add(key)
+    m = model.__new__(model)
+    object.__setattr__(m, "__dict__", values)
+    object.__setattr__(m, "__fields_set__", fields_set)
+    m._init_private_attributes()
+    return m
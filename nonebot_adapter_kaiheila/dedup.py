@@ -0,0 +1,114 @@
+import math
+import time
+import hashlib
+from typing import Any, Dict, Optional
+
+
+class BloomFilter:
+    """
+    定长位图的 Bloom 过滤器，双重哈希得到 ``k`` 个位置
+
+    :参数:
+
+      * ``capacity: int``: 预计插入的元素数
+      * ``false_positive_rate: float``: 插入 ``capacity`` 个元素后的误判率
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class Deduplicator:
+    """
+    按 ``msg_id`` 去除重复事件，覆盖 s=5 重置 sn 后的重放，以及同时使用 WebSocket 与 webhook 的情况
+
+    保存新旧两代集合：当前一代写满 ``capacity / 2`` 个或存在超过 ``window / 2`` 秒后，旧的一代被丢弃、当前一代变为旧的。
+    因此至少能识别最近 ``window / 2`` 秒内的重复，内存不超过 ``capacity`` 个键。
+    ``false_positive_rate`` 不为空时每一代使用 Bloom 过滤器，内存更小但有该比例的事件会被误判为重复
+
+    :参数:
+
+      * ``window: float``: 去重的时间窗口（秒）
+      * ``capacity: int``: 最多记住的事件数
+      * ``false_positive_rate: Optional[float]``: Bloom 过滤器的误判率，为空时使用集合精确判断
+    """
+
+    def __init__(self, window: float = 600., capacity: int = 100000, false_positive_rate: Optional[float] = None):
+        self.window = window
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self._current = self._new_generation()
+        self._previous = self._new_generation()
+        self._rotated_at = time.monotonic()
+
+        self.seen = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    def _new_generation(self):
+        if self.false_positive_rate is None:
+            return set()
+        return BloomFilter(self.capacity // 2, self.false_positive_rate)
+
+    def _rotate(self):
+        self._previous = self._current
+        self._current = self._new_generation()
+        self._rotated_at = time.monotonic()
+        self.rotations += 1
+
+    def check(self, key: str) -> bool:
+        """
+        :返回:
+
+          - ``bool``: ``key`` 第一次出现时为 ``True`` 并记住它，重复时为 ``False``
+        """
+        self.seen += 1
+        if key in self._current or key in self._previous:
+            self.dropped += 1
+            return False
+        if len(self._current) >= self.capacity // 2 or time.monotonic() - self._rotated_at > self.window / 2:
+            self._rotate()
+        self._current.add(key)
+        return True
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "seen": self.seen,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "size": len(self._current) + len(self._previous),
+            "mode": "set" if self.false_positive_rate is None else "bloom"
+        }
+
+
+def event_key(data: Dict[str, Any]) -> str:
+    """事件的身份：``msg_id``，没有时由类型、目标、作者与时间组合"""
+    msg_id = data.get("msg_id")
+    if msg_id:
+        return msg_id
+    extra = data.get("extra") or {}
+    return (f"{data.get('type')}:{extra.get('type') if isinstance(extra, dict) else ''}:"
+            f"{data.get('target_id')}:{data.get('author_id')}:{data.get('msg_timestamp')}")
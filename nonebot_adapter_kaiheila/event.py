@@ -1,9 +1,12 @@
-from typing import Dict, List, Union, Optional, Type
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union, Optional, Type
 from typing_extensions import Literal
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError, validator
 from nonebot.typing import overrides
-from nonebot.adapters import Event as BaseEvent, Message
+from nonebot.adapters import Event as BaseEvent
+
+from .message import Message, MessageSegment
 
 
 class Role(BaseModel):
@@ -25,7 +28,7 @@ class Channel(BaseModel):
     is_category: Optional[bool] = Field(None)
     parent_id: Optional[str] = Field(None)
     level: Optional[int] = Field(None)
-    slow_mode: Optional[int] = Field(None)
+    slow_mode: Optional[int] = Field(None)  # 慢速模式间隔 (毫秒)
     type: Optional[int] = Field(None)
     permission_overwrites: Optional[List[Dict]] = Field(None)
     permission_users: Optional[List[Dict[str, Union["User", int]]]] = Field(None)
@@ -87,22 +90,38 @@ class Attachment(BaseModel):
 
 
 class Body(BaseModel):
-    msg_id: str
-    user_id: str
-    author_id: str
-    target_id: str
-    channel_id: str
+    """
+    系统消息的 body，不同事件字段不同，未列出的字段保留为额外属性
+    https://developer.kaiheila.cn/doc/event/event-introduction
+    """
+    msg_id: Optional[str] = None
+    user_id: Optional[str] = None
+    author_id: Optional[str] = None
+    target_id: Optional[str] = None
+    channel_id: Optional[str] = None
     emoji: Optional[Emoji] = None
     content: Optional[str] = None
-    updated_at: int
-    chat_code: str
+    updated_at: Optional[int] = None
+    chat_code: Optional[str] = None
 
     class Config:
         extra = "allow"
 
 
-class Extra(BaseModel):
+class Reply(BaseModel):
+    """
+    被引用(回复)的消息
+    https://developer.kaiheila.cn/doc/objects#%E5%BC%95%E7%94%A8%E6%B6%88%E6%81%AFQuote
+    """
+    id_: str = Field(alias="id")
     type_: Optional[int] = Field(None, alias="type")
+    content: Optional[str] = Field(None)
+    create_at: Optional[int] = Field(None)
+    author: Optional[User] = Field(None)
+
+
+class Extra(BaseModel):
+    type_: Optional[Union[int, str]] = Field(None, alias="type")  # 系统消息时为事件类型 如 added_reaction
     guild_id: Optional[str] = Field(None)
     channel_name: Optional[str] = Field(None)
     mention: Optional[List[str]] = Field(None)
@@ -112,15 +131,75 @@ class Extra(BaseModel):
     author: Optional[User] = Field(None)
     body: Optional[Body] = Field(None)
     attachments: Optional[Attachment] = Field(None)
+    quote: Optional[Reply] = Field(None)
     code: Optional[str] = Field(None)
 
     @validator("body")
     def check_body(cls, v, values):
-        if values["type_"] != 255 and v:  # 非系统消息 没有body
+        if isinstance(values.get("type_"), int) and v:  # 非系统消息 没有body
             raise ValueError("非系统消息不应该有body字段")
         return v
 
 
+class LazyExtra:
+    """
+    延迟解析的 ``extra``：校验事件时只保存原始 dict，
+    首次访问某个属性时才校验该字段（如 ``author``, ``body``, ``attachments``）并缓存结果，属性与 ``Extra`` 一致。
+    ``enabled`` 为 ``False`` 时校验直接得到完整的 ``Extra``
+    """
+    __slots__ = ("_raw", "_cache")
+    enabled = False
+
+    def __init__(self, raw: Dict[str, Any]):
+        self._raw = raw
+        self._cache: Dict[str, Any] = {}
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, v: Any) -> Union["LazyExtra", Extra]:
+        if isinstance(v, (cls, Extra)):
+            return v
+        if not isinstance(v, dict):
+            raise TypeError("extra must be a dict")
+        return cls(v) if cls.enabled else Extra.parse_obj(v)
+
+    @classmethod
+    def construct(cls, v: Dict[str, Any]) -> Union["LazyExtra", Extra]:
+        """不经校验构造，供快速解码使用"""
+        from .decoder import FastDecodeError, construct_model
+        if not isinstance(v, dict):
+            raise FastDecodeError("extra must be a dict")
+        return cls(v) if cls.enabled else construct_model(Extra, v)
+
+    def dict(self) -> Dict[str, Any]:
+        return self._raw
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):  # 未初始化的 slots 以及 copy/pickle 的查找
+            raise AttributeError(name)
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        field = Extra.__fields__.get(name)
+        if field is None:
+            raise AttributeError(f"'Extra' object has no attribute '{name}'")
+        if field.alias in self._raw:
+            value, errors = field.validate(self._raw[field.alias], {}, loc=name, cls=Extra)
+            if errors:
+                raise ValidationError([errors], Extra)
+        else:
+            value = field.get_default()
+        self._cache[name] = value
+        return value
+
+    def __repr__(self) -> str:
+        return f"LazyExtra({self._raw!r})"
+
+
 class Event(BaseEvent):
     """
     事件主要格式 來自 d字段
@@ -138,12 +217,15 @@ class Event(BaseEvent):
     msg_id: str
     msg_timestamp: int
     nonce: str
-    extra: Extra
+    extra: LazyExtra  # 未开启 lazy_extra 时为 Extra
     verify_token: Optional[str] = Field(None)
 
     post_type: str  # onebot兼容 message notice
     self_id: str  # onebot兼容
 
+    class Config:
+        json_encoders = {**BaseEvent.__config__.json_encoders, LazyExtra: LazyExtra.dict}
+
     @overrides(BaseEvent)
     def get_type(self) -> str:
         return str(self.type_)
@@ -252,6 +334,32 @@ class DeletedReactionEvent(ChannelEvent):
     sub_type: Literal["deleted_reaction"] = "deleted_reaction"
 
 
+class ReactionChange(BaseModel):
+    """一个时间窗口内某条消息某个 reaction 的净变化，先加后删的用户不会出现"""
+    msg_id: str
+    emoji: Emoji
+    added: List[str] = []  # 新增 reaction 的用户 id
+    deleted: List[str] = []  # 取消 reaction 的用户 id
+
+
+class ReactionBatchEvent(ChannelEvent):
+    """
+    开启 ``coalesce_window`` 后，一个频道在时间窗口内的 reaction 变化合并为一个事件
+    """
+    __event__ = "notice.channel.reaction_batch"
+    sub_type: Literal["reaction_batch"] = "reaction_batch"
+    changes: List[ReactionChange]
+    collapsed: int = 0  # 状态回到窗口开始前而被抵消、没有出现在 changes 中的用户数
+
+    @overrides(ChannelEvent)
+    def get_user_id(self) -> str:
+        raise ValueError("Batch event has no single user!")
+
+    @overrides(ChannelEvent)
+    def get_session_id(self) -> str:
+        raise ValueError("Batch event has no single user!")
+
+
 class UpdatedMessageEvent(ChannelEvent):
     """
     频道消息更新
@@ -311,7 +419,7 @@ class UnpinnedMessageEvent(ChannelEvent):
 # 私聊消息事件
 class PrivateNoticeEvent(NoticeEvent):
     __event__ = "notice.private"
-    notice_type = "private"
+    notice_type: Literal["private"] = "private"
 
     @overrides(NoticeEvent)
     def get_user_id(self) -> str:
@@ -403,6 +511,30 @@ class GuildMemberOfflineEvent(ServerMemberEvent):
     sub_type: Literal["guild_member_offline"] = "guild_member_offline"
 
 
+class PresenceChange(BaseModel):
+    user_id: str
+    online: bool  # 时间窗口结束时的状态
+    event_time: Optional[int] = None
+
+
+class GuildMemberPresenceBatchEvent(ServerMemberEvent):
+    """
+    开启 ``coalesce_window`` 后，一个服务器在时间窗口内的成员上下线合并为一个事件，上线又下线的成员不会出现
+    """
+    __event__ = "notice.server_member.guild_member_presence_batch"
+    sub_type: Literal["guild_member_presence_batch"] = "guild_member_presence_batch"
+    changes: List[PresenceChange]
+    collapsed: int = 0  # 状态回到窗口开始前而被抵消、没有出现在 changes 中的用户数
+
+    @overrides(ServerMemberEvent)
+    def get_user_id(self) -> str:
+        raise ValueError("Batch event has no single user!")
+
+    @overrides(ServerMemberEvent)
+    def get_session_id(self) -> str:
+        raise ValueError("Batch event has no single user!")
+
+
 # 服务器角色相关事件
 class ServerRoleEvent(NoticeEvent):
     """
@@ -478,17 +610,33 @@ class DeletedBlockListEvent(ServerEvent):
 
 
 # 消息相关事件列表
+# 消息类型 -> MessageEvent.sub_type
+MESSAGE_SUB_TYPES = {
+    1: "text", 2: "image", 3: "video", 4: "file", 8: "audio", 9: "kmarkdown", 10: "card"
+}
+
+
 class MessageEvent(Event):
     """消息事件"""
     __event__ = "message"
     post_type: Literal["message"] = "message"
     message_type: str  # group private 其实是person
     sub_type: str
+    reply: Optional[Reply] = None  # 由 _check_reply 填充
+    to_me: bool = False  # 由 _check_addressing 填充
+    _message: Optional[Message] = PrivateAttr(None)
 
     @property
     def sender(self) -> User:
         return self.extra.author
 
+    @property
+    def message(self) -> Message:
+        """由 ``content`` 构造，首次访问时才拆分 KMarkdown"""
+        if self._message is None:
+            self._message = Message.from_content(self.type_, self.content)
+        return self._message
+
     @overrides(Event)
     def get_type(self) -> str:
         return "message"
@@ -509,11 +657,15 @@ class MessageEvent(Event):
 
     @overrides(Event)
     def get_message(self) -> Message:
-        return self.content  # todo 要写
+        return self.message
 
     @overrides(Event)
     def get_plaintext(self) -> str:
-        return self.content.extract_plain_text()  # todo 要写
+        return self.message.extract_plain_text()
+
+    @overrides(Event)
+    def is_tome(self) -> bool:
+        return self.to_me
 
 
 # 私聊消息
@@ -536,10 +688,6 @@ class GroupMessageEvent(MessageEvent):
     __event__ = "message.group"
     message_type: Literal["group"] = "group"
 
-    @overrides(MessageEvent)
-    def is_tome(self) -> bool:
-        return True if self.extra.mention and self.self_id in self.extra.mention else False
-
     @overrides(Event)
     def get_event_description(self) -> str:
         return (f'Message {self.msg_id} from {self.author_id}@[频道:{self.target_id}] "'
@@ -550,14 +698,56 @@ class GroupMessageEvent(MessageEvent):
         return f"channel_{self.target_id}_{self.author_id}"
 
 
-def get_event_model(event_name) -> List[Type[Event]]:  # todo 改写了
+_event_models: Dict[str, Type[Event]] = {}  # __event__ -> Event Model
+_notice_types: Dict[str, str] = {}  # sub_type -> notice_type
+
+
+def _index_event_models(cls: Type[Event] = Event):
+    """
+    :说明:
+
+      导入时遍历 ``Event`` 的全部子类，按 ``__event__`` 建立索引
+    """
+    for model in cls.__subclasses__():
+        _event_models[model.__event__] = model
+        post_type, _, detail = model.__event__.partition(".")
+        notice_type, _, sub_type = detail.partition(".")
+        if post_type == "notice" and sub_type:
+            _notice_types[sub_type] = notice_type
+        _index_event_models(model)
+
+
+def get_notice_type(sub_type: str) -> Optional[str]:
     """
     :说明:
 
-      根据事件名获取对应 ``Event Model`` 及 ``FallBack Event Model`` 列表
+      根据系统消息 ``extra.type`` 获取其所属的 ``notice_type``，如 ``added_reaction`` -> ``channel``
+    """
+    return _notice_types.get(sub_type)
+
+
+@lru_cache(maxsize=256)
+def get_event_model(event_name: str) -> Tuple[Type[Event], ...]:
+    """
+    :说明:
+
+      根据事件名获取对应 ``Event Model`` 及 ``FallBack Event Model`` 列表，
+      按最长前缀匹配，越具体的 Model 越靠前，最后一个总是 ``Event``
 
     :返回:
 
-      - ``List[Type[Event]]``
+      - ``Tuple[Type[Event], ...]``
     """
-    pass
+    models = []
+    while True:
+        model = _event_models.get(event_name)
+        if model is not None:
+            models.append(model)
+        if not event_name:
+            break
+        event_name = event_name.rpartition(".")[0]
+    return tuple(models)
+
+
+_event_models[Event.__event__] = Event
+_index_event_models()
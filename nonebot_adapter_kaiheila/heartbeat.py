@@ -0,0 +1,132 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Dict, Deque, Optional, TYPE_CHECKING
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from .utils import log
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+# RTT 直方图的桶上界 (毫秒)
+RTT_BUCKETS = (50, 100, 200, 500, 1000, 2000, 6000)
+
+
+class Heartbeat:
+    """
+    心跳：每 ``interval`` 秒发送一次 ping (s=2)，并等待对应的 pong (s=3)
+    同一时刻只有一个未回应的 ping，收到的 pong 即是对它的回应
+    pong 超时后按 2, 4, ... 秒的间隔重试，连续 ``max_missed`` 次超时则认为连接已死，断开连接由 driver 重连并 resume
+    https://developer.kaiheila.cn/doc/websocket
+
+    :参数:
+
+      * ``bot: Bot``: Bot 对象
+      * ``interval: float``: 心跳间隔（秒）
+      * ``timeout: float``: 等待 pong 的超时时间（秒）
+      * ``max_missed: int``: 连续超时多少次后断开连接
+      * ``window: int``: RTT 统计保留的最近样本数
+    """
+
+    def __init__(self,
+                 bot: "Bot",
+                 interval: float = 30.,
+                 timeout: float = 6.,
+                 max_missed: int = 3,
+                 window: int = 100):
+        self.bot = bot
+        self.interval = interval
+        self.timeout = timeout
+        self.max_missed = max_missed
+        self._pong = asyncio.Event()
+        self._rtts: Deque[float] = deque(maxlen=window)  # 毫秒
+
+        self.pings = 0
+        self.pongs = 0
+        self.missed = 0  # 累计超时次数
+        self.dead = False
+
+    def on_pong(self):
+        self._pong.set()
+
+    async def ping(self) -> bool:
+        """
+        :说明:
+
+          发送一次 ping 并等待 pong
+
+        :返回:
+
+          - ``bool``: 是否在超时前收到 pong
+        """
+        self._pong.clear()
+        sent_at = time.perf_counter()
+        await self.bot.request.send(json.dumps({
+            "s": 2,
+            "sn": self.bot.buffer.sn  # 客户端目前收到的最新的消息 sn
+        }))
+        self.pings += 1
+        try:
+            await asyncio.wait_for(self._pong.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.pongs += 1
+        self._rtts.append((time.perf_counter() - sent_at) * 1000)
+        return True
+
+    async def run(self):
+        missed = 0
+        while not self.bot.request.closed:
+            try:
+                ok = await self.ping()
+            except Exception as e:  # 连接已经断开
+                log("DEBUG", "Failed to send heartbeat", e)
+                return
+            if ok:
+                missed = 0
+                self.bot.session_store.save(self.bot.self_id, self.bot.session_id, self.bot.buffer.sn)
+                await asyncio.sleep(self.interval)
+                continue
+            missed += 1
+            self.missed += 1
+            if missed >= self.max_missed:
+                log("WARNING", f"No pong after {missed} heartbeat(s), closing connection")
+                self.dead = True
+                await self.bot.request.close()
+                return
+            log("DEBUG", f"Heartbeat timeout, retrying ({missed}/{self.max_missed})")
+            await asyncio.sleep(min(2 ** missed, self.interval))  # 2, 4 秒指数回退
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        rtts = sorted(self._rtts)
+        histogram: Dict[str, int] = {}
+        index = 0
+        for bound in RTT_BUCKETS:
+            count = 0
+            while index < len(rtts) and rtts[index] <= bound:
+                count += 1
+                index += 1
+            histogram[f"<={bound}ms"] = count
+        histogram[f">{RTT_BUCKETS[-1]}ms"] = len(rtts) - index
+
+        def percentile(p: float) -> Optional[float]:
+            return rtts[min(len(rtts) - 1, int(len(rtts) * p))] if rtts else None
+
+        return {
+            "pings": self.pings,
+            "pongs": self.pongs,
+            "missed": self.missed,
+            "last_rtt": self._rtts[-1] if self._rtts else None,
+            "min_rtt": rtts[0] if rtts else None,
+            "max_rtt": rtts[-1] if rtts else None,
+            "avg_rtt": sum(rtts) / len(rtts) if rtts else None,
+            "p50_rtt": percentile(0.5),
+            "p99_rtt": percentile(0.99),
+            "histogram": histogram
+        }
@@ -0,0 +1,178 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Dict, List, Deque, Tuple, Callable, Optional, Awaitable
+
+from .utils import log
+
+# 优先级从高到低
+LANES = ("message", "notice", "reaction", "presence")
+REACTION_SUB_TYPES = frozenset({"added_reaction", "deleted_reaction", "private_added_reaction",
+                                "private_deleted_reaction"})
+PRESENCE_SUB_TYPES = frozenset({"guild_member_online", "guild_member_offline"})
+
+# (处理函数, 入队时间, 顺序键)
+Item = Tuple[Callable[[], Awaitable[Any]], float, Optional[str]]
+
+
+def lane_of(data: Dict[str, Any]) -> str:
+    """由 ``_complete_event_data`` 补全后的事件数据判断通道"""
+    if data.get("post_type") == "message":
+        return "message"
+    sub_type = data.get("sub_type")
+    if sub_type in REACTION_SUB_TYPES:
+        return "reaction"
+    if sub_type in PRESENCE_SUB_TYPES:
+        return "presence"
+    return "notice"
+
+
+class IngestLane:
+
+    def __init__(self, name: str, max_depth: int, shed: bool):
+        self.name = name
+        self.max_depth = max(max_depth, 1)
+        self.shed = shed  # 满时丢弃最旧的事件，否则阻塞入队
+        self.items: Deque[Item] = deque()
+        self.space = asyncio.Semaphore(self.max_depth)
+
+        self.enqueued = 0
+        self.handled = 0
+        self.shed_count = 0
+        self.peak_depth = 0
+        self.blocked_time = 0.  # 入队等待空位的总时间（秒）
+        self.wait_time = 0.  # 事件在队列中等待的总时间（秒）
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "peak_depth": self.peak_depth,
+            "enqueued": self.enqueued,
+            "handled": self.handled,
+            "shed": self.shed_count,
+            "blocked_time": self.blocked_time,
+            "avg_wait": self.wait_time / self.handled if self.handled else None
+        }
+
+
+class IngestQueue:
+    """
+    ``Buffer`` 与 ``handle_event`` 之间的有界队列：``workers`` 个协程并发处理事件，总是先取优先级高的通道。
+    ``shed_lanes`` 中的通道满时丢弃最旧的事件，其它通道满时阻塞入队，从而阻塞 sn 缓冲区的投递形成背压。
+    同一 ``key`` (频道) 的事件不并发处理：``key`` 正在处理时取出的事件排在它之后，由同一个工作协程按取出顺序处理，
+    因此同一频道、同一通道的事件按入队顺序处理；不同通道之间仍按优先级
+
+    :参数:
+
+      * ``workers: int``: 并发处理事件的协程数
+      * ``max_depth: Dict[str, int]``: 各通道最多排队的事件数
+      * ``shed_lanes: Tuple[str, ...]``: 满时丢弃最旧事件的通道
+    """
+
+    def __init__(self, workers: int, max_depth: Dict[str, int], shed_lanes: Tuple[str, ...] = ("reaction", "presence")):
+        self.lanes = [IngestLane(name, max_depth.get(name, 1000), name in shed_lanes) for name in LANES]
+        self._lanes = {lane.name: lane for lane in self.lanes}
+        self._ready = asyncio.Semaphore(0)  # 所有通道中排队的事件数
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, Deque[Tuple[IngestLane, Item]]] = {}  # 正在处理的 key -> 排在其后的事件
+        self.worker_count = workers
+        self.busy = 0
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._running.clear()
+
+    async def put(self, lane_name: str, handler: Callable[[], Awaitable[Any]], key: Optional[str] = None):
+        """
+        :参数:
+
+          * ``lane_name: str``: 通道名，见 ``LANES``
+          * ``handler: Callable[[], Awaitable[Any]]``: 处理事件的协程函数
+          * ``key: Optional[str]``: 顺序键，相同 ``key`` 的事件依次处理，为 ``None`` 时不限制
+        """
+        self.start()
+        lane = self._lanes[lane_name]
+        lane.enqueued += 1
+        if lane.shed:
+            if len(lane.items) >= lane.max_depth:
+                lane.items.popleft()
+                lane.shed_count += 1
+            else:
+                self._ready.release()
+        else:
+            if lane.space.locked():
+                blocked_at = time.monotonic()
+                await lane.space.acquire()
+                lane.blocked_time += time.monotonic() - blocked_at
+            else:
+                await lane.space.acquire()
+            self._ready.release()
+        lane.items.append((handler, time.monotonic(), key))
+        lane.peak_depth = max(lane.peak_depth, len(lane.items))
+
+    def _pop(self) -> Tuple[IngestLane, Item]:
+        for lane in self.lanes:
+            if lane.items:
+                return lane, lane.items.popleft()
+        raise RuntimeError("Ingest queue is empty")  # 与 _ready 计数不一致，不应发生
+
+    async def _work(self):
+        while True:
+            await self._ready.acquire()
+            lane, item = self._pop()
+            if not lane.shed:
+                lane.space.release()
+            key = item[2]
+            if key is None:
+                await self._handle(lane, item)
+                continue
+            following = self._running.get(key)
+            if following is not None:  # 其它工作协程正在处理该 key，交给它按顺序处理
+                following.append((lane, item))
+                continue
+            following = self._running[key] = deque()
+            try:
+                await self._handle(lane, item)
+                while following:
+                    await self._handle(*following.popleft())
+            finally:
+                self._running.pop(key, None)
+
+    async def _handle(self, lane: IngestLane, item: Item):
+        handler, enqueued_at, _ = item
+        lane.wait_time += time.monotonic() - enqueued_at
+        self.busy += 1
+        try:
+            await handler()
+        except Exception as e:
+            log("ERROR", f"Error when handling {lane.name} event", e)
+        finally:
+            self.busy -= 1
+            lane.handled += 1
+
+    @property
+    def deferred(self) -> int:
+        """已取出、排在同一 key 的事件之后等待处理的事件数"""
+        return sum(map(len, self._running.values()))
+
+    @property
+    def depth(self) -> int:
+        return sum(len(lane.items) for lane in self.lanes) + self.deferred
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "busy": self.busy,
+            "depth": self.depth,
+            "deferred": self.deferred,
+            "lanes": {lane.name: lane.stats for lane in self.lanes}
+        }
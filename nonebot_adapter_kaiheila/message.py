@@ -2,12 +2,13 @@ import re
 from io import BytesIO
 from pathlib import Path
 from base64 import b64encode
-from typing import Type, Union, Tuple, Mapping, Iterable, Optional, BinaryIO
+from typing import Any, Dict, List, Type, Union, Tuple, Mapping, Callable, Iterable, Iterator, Optional
 
 from nonebot.typing import overrides
 from nonebot.adapters import Message as BaseMessage, MessageSegment as BaseMessageSegment
 
-from .utils import log, escape, unescape, _b2s
+from .card import Card, CardTemplate
+from .utils import log, escape, unescape, FileContent
 
 
 class MessageSegment(BaseMessageSegment["Message"]):
@@ -15,8 +16,11 @@ class MessageSegment(BaseMessageSegment["Message"]):
     Kaiheila 协议 MessageSegment 适配。具体方法参考协议消息段类型或源码。
     type=1
     data={"content":"xxx"}
+
+    KMarkdown 消息会被拆分为文字 (type=1) 与 ``mention``, ``mention_role``, ``mention_all``, ``mention_here``,
+    ``channel``, ``emoji``, ``code``, ``link`` 等消息段，发送时再合并为一条 KMarkdown 消息
     """
-    type: int
+    type: Union[int, str]
     # https://developer.kaiheila.cn/doc/event/event-introduction
     types = {
         1: "文字消息", 2: "图片消息", 3: "视频消息", 4: "文件消息", 8: "音频消息", 9: "KMarkdown", 10: "card消息", 255: "系统消息"
@@ -29,8 +33,15 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
     @overrides(BaseMessageSegment)
     def __str__(self) -> str:
-        data = self.data.copy()
-        return data.get("content")
+        if isinstance(self.type, str):
+            parts: List[str] = []
+            _write_segment(self, parts)
+            return "".join(parts)
+        return self.data.get("content")
+
+    def is_kmarkdown(self) -> bool:
+        """是否可以合并进一条 KMarkdown 消息"""
+        return self.type in (1, 9) or self.type in _KMARKDOWN_WRITERS
 
     @overrides(BaseMessageSegment)
     def __add__(self, other) -> "Message":
@@ -47,9 +58,9 @@ class MessageSegment(BaseMessageSegment["Message"]):
         return self.type == 1
 
     @staticmethod
-    def image(file: BinaryIO, **kwargs) -> "MessageSegment":
+    def image(file: Union[str, FileContent], **kwargs) -> "MessageSegment":
         """
-        :param file:
+        :param file: 已上传的 url，或发送时上传的 Path, bytes, 文件对象
         :param kwargs:
             target_id str
             content str
@@ -59,7 +70,7 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(2, ({"content": file}).update(kwargs))
+        return MessageSegment(2, {"content": file, **kwargs})
 
     @staticmethod
     def text(text: str, **kwargs) -> "MessageSegment":
@@ -74,12 +85,12 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(1, ({"content": text}).update(kwargs))
+        return MessageSegment(1, {"content": text, **kwargs})
 
     @staticmethod
-    def video(file: BinaryIO, **kwargs) -> "MessageSegment":
+    def video(file: Union[str, FileContent], **kwargs) -> "MessageSegment":
         """
-        :param file:
+        :param file: 已上传的 url，或发送时上传的 Path, bytes, 文件对象
         :param kwargs:
             target_id str
             content str
@@ -89,12 +100,12 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(3, ({"content": file}).update(kwargs))
+        return MessageSegment(3, {"content": file, **kwargs})
 
     @staticmethod
-    def file(file: BinaryIO, **kwargs) -> "MessageSegment":
+    def file(file: Union[str, FileContent], **kwargs) -> "MessageSegment":
         """
-        :param file:
+        :param file: 已上传的 url，或发送时上传的 Path, bytes, 文件对象
         :param kwargs:
             target_id str
             content str
@@ -104,12 +115,12 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(4, ({"content": file}).update(kwargs))
+        return MessageSegment(4, {"content": file, **kwargs})
 
     @staticmethod
-    def audio(file: BinaryIO, **kwargs) -> "MessageSegment":
+    def audio(file: Union[str, FileContent], **kwargs) -> "MessageSegment":
         """
-        :param file:
+        :param file: 已上传的 url，或发送时上传的 Path, bytes, 文件对象
         :param kwargs:
             target_id str
             content str
@@ -119,7 +130,39 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(8, ({"content": file}).update(kwargs))
+        return MessageSegment(8, {"content": file, **kwargs})
+
+    @staticmethod
+    def mention(user_id: str) -> "MessageSegment":
+        return MessageSegment("mention", {"user_id": user_id})
+
+    @staticmethod
+    def mention_role(role_id: str) -> "MessageSegment":
+        return MessageSegment("mention_role", {"role_id": role_id})
+
+    @staticmethod
+    def mention_all() -> "MessageSegment":
+        return MessageSegment("mention_all", {})
+
+    @staticmethod
+    def mention_here() -> "MessageSegment":
+        return MessageSegment("mention_here", {})
+
+    @staticmethod
+    def channel(channel_id: str) -> "MessageSegment":
+        return MessageSegment("channel", {"channel_id": channel_id})
+
+    @staticmethod
+    def emoji(name: str, id_: str) -> "MessageSegment":
+        return MessageSegment("emoji", {"name": name, "id": id_})
+
+    @staticmethod
+    def code(content: str, language: Optional[str] = None, block: bool = False) -> "MessageSegment":
+        return MessageSegment("code", {"content": content, "language": language, "block": block or bool(language)})
+
+    @staticmethod
+    def link(text: str, url: str) -> "MessageSegment":
+        return MessageSegment("link", {"text": text, "url": url})
 
     @staticmethod
     def kmarkdown(text: str, **kwargs) -> "MessageSegment":
@@ -134,7 +177,32 @@ class MessageSegment(BaseMessageSegment["Message"]):
 
         :return:
         """
-        return MessageSegment(9, ({"content":text}).update(kwargs))
+        return MessageSegment(9, {"content": text, **kwargs})
+
+    @staticmethod
+    def card(card: Union[str, Card, Iterable[Card], CardTemplate],
+             values: Optional[Mapping[str, Any]] = None,
+             **kwargs) -> "MessageSegment":
+        """
+        :说明:
+
+          卡片消息，``card`` 为 ``CardTemplate`` 时用 ``values`` 替换其中的占位符，
+          否则立即序列化；已序列化的 JSON 字符串原样发送
+
+        :param card: Card, Card 列表, CardTemplate 或 JSON 字符串
+        :param values: 模板占位符的值
+        :param kwargs:
+            quote str
+            nonce str
+            temp_target_id str
+        """
+        if isinstance(card, CardTemplate):
+            content = card.render(values)
+        elif isinstance(card, str):
+            content = card
+        else:
+            content = CardTemplate(card).render()
+        return MessageSegment(10, {"content": content, **kwargs})
 
 
 class Message(BaseMessage[MessageSegment]):
@@ -169,37 +237,175 @@ class Message(BaseMessage[MessageSegment]):
             return
         elif isinstance(msg, Iterable) and not isinstance(msg, str):
             for seg in msg:
-                yield MessageSegment(seg["type"], seg.get("data") or {})
+                yield seg if isinstance(seg, MessageSegment) else MessageSegment(seg["type"], seg.get("data") or {})
             return
         elif isinstance(msg, str):
+            yield from iter_kmarkdown(msg)
+
+    @classmethod
+    def from_content(cls, type_: int, content: str) -> "Message":
+        """
+        :说明:
 
-            def _iter_message(msg: str) -> Iterable[Tuple[str, str]]:
-                text_begin = 0
-                for cqcode in re.finditer(
-                        r"\[CQ:(?P<type>[a-zA-Z0-9-_.]+)"
-                        r"(?P<params>"
-                        r"(?:,[a-zA-Z0-9-_.]+=[^,\]]+)*"
-                        r"),?\]", msg):
-                    yield "text", msg[text_begin:cqcode.pos + cqcode.start()]
-                    text_begin = cqcode.pos + cqcode.end()
-                    yield cqcode.group("type"), cqcode.group("params").lstrip(
-                        ",")
-                yield "text", msg[text_begin:]
-
-            for type_, data in _iter_message(msg):
-                if type_ == "text":
-                    if data:
-                        # only yield non-empty text segment
-                        yield MessageSegment(type_, {"text": unescape(data)})
-                else:
-                    data = {
-                        k: unescape(v) for k, v in map(
-                            lambda x: x.split("=", maxsplit=1),
-                            filter(lambda x: x, (
-                                x.lstrip() for x in data.split(","))))
-                    }
-                    yield MessageSegment(type_, data)
+          由事件的 ``type`` 与 ``content`` 构造消息，文字与 KMarkdown 消息会被拆分为消息段
+        """
+        if type_ == 9:
+            return cls(iter_kmarkdown(content))
+        if type_ == 1:
+            return cls(iter_kmarkdown(content, kmarkdown=False))
+        return cls(MessageSegment(type_, {"content": content}))
+
+    def to_kmarkdown(self) -> str:
+        """
+        :说明:
+
+          一次遍历将消息序列化为 KMarkdown，文字消息段会被转义
+        """
+        parts: List[str] = []
+        for seg in self:
+            if seg.type == 1:
+                parts.append(escape(seg.data["content"]))
+            elif seg.type == 9:
+                parts.append(seg.data["content"])
+            else:
+                _write_segment(seg, parts)
+        return "".join(parts)
+
+    @property
+    def mentions(self) -> List[str]:
+        """消息中 @ 的用户 id"""
+        return [seg.data["user_id"] for seg in self if seg.type == "mention"]
 
     @overrides(BaseMessage)
     def extract_plain_text(self) -> str:
-        return "".join(seg.data["text"] for seg in self if seg.is_text())
+        """文字与去除格式标记后的 KMarkdown 文字"""
+        return "".join(seg.data["content"] if seg.type == 1 else _strip_markup(seg.data["content"])
+                       for seg in self if seg.type in (1, 9))
+
+
+def _write_code(data: Dict[str, Any], parts: List[str]):
+    if data.get("block"):
+        parts += ("```", data.get("language") or "", "\n", data["content"], "\n```")
+    else:
+        parts += ("`", data["content"], "`")
+
+
+_KMARKDOWN_WRITERS: Dict[str, Callable[[Dict[str, Any], List[str]], Any]] = {
+    "mention": lambda data, parts: parts.extend(("(met)", data["user_id"], "(met)")),
+    "mention_all": lambda data, parts: parts.append("(met)all(met)"),
+    "mention_here": lambda data, parts: parts.append("(met)here(met)"),
+    "mention_role": lambda data, parts: parts.extend(("(rol)", str(data["role_id"]), "(rol)")),
+    "channel": lambda data, parts: parts.extend(("(chn)", data["channel_id"], "(chn)")),
+    "emoji": lambda data, parts: parts.extend(("(emj)", data["name"], "(emj)[", data["id"], "]")),
+    "code": _write_code,
+    "link": lambda data, parts: parts.extend(("[", escape(data["text"]), "](", data["url"], ")"))
+}
+
+
+def _write_segment(seg: MessageSegment, parts: List[str]):
+    writer = _KMARKDOWN_WRITERS.get(seg.type)
+    if writer is None:
+        raise ValueError(f"Message segment of type {seg.type!r} cannot be written as KMarkdown, "
+                         f"send it as a separate message")
+    writer(seg.data, parts)
+
+
+# https://developer.kaiheila.cn/doc/kmarkdown
+_KMARKDOWN_TOKEN = re.compile(
+    r"(?P<escaped>\\.)"
+    r"|\(met\)(?P<mention>[^()\s]+)\(met\)"
+    r"|\(rol\)(?P<mention_role>\d+)\(rol\)"
+    r"|\(chn\)(?P<channel>\d+)\(chn\)"
+    r"|\(emj\)(?P<emoji_name>[^()]+)\(emj\)\[(?P<emoji_id>[^\]]+)\]"
+    r"|```(?P<code_language>[^\n`]*)\n(?P<code_block>.*?)\n?```"
+    r"|`(?P<code>[^`\n]+)`"
+    r"|\[(?P<link_text>(?:\\.|[^\]\\])*)\]\((?P<link_url>[^()\s]+)\)",
+    re.DOTALL)
+_MENTION_TOKEN = re.compile(
+    r"\(met\)(?P<mention>[^()\s]+)\(met\)"
+    r"|\(rol\)(?P<mention_role>\d+)\(rol\)"
+    r"|\(chn\)(?P<channel>\d+)\(chn\)")
+
+
+# 文字中的格式标记，命名组为去除标记后保留的内容；单独出现的 ``**`` 等标记多为被 @ 等消息段隔开的一对
+_KMARKDOWN_MARKUP = re.compile(
+    r"(?P<escaped>\\.)"
+    r"|(?P<emphasis>\*{1,3}|~~)(?P<emphasized>\S(?:.*?\S)?)(?P=emphasis)"
+    r"|\((?P<tag>ins|spl)\)(?P<tagged>.+?)\((?P=tag)\)"
+    r"|\(font\)(?P<font>.+?)\(font\)\[[^\]]*\]"
+    r"|^>[ \t]?(?P<quote>[^\n]*)$"
+    r"|(?P<divider>^-{3,}[ \t]*$)"
+    r"|(?P<marker>\*\*|~~|\((?:ins|spl|font)\))",
+    re.MULTILINE | re.DOTALL)
+
+
+def _has_markup(raw: str) -> bool:
+    return any(m.lastgroup != "escaped" for m in _KMARKDOWN_MARKUP.finditer(raw))
+
+
+def _strip_markup(raw: str) -> str:
+    """去除 KMarkdown 文字的格式标记与转义"""
+
+    def replace(m: "re.Match") -> str:
+        kind = m.lastgroup
+        if kind == "escaped":
+            return m.group()[1]
+        if kind in ("divider", "marker"):
+            return ""
+        return _strip_markup(m.group(kind))
+
+    return _KMARKDOWN_MARKUP.sub(replace, raw)
+
+
+def _token_segment(m: "re.Match") -> MessageSegment:
+    kind = m.lastgroup
+    if kind == "mention":
+        user_id = m.group("mention")
+        if user_id in ("all", "here"):
+            return MessageSegment(f"mention_{user_id}", {})
+        return MessageSegment.mention(user_id)
+    if kind == "mention_role":
+        return MessageSegment.mention_role(m.group("mention_role"))
+    if kind == "channel":
+        return MessageSegment.channel(m.group("channel"))
+    if kind == "emoji_id":
+        return MessageSegment.emoji(m.group("emoji_name"), m.group("emoji_id"))
+    if kind == "code_block":
+        return MessageSegment.code(m.group("code_block"), m.group("code_language") or None, block=True)
+    if kind == "code":
+        return MessageSegment.code(m.group("code"))
+    return MessageSegment.link(unescape(m.group("link_text")), m.group("link_url"))
+
+
+def _text_segment(raw: str, kmarkdown: bool) -> MessageSegment:
+    if not kmarkdown:
+        return MessageSegment.text(raw)
+    if _has_markup(raw):
+        # 含有格式标记的片段保持原样，以便原样发送
+        return MessageSegment.kmarkdown(raw)
+    return MessageSegment.text(unescape(raw))
+
+
+def iter_kmarkdown(content: str, kmarkdown: bool = True) -> Iterator[MessageSegment]:
+    """
+    :说明:
+
+      惰性地将 KMarkdown 拆分为消息段：``mention``, ``mention_all``, ``mention_here``, ``mention_role``,
+      ``channel``, ``emoji``, ``code``, ``link``，其间的纯文字为 type=1 (已去除转义)，带加粗、引用等格式的文字为 type=9。
+      ``kmarkdown`` 为 ``False`` 时只识别 @用户/角色/频道，文字保持原样（用于 type=1 的文字消息）
+
+    :参数:
+
+      * ``content: str``: 消息内容
+      * ``kmarkdown: bool``: 是否按 KMarkdown 处理转义、代码与链接
+    """
+    text_begin = 0
+    for m in (_KMARKDOWN_TOKEN if kmarkdown else _MENTION_TOKEN).finditer(content):
+        if m.lastgroup == "escaped":
+            continue
+        if m.start() > text_begin:
+            yield _text_segment(content[text_begin:m.start()], kmarkdown)
+        text_begin = m.end()
+        yield _token_segment(m)
+    if len(content) > text_begin:
+        yield _text_segment(content[text_begin:], kmarkdown)
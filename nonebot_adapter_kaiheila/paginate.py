@@ -0,0 +1,57 @@
+import asyncio
+from collections import deque
+from typing import Any, Dict, Type, Deque, TypeVar, Optional, AsyncIterator, TYPE_CHECKING
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+M = TypeVar("M", bound=BaseModel)
+
+
+async def paginate(bot: "Bot",
+                   endpoint: str,
+                   model: Type[M],
+                   params: Optional[Dict[str, Any]] = None,
+                   page_size: int = 50,
+                   concurrency: int = 1) -> AsyncIterator[M]:
+    """
+    :说明:
+
+      逐个产生分页列表接口的条目。第一页返回 ``meta.page_total`` 后，始终保持 ``concurrency`` 个后续页面在请求中，
+      为 1 时即消费当前页时预取下一页；条目仍按页码顺序产生。提前结束迭代时取消未完成的请求
+
+    :参数:
+
+      * ``bot: Bot``: 调用接口的 Bot
+      * ``endpoint: str``: 接口，如 ``/guild/list``
+      * ``model: Type[BaseModel]``: 条目的类型
+      * ``params: Optional[Dict[str, Any]]``: 除 ``page``, ``page_size`` 外的参数
+      * ``page_size: int``: 每页条目数
+      * ``concurrency: int``: 同时请求的页数
+    """
+    params = dict(params or {}, page_size=page_size)
+
+    async def fetch(page: int) -> Dict[str, Any]:
+        return await bot.call_api(endpoint, params={**params, "page": page})
+
+    result = await fetch(1)
+    page_total = (result.get("meta") or {}).get("page_total", 1)
+    pending: Deque["asyncio.Task[Dict[str, Any]]"] = deque()
+    next_page = 2
+    try:
+        while True:
+            while len(pending) < max(concurrency, 1) and next_page <= page_total:
+                pending.append(asyncio.create_task(fetch(next_page)))
+                next_page += 1
+            for item in result.get("items") or ():
+                yield bot._parse_model(model, item)
+            if not pending:
+                return
+            result = await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        # 等待取消完成，不留下未回收的任务与异常
+        await asyncio.gather(*pending, return_exceptions=True)
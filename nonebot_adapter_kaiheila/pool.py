@@ -0,0 +1,111 @@
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+class HTTPPool:
+    """
+    所有 Bot 与网关查询共用的 HTTP 连接池
+
+    连接保持 keep-alive 复用，并缓存 DNS 结果；``ClientSession`` 在第一次使用时才创建，以绑定到运行中的事件循环
+    """
+
+    def __init__(self,
+                 limit: int = 100,
+                 limit_per_host: int = 0,
+                 keepalive_timeout: float = 15.,
+                 dns_cache_ttl: Optional[float] = 300.):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        self.requests = 0
+        self.failures = 0
+        self.connections_created = 0  # 新建的连接数
+        self.connections_reused = 0  # 复用 keep-alive 连接的次数
+        self.queued_time = 0.  # 等待空闲连接的总时间（秒）
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             use_dns_cache=self.dns_cache_ttl is not None,
+                                             ttl_dns_cache=self.dns_cache_ttl)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  json_serialize=json.dumps,
+                                                  trace_configs=[self._trace_config()])
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context: SimpleNamespace, params):
+            self.requests += 1
+
+        async def on_request_exception(session, context: SimpleNamespace, params):
+            self.failures += 1
+
+        async def on_queued_start(session, context: SimpleNamespace, params):
+            context.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, context: SimpleNamespace, params):
+            self.queued_time += time.perf_counter() - context.queued_at
+
+        async def on_connection_create_end(session, context: SimpleNamespace, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context: SimpleNamespace, params):
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(session, context: SimpleNamespace, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context: SimpleNamespace, params):
+            self.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        connector = self._session.connector if self._session is not None else None
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            # aiohttp 没有公开连接数，只能读取 connector 内部状态
+            "in_use": len(getattr(connector, "_acquired", ())),
+            "idle": sum(map(len, getattr(connector, "_conns", {}).values())),
+            "requests": self.requests,
+            "failures": self.failures,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": self.connections_reused / self.requests if self.requests else None,
+            "queued_time": self.queued_time,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses
+        }
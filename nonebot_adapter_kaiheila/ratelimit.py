@@ -0,0 +1,128 @@
+import time
+import asyncio
+from typing import Any, Dict, Mapping, Optional
+
+from .utils import log
+
+
+class Bucket:
+    """
+    一个限速桶，多个接口可能共享同一个桶
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.  # time.monotonic()
+        self.period = 0.  # 最近一次响应给出的重置间隔 用于估计下一个窗口
+        self.lock = asyncio.Lock()  # 排队等待额度 先到先得
+
+        self.calls = 0
+        self.waited_calls = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_after": max(0., self.reset_at - time.monotonic()),
+            "calls": self.calls,
+            "waited_calls": self.waited_calls,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait
+        }
+
+
+class RateLimiter:
+    """
+    根据开黑啦返回的 ``X-Rate-Limit-*`` 响应头学习每个接口所属的桶、剩余次数与重置时间，
+    在额度用尽前让调用排队等待；触发全局限速时所有接口一起等待
+    https://developer.kaiheila.cn/doc/rate-limit
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, str] = {}  # endpoint -> bucket
+        self._buckets: Dict[str, Bucket] = {}
+        self._global_reset_at = 0.
+
+        self.limited = 0  # 收到 429 的次数
+        self.global_limited = 0
+
+    async def acquire(self, endpoint: str) -> float:
+        """
+        :说明:
+
+          在调用 ``endpoint`` 前获取额度，额度不足时等待到重置
+
+        :返回:
+
+          - ``float``: 等待的秒数
+        """
+        start = time.monotonic()
+        delay = self._global_reset_at - start
+        if delay > 0:
+            await asyncio.sleep(delay)
+        bucket = self._buckets.get(self._routes.get(endpoint, endpoint))
+        if bucket is not None:
+            async with bucket.lock:
+                now = time.monotonic()
+                if bucket.remaining is not None and bucket.remaining <= 0:
+                    if bucket.reset_at > now:
+                        await asyncio.sleep(bucket.reset_at - now)
+                    # 新窗口 在下一次响应更新前按上一个窗口的长度估计
+                    bucket.remaining = bucket.limit
+                    bucket.reset_at = time.monotonic() + bucket.period
+                if bucket.remaining is not None:
+                    bucket.remaining -= 1
+        waited = time.monotonic() - start
+        if bucket is not None:
+            bucket.calls += 1
+            if waited > 0.001:
+                bucket.waited_calls += 1
+                bucket.total_wait += waited
+                bucket.max_wait = max(bucket.max_wait, waited)
+        return waited
+
+    def update(self, endpoint: str, status: int, headers: Mapping[str, str]):
+        """
+        :说明:
+
+          用响应头更新 ``endpoint`` 所属桶的状态
+        """
+        remaining = headers.get("X-Rate-Limit-Remaining")
+        reset = headers.get("X-Rate-Limit-Reset")
+        if remaining is None or reset is None:
+            return
+        now = time.monotonic()
+        name = headers.get("X-Rate-Limit-Bucket") or endpoint
+        self._routes[endpoint] = name
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = Bucket(name)
+        limit = headers.get("X-Rate-Limit-Limit")
+        if limit is not None:
+            bucket.limit = int(limit)
+        bucket.remaining = int(remaining)
+        bucket.period = float(reset)
+        bucket.reset_at = now + bucket.period
+        if status == 429:
+            self.limited += 1
+            bucket.remaining = 0
+            if "X-Rate-Limit-Global" in headers:
+                self.global_limited += 1
+                self._global_reset_at = bucket.reset_at
+                log("WARNING", f"Global rate limit hit, all API calls wait {reset}s")
+            else:
+                log("WARNING", f"Rate limit of bucket {name} hit, waiting {reset}s")
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limited": self.limited,
+            "global_limited": self.global_limited,
+            "global_reset_after": max(0., self._global_reset_at - time.monotonic()),
+            "buckets": {name: bucket.stats for name, bucket in self._buckets.items()}
+        }
@@ -0,0 +1,134 @@
+import time
+import random
+from typing import Any, Dict, Optional
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class CircuitBreaker:
+    """
+    一个接口的熔断器：连续失败 ``failure_threshold`` 次后打开，``reset_timeout`` 秒内直接失败；
+    之后半开，只放行一个试探请求，成功则关闭，失败则重新打开。试探请求被取消而没有结果时，``reset_timeout`` 秒后放行下一个
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0  # 连续失败次数
+        self.opened_at = 0.  # time.monotonic()
+        self._probe_at: Optional[float] = None
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probe_at = None
+        if self.state == "half_open" and (self._probe_at is None or now - self._probe_at >= self.reset_timeout):
+            self._probe_at = now
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probe_at = None
+            self.opened += 1
+
+    @property
+    def retry_after(self) -> float:
+        """打开状态下距离半开的秒数"""
+        return max(0., self.opened_at + self.reset_timeout - time.monotonic())
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after if self.state == "open" else 0.
+        }
+
+
+class RetryPolicy:
+    """
+    ``_call_api`` 的重试策略：幂等请求在超时、连接错误与 5xx 时重试，非幂等请求只在连接未建立时重试，
+    避免重复发送消息。重试间隔为 ``backoff_base * 2 ** attempt`` 以内的随机值（full jitter），不超过 ``backoff_max``。
+    每个接口一个 ``CircuitBreaker``，开黑啦服务异常时直接失败，不再堆积等待中的调用
+
+    :参数:
+
+      * ``max_retries: int``: 最多重试次数，不含 429 重新排队
+      * ``backoff_base: float``: 第一次重试的最长间隔（秒）
+      * ``backoff_max: float``: 重试间隔上限（秒）
+      * ``failure_threshold: int``: 连续失败多少次后熔断，0 为不熔断
+      * ``reset_timeout: float``: 熔断后多久放行试探请求（秒）
+    """
+
+    def __init__(self,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 10.,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failed = 0
+
+    @staticmethod
+    def idempotent(method: str) -> bool:
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def allow(self, endpoint: str) -> bool:
+        return self.failure_threshold <= 0 or self.breaker(endpoint).allow()
+
+    def success(self, endpoint: str):
+        if self.failure_threshold > 0:
+            self.breaker(endpoint).success()
+
+    def failure(self, endpoint: str):
+        if self.failure_threshold > 0:
+            self.breaker(endpoint).failure()
+
+    def backoff(self, retry: int) -> float:
+        """第 ``retry`` 次重试（从 0 开始）前等待的秒数"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "failed": self.failed,
+            "breakers": {endpoint: breaker.stats for endpoint, breaker in self._breakers.items()
+                         if breaker.state != "closed" or breaker.opened}
+        }
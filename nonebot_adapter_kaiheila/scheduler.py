@@ -0,0 +1,119 @@
+import time
+import asyncio
+from typing import Any, Dict, Tuple, Callable, Optional, Awaitable
+
+from .utils import log
+
+Job = Tuple[Callable[[], Awaitable[Any]], asyncio.Future]
+
+
+class Lane:
+    """
+    一个 target_id 的发送通道，通道内严格按提交顺序逐条发送
+    """
+
+    def __init__(self, target_id: str):
+        self.target_id = target_id
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self.last_sent = 0.  # time.monotonic()
+        self.sent = 0
+        self.worker: Optional[asyncio.Task] = None
+
+
+class SendScheduler:
+    """
+    出站消息调度器：每个 target_id 一条 FIFO 通道，不同通道并发发送，同时发送数不超过 ``max_concurrency``，
+    频道开启慢速模式时同一通道两次发送之间至少间隔 ``slow_mode`` 秒
+
+    :参数:
+
+      * ``max_concurrency: int``: 所有通道同时进行的发送数上限
+      * ``idle_timeout: float``: 通道空闲多久后回收（秒）
+    """
+
+    def __init__(self, max_concurrency: int = 8, idle_timeout: float = 60.):
+        self.idle_timeout = idle_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lanes: Dict[str, Lane] = {}
+        self._slow_mode: Dict[str, float] = {}
+
+        self.submitted = 0
+        self.failed = 0
+
+    def set_slow_mode(self, target_id: str, seconds: Optional[float]):
+        """
+        :说明:
+
+          设置频道慢速模式间隔，``seconds`` 为空或 0 时取消
+        """
+        if seconds:
+            self._slow_mode[target_id] = seconds
+        else:
+            self._slow_mode.pop(target_id, None)
+
+    def submit(self, target_id: str, job: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        :说明:
+
+          将发送任务排入 ``target_id`` 的通道
+
+        :返回:
+
+          - ``asyncio.Future``: 任务完成后得到其返回值或异常
+        """
+        future = asyncio.get_event_loop().create_future()
+        lane = self._lanes.get(target_id)
+        if lane is None:
+            lane = self._lanes[target_id] = Lane(target_id)
+        lane.queue.put_nowait((job, future))
+        if lane.worker is None or lane.worker.done():
+            lane.worker = asyncio.create_task(self._run_lane(lane))
+        self.submitted += 1
+        return future
+
+    async def _run_lane(self, lane: Lane):
+        while True:
+            try:
+                job, future = await asyncio.wait_for(lane.queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if lane.queue.empty():
+                    del self._lanes[lane.target_id]
+                    return
+                continue
+            if future.cancelled():
+                continue
+            delay = lane.last_sent + self._slow_mode.get(lane.target_id, 0.) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self._semaphore:
+                # 任务在自己的 Task 中运行：任务内部等待的对象被取消时只结束这一条，通道继续发送后面的消息
+                task = asyncio.ensure_future(job())
+                try:
+                    await asyncio.wait((task,))
+                except asyncio.CancelledError:  # 通道本身被取消
+                    task.cancel()
+                    raise
+                finally:
+                    lane.last_sent = time.monotonic()
+                    lane.sent += 1
+            if task.cancelled():
+                self.failed += 1
+                log("DEBUG", f"Sending message to {lane.target_id} was cancelled")
+                future.cancel()
+            elif task.exception() is not None:
+                self.failed += 1
+                log("DEBUG", f"Failed to send message to {lane.target_id}", task.exception())
+                if not future.cancelled():
+                    future.set_exception(task.exception())
+            elif not future.cancelled():
+                future.set_result(task.result())
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "failed": self.failed,
+            "lanes": len(self._lanes),
+            "queued": sum(lane.queue.qsize() for lane in self._lanes.values()),
+            "slow_mode_channels": len(self._slow_mode)
+        }
@@ -0,0 +1,85 @@
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from .utils import log
+
+
+class SessionStore:
+    """
+    session_id 与最后连续收到的 sn 的检查点，用于断线后 resume，以及短时间内可以复用的网关地址
+    ``path`` 为空时只保存在内存中，进程重启后无法 resume
+    https://developer.kaiheila.cn/doc/websocket
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        if path is not None and path.exists():
+            try:
+                self._sessions = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                log("WARNING", f"Failed to load session checkpoint {path}: {e!r}")
+
+    def get(self, self_id: str) -> Optional[Dict[str, Any]]:
+        """
+        :返回:
+
+          - ``Optional[Dict[str, Any]]``: ``{"session_id": str, "sn": int, "updated_at": float}``，没有可以 resume 的会话时为 ``None``
+        """
+        checkpoint = self._sessions.get(self_id)
+        if checkpoint and checkpoint.get("session_id") and checkpoint.get("sn") is not None:
+            return checkpoint
+        return None
+
+    def save(self, self_id: str, session_id: Optional[str], sn: Optional[int]):
+        if not session_id or sn is None:
+            return
+        checkpoint = self._sessions.get(self_id)
+        if checkpoint and checkpoint["session_id"] == session_id and checkpoint["sn"] == sn:
+            return
+        self._sessions.setdefault(self_id, {}).update(session_id=session_id, sn=sn, updated_at=time.time())
+        self._dump()
+
+    def get_gateway(self, self_id: str, compress: bool, ttl: float) -> Optional[str]:
+        """
+        :返回:
+
+          - ``Optional[str]``: ``ttl`` 秒内获取的、压缩设置相同的网关地址
+        """
+        gateway = self._sessions.get(self_id, {}).get("gateway")
+        if gateway and gateway["compress"] == compress and time.time() - gateway["fetched_at"] < ttl:
+            return gateway["url"]
+        return None
+
+    def save_gateway(self, self_id: str, url: str, compress: bool):
+        self._sessions.setdefault(self_id, {})["gateway"] = {"url": url, "compress": compress, "fetched_at": time.time()}
+        self._dump()
+
+    def clear_gateway(self, self_id: str):
+        if self._sessions.get(self_id, {}).pop("gateway", None) is not None:
+            self._dump()
+
+    def clear(self, self_id: str):
+        """丢弃会话检查点，网关地址仍然可以复用"""
+        checkpoint = self._sessions.get(self_id)
+        if checkpoint and checkpoint.pop("session_id", None) is not None:
+            checkpoint.pop("sn", None)
+            checkpoint.pop("updated_at", None)
+            self._dump()
+
+    def _dump(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(self._sessions), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log("WARNING", f"Failed to save session checkpoint {self.path}: {e!r}")
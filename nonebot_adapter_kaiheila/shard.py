@@ -0,0 +1,232 @@
+"""
+多进程分片运行
+
+``Supervisor`` 启动 ``shard_count`` 个工作进程，每个进程运行同一个入口函数（通常是 ``nonebot.init`` ... ``nonebot.run``），
+通过环境变量 ``KAIHEILA_SHARD_ID`` / ``KAIHEILA_SHARD_COUNT`` 告知适配器只连接分配给自己的 Bot::
+
+    def main():
+        nonebot.init()
+        nonebot.get_driver().register_adapter("kaiheila", Bot)
+        nonebot.load_plugins("plugins")
+        nonebot.run()
+
+    if __name__ == "__main__":
+        Supervisor(main, shard_count=4, port=8080).run()
+"""
+import os
+import time
+import zlib
+import queue
+import asyncio
+import multiprocessing
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Any, Dict, Tuple, Callable, Optional, TYPE_CHECKING
+
+from .utils import log
+from .config import BotConfig
+
+if TYPE_CHECKING:
+    from nonebot.drivers import Driver
+
+# 工作进程中由 _worker_main 设置
+_metrics_queue: Optional["multiprocessing.Queue"] = None
+
+
+def shard_of(bot: BotConfig, shard_count: int) -> int:
+    """
+    :说明:
+
+      Bot 所属的分片，配置了 ``shard`` 时使用配置，否则按 ``client_id`` 哈希，保证重启后分配不变
+    """
+    if "shard" in bot:
+        return bot["shard"] % shard_count
+    return zlib.crc32(bot["client_id"].encode()) % shard_count
+
+
+def current_shard() -> Optional[Tuple[int, int]]:
+    """
+    :返回:
+
+      - ``Optional[Tuple[int, int]]``: 工作进程中为 ``(shard_id, shard_count)``，不以分片方式运行时为 ``None``
+    """
+    shard_id = os.environ.get("KAIHEILA_SHARD_ID")
+    shard_count = os.environ.get("KAIHEILA_SHARD_COUNT")
+    if shard_id is None or shard_count is None:
+        return None
+    return int(shard_id), int(shard_count)
+
+
+def shard_path(path: Optional[Path], shard_id: int) -> Optional[Path]:
+    """各分片使用各自的检查点、索引文件，避免进程间互相覆盖"""
+    if path is None:
+        return None
+    return path.with_name(f"{path.stem}.shard{shard_id}{path.suffix}")
+
+
+def start_reporter(driver: "Driver", shard_id: int, interval: float):
+    """在工作进程中定期把各 Bot 的统计发送给 Supervisor"""
+    if _metrics_queue is None:
+        return
+
+    async def report():
+        while True:
+            await asyncio.sleep(interval)
+            metrics = {
+                "shard_id": shard_id,
+                "pid": os.getpid(),
+                "time": time.time(),
+                "bots": {self_id: bot.stats for self_id, bot in driver.bots.items() if hasattr(bot, "stats")}
+            }
+            try:
+                _metrics_queue.put_nowait(metrics)
+            except queue.Full:
+                pass
+
+    tasks = []
+
+    async def start():
+        tasks.append(asyncio.create_task(report()))
+
+    async def stop():
+        for task in tasks:
+            task.cancel()
+
+    driver.on_startup(start)
+    driver.on_shutdown(stop)
+
+
+def _worker_main(entry: Callable[[], Any], shard_id: int, shard_count: int, port: Optional[int],
+                 metrics_queue: "multiprocessing.Queue"):
+    global _metrics_queue
+    _metrics_queue = metrics_queue
+    os.environ["KAIHEILA_SHARD_ID"] = str(shard_id)
+    os.environ["KAIHEILA_SHARD_COUNT"] = str(shard_count)
+    if port is not None:  # 各进程的 HTTP 服务监听不同端口
+        os.environ["PORT"] = str(port + shard_id)
+    entry()
+
+
+class Worker:
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.
+        self.restarts = 0
+        self.crashes = 0  # 连续快速崩溃的次数，用于退避
+        self.restart_at: Optional[float] = None
+        self.exitcode: Optional[int] = None
+        self.metrics: Optional[Dict[str, Any]] = None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "uptime": time.time() - self.started_at if self.process and self.process.is_alive() else 0.,
+            "restarts": self.restarts,
+            "last_exitcode": self.exitcode,
+            "metrics": self.metrics
+        }
+
+
+class Supervisor:
+    """
+    启动并看护分片工作进程：进程退出后重新启动，启动后很快崩溃的进程按指数退避重启；汇总各进程上报的统计
+
+    :参数:
+
+      * ``entry: Callable[[], Any]``: 工作进程的入口函数，必须可以被 pickle（模块级函数）
+      * ``shard_count: int``: 工作进程数，默认为 CPU 核数
+      * ``port: Optional[int]``: 设置时第 N 个工作进程的 HTTP 服务监听 ``port + N``
+      * ``restart_delay: float``: 重启的初始间隔（秒）
+      * ``max_restart_delay: float``: 重启间隔上限（秒）
+      * ``stable_time: float``: 运行超过该时间（秒）后退出不算作快速崩溃
+    """
+
+    def __init__(self,
+                 entry: Callable[[], Any],
+                 shard_count: Optional[int] = None,
+                 port: Optional[int] = None,
+                 restart_delay: float = 1.,
+                 max_restart_delay: float = 60.,
+                 stable_time: float = 30.):
+        self.entry = entry
+        self.shard_count = shard_count or os.cpu_count() or 1
+        self.port = port
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_time = stable_time
+        self._context = multiprocessing.get_context("spawn")
+        self._metrics_queue = self._context.Queue(maxsize=self.shard_count * 16)
+        self.workers = [Worker(shard_id) for shard_id in range(self.shard_count)]
+        self._running = False
+
+    def _start(self, worker: Worker):
+        worker.process = self._context.Process(target=_worker_main,
+                                               args=(self.entry, worker.shard_id, self.shard_count, self.port,
+                                                     self._metrics_queue),
+                                               name=f"kaiheila-shard-{worker.shard_id}",
+                                               daemon=False)
+        worker.process.start()
+        worker.started_at = time.time()
+        worker.restart_at = None
+        log("INFO", f"Started shard {worker.shard_id}/{self.shard_count} with pid {worker.process.pid}")
+
+    def _on_exit(self, worker: Worker):
+        worker.exitcode = worker.process.exitcode
+        if time.time() - worker.started_at < self.stable_time:
+            worker.crashes += 1
+        else:
+            worker.crashes = 0
+        delay = min(self.restart_delay * 2 ** max(worker.crashes - 1, 0), self.max_restart_delay)
+        worker.restart_at = time.time() + delay
+        log("WARNING", f"Shard {worker.shard_id} exited with code {worker.exitcode}, restarting in {delay:.1f}s")
+
+    def _collect_metrics(self):
+        while True:
+            try:
+                metrics = self._metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.workers[metrics["shard_id"]].metrics = metrics
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {"shard_count": self.shard_count, "shards": {worker.shard_id: worker.stats for worker in self.workers}}
+
+    def run(self):
+        """阻塞运行直到 ``KeyboardInterrupt`` 或 ``stop``"""
+        self._running = True
+        for worker in self.workers:
+            self._start(worker)
+        try:
+            while self._running:
+                sentinels = {worker.process.sentinel: worker for worker in self.workers
+                             if worker.restart_at is None}
+                for sentinel in wait(list(sentinels), timeout=1.):
+                    worker = sentinels[sentinel]
+                    worker.process.join()
+                    self._on_exit(worker)
+                now = time.time()
+                for worker in self.workers:
+                    if worker.restart_at is not None and worker.restart_at <= now and self._running:
+                        worker.restarts += 1
+                        self._start(worker)
+                self._collect_metrics()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.):
+        self._running = False
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.kill()
@@ -1,4 +1,8 @@
-from typing import BinaryIO
+import re
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Tuple, Union, Optional, BinaryIO, AsyncIterable, AsyncIterator, TYPE_CHECKING
 
 from nonebot.utils import logger_wrapper
 import aiohttp
@@ -8,22 +12,175 @@ try:
 except ImportError:
     import json
 
-from .bot import Bot
-from .exception import ActionFailed
+from .exception import ActionFailed, NetworkError
+
+if TYPE_CHECKING:
+    from .bot import Bot
 
 log = logger_wrapper("Kaiheila")
 
+# KMarkdown 中需要转义的字符
+_KMARKDOWN_SPECIAL = re.compile(r"([\\*~\[\]()>\-`_|])")
+_KMARKDOWN_ESCAPED = re.compile(r"\\([\\*~\[\]()>\-`_|])")
+
+
+def escape(s: str) -> str:
+    """
+    :说明:
+
+      对字符串进行 KMarkdown 转义
+    """
+    return _KMARKDOWN_SPECIAL.sub(r"\\\1", s)
+
+
+def unescape(s: str) -> str:
+    """
+    :说明:
+
+      去掉 KMarkdown 转义
+    """
+    return _KMARKDOWN_ESCAPED.sub(r"\1", s)
+
+
+# 本地文件只接受 Path，str 在消息段中表示已上传的 url
+FileContent = Union[Path, bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]]
+
+
+async def _iter_chunks(file: FileContent, chunk_size: int) -> AsyncIterator[bytes]:
+    """按块读取文件内容，不一次性读入内存"""
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        view = memoryview(file)
+        for begin in range(0, len(view), chunk_size):
+            yield view[begin:begin + chunk_size]
+    elif isinstance(file, Path):
+        loop = asyncio.get_running_loop()
+        with open(file, "rb") as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    elif hasattr(file, "read"):
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in file:
+            yield chunk
+
+
+def _hash_file(path: Path, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-async def ensure_url(file: BinaryIO, bot: Bot):
+
+def _hash_fileobj(file: BinaryIO, chunk_size: int) -> str:
+    position = file.tell()
+    digest = hashlib.sha256()
+    try:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    finally:
+        file.seek(position)
+    return digest.hexdigest()
+
+
+async def _content_digest(file: FileContent, chunk_size: int) -> Optional[str]:
     """
-    保证上传的是url，使用图床
+    :说明:
+
+      上传前计算可以重复读取的内容的哈希，异步迭代器与不可 seek 的文件返回 ``None``，在上传时计算。
+      读文件在线程池中进行，不阻塞事件循环
     """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(file).hexdigest()
+    if isinstance(file, Path):
+        return await asyncio.get_running_loop().run_in_executor(None, _hash_file, file, chunk_size)
+    if hasattr(file, "read") and getattr(file, "seekable", lambda: False)():
+        return await asyncio.get_running_loop().run_in_executor(None, _hash_fileobj, file, chunk_size)
+    return None
+
+
+async def _upload(bot: "Bot",
+                  chunks: AsyncIterator[bytes],
+                  filename: str,
+                  digest: Optional["hashlib._Hash"] = None) -> Tuple[str, int]:
+    size = 0
+
+    async def _stream():
+        nonlocal size
+        async for chunk in chunks:
+            size += len(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk
+
     data = aiohttp.FormData()
-    data.add_field("file", file)
+    data.add_field("file", _stream(), filename=filename, content_type="application/octet-stream")
+    await bot.rate_limiter.acquire("/asset/create")
     async with bot.client_session.post(f"{bot.base_url}/asset/create",
                                        data=data,
-                                       headers={"Authorization": f"Bot {bot.kaiheila_config.token}"}) as resp:
-        ret = await resp.json(loads=json.loads)
+                                       headers=bot.auth_headers) as resp:
+        bot.rate_limiter.update("/asset/create", resp.status, resp.headers)
+        if not 200 <= resp.status < 300:
+            raise NetworkError(f"HTTP request received unexpected status code: {resp.status}")
+        try:
+            ret = json.loads(await resp.read())
+        except Exception:  # 各 json 后端的异常类型不同
+            raise NetworkError("HTTP response is not valid JSON")
         if ret["code"] != 0:
-            raise ActionFailed(massage=ret["message"], **(ret["data"]))
-        return ret["data"]["url"]
+            raise ActionFailed(message=ret["message"], **(ret["data"] or {}))
+        return ret["data"]["url"], size
+
+
+async def ensure_url(file: Union[str, FileContent], bot: "Bot", filename: Optional[str] = None) -> str:
+    """
+    :说明:
+
+      保证上传的是url，使用图床。文件按块流式上传，内容哈希已在 ``bot.asset_index`` 中时直接返回之前的 url
+
+    :参数:
+
+      * ``file: Union[str, FileContent]``: ``str`` 视为已上传的 url 原样返回；
+        要上传的内容为 ``Path``, bytes, 二进制文件对象或产生 bytes 的异步迭代器
+      * ``bot: Bot``: 上传所用的 Bot
+      * ``filename: Optional[str]``: 文件名，默认取路径或文件对象的文件名
+    """
+    if isinstance(file, str):
+        return file
+    if filename is None:
+        name = file if isinstance(file, Path) else getattr(file, "name", None)
+        filename = Path(name).name if isinstance(name, (str, Path)) else "file"
+    index = bot.asset_index
+    chunk_size = bot.kaiheila_config.upload_chunk_size
+
+    key = await _content_digest(file, chunk_size)
+    if key is None:  # 不能预先计算哈希，边上传边计算，供之后可重复读取的相同内容命中
+        digest = hashlib.sha256()
+        url, size = await _upload(bot, _iter_chunks(file, chunk_size), filename, digest)
+        index.save(digest.hexdigest(), url, size)
+        return url
+
+    url = index.get(key)
+    if url is not None:
+        return url
+    uploading = index.uploading(key)
+    if uploading is not None:
+        return await asyncio.shield(uploading)
+    future = index.begin(key)
+    try:
+        url, size = await _upload(bot, _iter_chunks(file, chunk_size), filename)
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # 没有其它等待者时不报 "exception was never retrieved"
+        raise
+    finally:
+        index.end(key)
+    future.set_result(url)
+    index.save(key, url, size)
+    return url
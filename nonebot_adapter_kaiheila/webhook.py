@@ -0,0 +1,139 @@
+import zlib
+from base64 import b64decode
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Optional
+
+try:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # 只有配置了 encrypt_key 时才需要
+    Cipher = None
+
+from .config import BotConfig
+from .compress import Inflater
+from .decoder import json_loads
+
+# https://developer.kaiheila.cn/doc/webhook
+CHALLENGE_CHANNEL_TYPE = "WEBHOOK_CHALLENGE"
+
+
+class WebhookError(Exception):
+    """webhook 请求不合法，``status`` 为返回给开黑啦的状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def decrypt(encrypt: str, encrypt_key: str) -> bytes:
+    """
+    :说明:
+
+      解密 ``encrypt`` 字段：base64 解码后前 16 字节为 iv，其余为 base64 编码的 AES-256-CBC 密文，
+      密钥为 ``encrypt_key`` 以 ``\\0`` 补足 32 字节
+    """
+    data = b64decode(encrypt)
+    iv, ciphertext = data[:16], b64decode(data[16:])
+    key = encrypt_key.encode().ljust(32, b"\0")
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    unpadder = padding.PKCS7(128).unpadder()
+    plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+    return unpadder.update(plaintext) + unpadder.finalize()
+
+
+class WebhookDecoder:
+    """
+    解析 webhook 请求体：解压、按各 Bot 的 ``encrypt_key`` 解密，并以 ``verify_token`` 确定是哪个 Bot
+
+    ``check_permission`` 与 ``handle_message`` 收到的是同一个 ``bytes`` 对象，
+    解析结果以对象 id 暂存，``handle_message`` 时直接取出，不必再解压、解密一次
+
+    :参数:
+
+      * ``bots: List[BotConfig]``: 配置了 ``verify_token`` 的 Bot
+      * ``max_pending: int``: 最多暂存的解析结果数
+    """
+
+    def __init__(self, bots: List[BotConfig], max_pending: int = 1024):
+        self.bots = [bot for bot in bots if bot.get("verify_token")]
+        self.max_pending = max_pending
+        # id(body) -> (body, self_id, frame)，保留 body 的引用保证 id 不被复用
+        self._pending: "OrderedDict[int, Tuple[bytes, str, Dict[str, Any]]]" = OrderedDict()
+
+        self.requests = 0
+        self.rejected = 0
+        self.challenges = 0
+        self.bytes_in = 0
+
+    def decode(self, body: bytes) -> Tuple[str, Dict[str, Any]]:
+        """
+        :返回:
+
+          - ``Tuple[str, Dict[str, Any]]``: Bot 的 ``client_id`` 与解析后的帧
+
+        :异常:
+
+          - ``WebhookError``: 无法解压、解密或没有 Bot 的 ``verify_token`` 匹配
+        """
+        self.requests += 1
+        self.bytes_in += len(body)
+        try:
+            return self._decode(body)
+        except WebhookError:
+            self.rejected += 1
+            raise
+
+    def _decode(self, body: bytes) -> Tuple[str, Dict[str, Any]]:
+        if Inflater.is_compressed(body):
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                raise WebhookError(400, "Failed to inflate body")
+        try:
+            data = json_loads(body)
+        except Exception:  # 各 json 后端的异常类型不同
+            raise WebhookError(400, "Body is not json")
+        if not isinstance(data, dict):
+            raise WebhookError(400, "Body is not a json object")
+
+        encrypt = data.get("encrypt")
+        if encrypt is not None and Cipher is None:
+            raise WebhookError(500, "Body is encrypted but cryptography is not installed")
+        for bot in self.bots:
+            frame = data
+            if encrypt is not None:
+                if not bot.get("encrypt_key"):
+                    continue
+                try:
+                    frame = json_loads(decrypt(encrypt, bot["encrypt_key"]))
+                except Exception:  # 密钥不对
+                    continue
+            if isinstance(frame, dict) and (frame.get("d") or {}).get("verify_token") == bot["verify_token"]:
+                return bot["client_id"], frame
+        raise WebhookError(403, "verify_token mismatched")
+
+    @staticmethod
+    def is_challenge(frame: Dict[str, Any]) -> bool:
+        return (frame.get("d") or {}).get("channel_type") == CHALLENGE_CHANNEL_TYPE
+
+    def stash(self, body: bytes, self_id: str, frame: Dict[str, Any]):
+        self._pending[id(body)] = (body, self_id, frame)
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+
+    def take(self, body: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+        pending = self._pending.pop(id(body), None)
+        if pending is None or pending[0] is not body:
+            return None
+        return pending[1], pending[2]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "challenges": self.challenges,
+            "bytes_in": self.bytes_in,
+            "pending": len(self._pending)
+        }
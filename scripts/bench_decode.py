@@ -0,0 +1,62 @@
+"""
+事件解码基准：同一批网关帧分别经 ``parse_obj``、``construct_model`` 与 lazy extra 解码，
+输出每帧耗时与解码结果占用的内存
+
+    python scripts/bench_decode.py [帧数]
+"""
+import sys
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from frames import FRAMES  # noqa: E402
+from nonebot_adapter_kaiheila.bot import _complete_event_data  # noqa: E402
+from nonebot_adapter_kaiheila.decoder import JSON_BACKEND, json_loads, construct_model  # noqa: E402
+from nonebot_adapter_kaiheila.event import LazyExtra, get_event_model  # noqa: E402
+
+BOT = SimpleNamespace(self_id="1000000000")
+
+
+def decode(raw: bytes, fast: bool):
+    data = json_loads(raw)
+    model = get_event_model(_complete_event_data(BOT, data))[0]
+    return construct_model(model, data) if fast else model.parse_obj(data)
+
+
+def run(name: str, frames, fast: bool, lazy: bool):
+    LazyExtra.enabled = lazy
+    try:
+        start = time.perf_counter()
+        for raw in frames:
+            decode(raw, fast)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        events = [decode(raw, fast) for raw in frames]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del events
+    finally:
+        LazyExtra.enabled = False
+    print(f"{name:<24}{elapsed / len(frames) * 1e6:>10.2f} us/frame{size / len(frames):>10.0f} B/event")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    frames = [json.dumps(FRAMES[i % len(FRAMES)]).encode() for i in range(count)]
+    print(f"{count} frames, json backend: {JSON_BACKEND}")
+    for raw in frames[:len(FRAMES)]:  # 预热 编译快速路径的字段表
+        decode(raw, True)
+    run("parse_obj", frames, fast=False, lazy=False)
+    run("parse_obj + lazy extra", frames, fast=False, lazy=True)
+    run("construct_model", frames, fast=True, lazy=False)
+    run("construct + lazy extra", frames, fast=True, lazy=True)
+
+
+if __name__ == "__main__":
+    main()
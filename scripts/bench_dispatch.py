@@ -0,0 +1,85 @@
+"""
+事件分发基准：``get_event_model`` 查找事件 Model 的耗时（有无缓存），
+以及 ``Bot._handle_event_data`` 从补全事件数据到放入投递队列的每帧耗时
+
+    python scripts/bench_dispatch.py [帧数]
+"""
+import sys
+import json
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from bots import SELF_ID, make_bot  # noqa: E402
+from frames import FRAMES  # noqa: E402
+from nonebot_adapter_kaiheila.bot import _complete_event_data  # noqa: E402
+from nonebot_adapter_kaiheila.decoder import json_loads  # noqa: E402
+from nonebot_adapter_kaiheila.event import get_event_model  # noqa: E402
+
+BOT = SimpleNamespace(self_id=SELF_ID)
+
+
+class CountingQueue:
+    """代替 ``IngestQueue``，只计数不投递给 nonebot"""
+
+    def __init__(self):
+        self.count = 0
+
+    async def put(self, lane_name, handler):
+        self.count += 1
+
+
+def bench_get_event_model(names, rounds: int):
+    for cached in (False, True):
+        get_event_model.cache_clear()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for name in names:
+                if not cached:
+                    get_event_model.cache_clear()
+                get_event_model(name)
+        elapsed = time.perf_counter() - start
+        label = "cached" if cached else "uncached"
+        print(f"get_event_model {label:<10}{elapsed / rounds / len(names) * 1e6:>10.2f} us/lookup")
+
+
+def bench_handle_event_data(count: int, decoder: str):
+    monkeypatch = pytest.MonkeyPatch()
+    try:
+        bot = make_bot(monkeypatch, event_decoder=decoder)
+        bot.ingest_queue = CountingQueue()
+        # 每帧不同的 msg_id，避免被去重
+        frames = [json_loads(json.dumps({**FRAMES[i % len(FRAMES)], "msg_id": str(uuid.uuid4())}).encode())
+                  for i in range(count)]
+
+        async def dispatch():
+            start = time.perf_counter()
+            for frame in frames:
+                await bot._handle_event_data(frame)
+            return time.perf_counter() - start
+
+        elapsed = asyncio.run(dispatch())
+        assert bot.ingest_queue.count == count
+    finally:
+        monkeypatch.undo()
+    print(f"_handle_event_data {decoder:<9}{elapsed / count * 1e6:>10.2f} us/frame")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    names = [_complete_event_data(BOT, dict(frame)) for frame in FRAMES]
+    print(f"{count} frames, {len(set(names))} event names")
+    bench_get_event_model(names, count // len(names))
+    bench_handle_event_data(count, "pydantic")
+    bench_handle_event_data(count, "fast")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+网关压缩基准：比较未压缩、每帧独立压缩与 zlib-stream 三种传输的字节数和解码耗时
+
+    python scripts/bench_inflate.py [帧数]
+"""
+import sys
+import json
+import time
+import zlib
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from frames import FRAMES  # noqa: E402
+from nonebot_adapter_kaiheila.compress import Inflater  # noqa: E402
+from nonebot_adapter_kaiheila.decoder import json_loads  # noqa: E402
+
+
+def run(name: str, messages, inflate: bool):
+    inflater = Inflater()
+    start = time.perf_counter()
+    for message in messages:
+        json_loads(inflater.feed(message) if inflate else message)
+    elapsed = time.perf_counter() - start
+    size = sum(map(len, messages))
+    print(f"{name:<14}{size / len(messages):>10.0f} B/frame{elapsed / len(messages) * 1e6:>10.2f} us/frame")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    # 每帧换上不同的 msg_id 与时间戳，避免重复内容夸大 zlib-stream 的压缩率
+    payloads = [json.dumps({"s": 0, "sn": sn, "d": {**FRAMES[sn % len(FRAMES)], "msg_id": str(uuid.uuid4()),
+                                                    "msg_timestamp": 1613998052318 + sn * 37}}).encode()
+                for sn in range(count)]
+    compressor = zlib.compressobj()
+    stream = [compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH) for payload in payloads]
+    print(f"{count} frames")
+    run("plain", payloads, inflate=False)
+    run("per-frame", [zlib.compress(payload) for payload in payloads], inflate=True)
+    run("zlib-stream", stream, inflate=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+事件入队负载测试：大量上下线通知中夹杂消息，处理速度低于到达速度时，
+比较单个 FIFO 队列与 ``IngestQueue`` 优先级通道下消息事件的排队延迟
+
+    python scripts/bench_ingest.py [事件数] [消息占比] [处理耗时毫秒]
+"""
+import sys
+import time
+import random
+import asyncio
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nonebot_adapter_kaiheila.ingest import IngestQueue  # noqa: E402
+
+WORKERS = 4
+
+
+def report(name: str, latencies, shed: int):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} message p50 {statistics.median(latencies) * 1000:>8.1f} ms  "
+          f"p99 {p99 * 1000:>8.1f} ms  shed {shed}")
+
+
+def workload(count: int, message_ratio: float):
+    rng = random.Random(0)
+    return ["message" if rng.random() < message_ratio else "presence" for _ in range(count)]
+
+
+async def fifo(events, cost: float):
+    queue: "asyncio.Queue" = asyncio.Queue()
+    latencies = []
+
+    async def work():
+        while True:
+            lane, enqueued_at = await queue.get()
+            if lane == "message":
+                latencies.append(time.monotonic() - enqueued_at)
+            await asyncio.sleep(cost)
+            queue.task_done()
+
+    workers = [asyncio.create_task(work()) for _ in range(WORKERS)]
+    for lane in events:
+        queue.put_nowait((lane, time.monotonic()))
+        await asyncio.sleep(0)
+    await queue.join()
+    for worker in workers:
+        worker.cancel()
+    report("fifo", latencies, 0)
+
+
+async def lanes(events, cost: float):
+    queue = IngestQueue(WORKERS, {"message": 1000, "presence": 200})
+    latencies = []
+
+    def handler(lane: str, enqueued_at: float):
+        async def handle():
+            if lane == "message":
+                latencies.append(time.monotonic() - enqueued_at)
+            await asyncio.sleep(cost)
+        return handle
+
+    for lane in events:
+        await queue.put(lane, handler(lane, time.monotonic()))
+        await asyncio.sleep(0)
+    while queue.depth or queue.busy:
+        await asyncio.sleep(0.01)
+    queue.stop()
+    report("IngestQueue", latencies, queue.stats["lanes"]["presence"]["shed"])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    cost = (float(sys.argv[3]) if len(sys.argv) > 3 else 2.) / 1000
+    events = workload(count, ratio)
+    print(f"{count} events, {events.count('message')} messages, {WORKERS} workers, {cost * 1000:.1f} ms/event")
+    asyncio.run(fifo(events, cost))
+    asyncio.run(lanes(events, cost))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+KMarkdown 基准：拆分收到的消息与序列化发送的消息的耗时
+
+    python scripts/bench_kmarkdown.py [次数]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nonebot_adapter_kaiheila.message import Message, MessageSegment  # noqa: E402
+
+CONTENTS = {
+    "plain": "just a plain chat message with a few words in it",
+    "command": "/roll 1-6 (d6) for (met)1000000000(met)",
+    "formatted": "(met)1000000000(met) **bold** and `code` see [docs](https://developer.kaiheila.cn/doc) "
+                 "(emj)smile(emj)[6016000000/abc] > quoted",
+    "long": "**title**\n" + "line with (chn)6177000000(chn) and some text\n" * 50,
+}
+
+
+def measure(fn, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'message':<12}{'chars':>7}{'parse us':>11}{'serialize us':>15}{'plain text us':>16}")
+    for name, content in CONTENTS.items():
+        message = Message.from_content(9, content)
+        parse = measure(lambda: Message.from_content(9, content), count)
+        serialize = measure(message.to_kmarkdown, count)
+        plain = measure(message.extract_plain_text, count)
+        print(f"{name:<12}{len(content):>7}{parse:>11.2f}{serialize:>15.2f}{plain:>16.2f}")
+    built = MessageSegment.mention("1000000000") + " hi " + MessageSegment.code("x") + " bye"
+    print(f"{'built':<12}{'':>7}{'':>11}{measure(built.to_kmarkdown, count):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
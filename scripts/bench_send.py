@@ -0,0 +1,49 @@
+"""
+发送调度负载测试：模拟 API 延迟，比较逐条串行发送与 ``SendScheduler`` 按频道并发发送的总耗时，
+并检查每个频道内的顺序
+
+    python scripts/bench_send.py [频道数] [每个频道的消息数] [API 延迟毫秒]
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nonebot_adapter_kaiheila.scheduler import SendScheduler  # noqa: E402
+
+
+async def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.) / 1000
+    sent = []
+
+    def job(channel: int, i: int):
+        async def send():
+            await asyncio.sleep(latency)
+            sent.append((channel, i))
+        return send
+
+    start = time.perf_counter()
+    for i in range(messages):
+        for channel in range(channels):
+            await job(channel, i)()
+    serial = time.perf_counter() - start
+
+    for concurrency in (1, 8, 32):
+        sent.clear()
+        scheduler = SendScheduler(max_concurrency=concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(scheduler.submit(str(channel), job(channel, i))
+                               for i in range(messages) for channel in range(channels)))
+        elapsed = time.perf_counter() - start
+        ordered = all([i for c, i in sent if c == channel] == list(range(messages)) for channel in range(channels))
+        print(f"concurrency={concurrency:<3} {elapsed:>7.2f}s  "
+              f"{channels * messages / elapsed:>8.0f} msg/s  ordered={ordered}")
+    print(f"serial          {serial:>7.2f}s  {channels * messages / serial:>8.0f} msg/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
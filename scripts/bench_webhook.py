@@ -0,0 +1,97 @@
+"""
+webhook 压测：向运行中的 nonebot (fastapi driver) 并发发送加密并 zlib 压缩的事件，统计吞吐量与延迟分位数。
+需要先以 webhook 模式启动 Bot，``verify_token`` / ``encrypt_key`` 与该 Bot 的配置相同
+
+    python scripts/bench_webhook.py http://127.0.0.1:8080/kaiheila/http <verify_token> <encrypt_key> [请求数] [并发数]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import asyncio
+from base64 import b64encode
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import aiohttp
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from frames import FRAMES  # noqa: E402
+
+
+def encrypt(payload: bytes, key: str) -> str:
+    """开黑啦的加密方式：b64(iv + b64(AES-256-CBC(payload)))"""
+    iv = os.urandom(16)
+    padder = padding.PKCS7(128).padder()
+    encryptor = Cipher(algorithms.AES(key.encode().ljust(32, b"\0")), modes.CBC(iv)).encryptor()
+    ciphertext = encryptor.update(padder.update(payload) + padder.finalize()) + encryptor.finalize()
+    return b64encode(iv + b64encode(ciphertext)).decode()
+
+
+def make_bodies(count: int, verify_token: str, encrypt_key: str) -> List[bytes]:
+    """每个请求不同的 sn 与 msg_id，避免被去重"""
+    bodies = []
+    for sn in range(1, count + 1):
+        d = {**FRAMES[sn % len(FRAMES)], "msg_id": str(uuid.uuid4()), "verify_token": verify_token}
+        payload = json.dumps({"s": 0, "sn": sn, "d": d}).encode()
+        encrypted = json.dumps({"encrypt": encrypt(payload, encrypt_key)}).encode()
+        bodies.append(zlib.compress(encrypted))
+    return bodies
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+async def run(url: str, bodies: List[bytes], concurrency: int):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    pending = iter(bodies)
+
+    async def client(session: aiohttp.ClientSession):
+        for body in pending:
+            start = time.perf_counter()
+            try:
+                async with session.post(url, data=body,
+                                        headers={"Content-Type": "application/json"}) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), statuses
+
+
+def main():
+    if len(sys.argv) < 4:
+        print(__doc__.strip())
+        sys.exit(1)
+    url, verify_token, encrypt_key = sys.argv[1:4]
+    count = int(sys.argv[4]) if len(sys.argv) > 4 else 5000
+    concurrency = int(sys.argv[5]) if len(sys.argv) > 5 else 32
+    bodies = make_bodies(count, verify_token, encrypt_key)
+    print(f"{count} requests, concurrency {concurrency}, {sum(map(len, bodies)) / count:.0f} bytes/body")
+    elapsed, latencies, statuses = asyncio.run(run(url, bodies, concurrency))
+    print(f"throughput {count / elapsed:>10.1f} req/s")
+    if latencies:
+        for label, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            print(f"latency {label:<6}{percentile(latencies, p) * 1000:>10.2f} ms")
+        print(f"latency max   {latencies[-1] * 1000:>10.2f} ms")
+    print("status " + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items(), key=str)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+from nonebot_adapter_kaiheila.bot import Bot
+from nonebot_adapter_kaiheila.config import Config
+from nonebot_adapter_kaiheila.session import SessionStore
+
+SELF_ID = "1000000000"
+
+# 按 self_id 保存、跨连接共享的组件
+_SHARED = ("_webhook_bots", "_rate_limiters", "_retry_policies", "_send_schedulers", "_states", "_message_caches",
+           "_deduplicators", "_ingest_queues", "_coalescers")
+
+
+class FakeWebSocket:
+    """记录发出的帧的 WebSocket 连接"""
+    type = "websocket"
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: bytes, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class FakeSession:
+    """
+    代替 ``ClientSession``，依次返回 ``responses`` 中的 ``(status, body)``，为异常时抛出；
+    ``requests`` 记录每次请求的 ``(method, url, params, json)``
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None):
+        self.requests.append((method, url, params, json))
+        response = self.responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return FakeResponse(*response)
+
+
+def make_bot(monkeypatch, session_file=None, **config) -> Bot:
+    """
+    不经过 driver 注册，直接设置 ``Bot`` 的类属性并创建一个 WebSocket 连接的 Bot，
+    ``config`` 为 ``Config`` 的字段。HTTP 请求发给 ``bot.client_session``，可以替换为预设响应的 ``FakeSession``
+    """
+    kaiheila_config = Config(bots=[{"client_id": SELF_ID, "token": "token", "client_secret": "secret"}], **config)
+    monkeypatch.setattr(Bot, "kaiheila_config", kaiheila_config, raising=False)
+    monkeypatch.setattr(Bot, "config", SimpleNamespace(api_timeout=30., nickname=set()), raising=False)
+    monkeypatch.setattr(Bot, "session_store", SessionStore(session_file), raising=False)
+    for name in _SHARED:
+        monkeypatch.setattr(Bot, name, {})
+    monkeypatch.setattr(Bot, "_unconfirmed_gateways", set())
+    monkeypatch.setattr(Bot, "client_session", FakeSession())
+    return Bot(SELF_ID, FakeWebSocket())
@@ -0,0 +1,46 @@
+"""测试与基准共用的网关事件帧，字段取自开黑啦文档的示例"""
+
+AUTHOR = {"id": "2418200000", "username": "alice", "identify_num": "0001", "online": True, "os": "Websocket",
+          "status": 1, "avatar": "https://img.kaiheila.cn/avatars/a.png", "bot": False, "roles": [1, 2]}
+
+FRAMES = [
+    # 频道 KMarkdown 消息
+    {"channel_type": "GROUP", "type": 9, "target_id": "6177000000", "author_id": "2418200000",
+     "content": "(met)1000000000(met) **hi**", "msg_id": "67637d4c-0000-0000-0000-000000000001",
+     "msg_timestamp": 1613998052318, "nonce": "",
+     "extra": {"type": 9, "guild_id": "6016000000", "channel_name": "general", "mention": ["1000000000"],
+               "mention_all": False, "mention_roles": [], "mention_here": False, "code": "", "author": AUTHOR}},
+    # 私聊文字消息 带引用
+    {"channel_type": "PERSON", "type": 1, "target_id": "1000000000", "author_id": "2418200000",
+     "content": "reply", "msg_id": "67637d4c-0000-0000-0000-000000000002", "msg_timestamp": 1613998052319,
+     "nonce": "n1",
+     "extra": {"type": 1, "code": "a1b2c3", "author": AUTHOR,
+               "quote": {"id": "67637d4c-0000-0000-0000-000000000001", "type": 9, "content": "**hi**",
+                         "create_at": 1613998052318, "author": AUTHOR}}},
+    # 频道图片消息 带附件
+    {"channel_type": "GROUP", "type": 2, "target_id": "6177000000", "author_id": "2418200000",
+     "content": "https://img.kaiheila.cn/assets/b.png", "msg_id": "67637d4c-0000-0000-0000-000000000003",
+     "msg_timestamp": 1613998052320, "nonce": "",
+     "extra": {"type": 2, "guild_id": "6016000000", "code": "", "author": AUTHOR,
+               "attachments": {"url": "https://img.kaiheila.cn/assets/b.png", "name": "b.png",
+                               "size": 2048}}},
+    # 系统消息 添加 reaction
+    {"channel_type": "GROUP", "type": 255, "target_id": "6016000000", "author_id": "1", "content": "[系统消息]",
+     "msg_id": "67637d4c-0000-0000-0000-000000000004", "msg_timestamp": 1613998052321, "nonce": "",
+     "extra": {"type": "added_reaction",
+               "body": {"channel_id": "6177000000", "emoji": {"id": "[#128077;]", "name": "[#128077;]"},
+                        "user_id": "2418200000", "msg_id": "67637d4c-0000-0000-0000-000000000001"}}},
+    # 系统消息 成员上线 body 带未声明的字段
+    {"channel_type": "GROUP", "type": 255, "target_id": "6016000000", "author_id": "1", "content": "[系统消息]",
+     "msg_id": "67637d4c-0000-0000-0000-000000000005", "msg_timestamp": 1613998052322, "nonce": "",
+     "extra": {"type": "guild_member_online",
+               "body": {"user_id": "2418200000", "event_time": 1613998052322, "guilds": ["6016000000"]}}},
+    # 系统消息 频道更新
+    {"channel_type": "GROUP", "type": 255, "target_id": "6016000000", "author_id": "1", "content": "[系统消息]",
+     "msg_id": "67637d4c-0000-0000-0000-000000000006", "msg_timestamp": 1613998052323, "nonce": "",
+     "extra": {"type": "updated_channel",
+               "body": {"id": "6177000000", "name": "general", "user_id": "2418200000",
+                        "guild_id": "6016000000", "is_category": 0, "parent_id": "", "level": 0,
+                        "slow_mode": 5000, "topic": "", "type": 1, "permission_overwrites": [],
+                        "permission_users": [], "permission_sync": 1}}},
+]
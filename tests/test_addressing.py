@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from nonebot_adapter_kaiheila.bot import _check_addressing
+from nonebot_adapter_kaiheila.cache import StateCache
+from nonebot_adapter_kaiheila.event import User, GroupMessageEvent, PrivateMessageEvent
+
+ME = "1000000000"
+
+
+def _bot():
+    state = StateCache()
+    state.me = User.parse_obj({"id": ME})
+    return SimpleNamespace(state=state, config=SimpleNamespace(nickname={"bot"}))
+
+
+def _event(content, type_=9, private=False, mention=()):
+    model = PrivateMessageEvent if private else GroupMessageEvent
+    return model.parse_obj({
+        "channel_type": "PERSON" if private else "GROUP", "type": type_, "target_id": "c", "author_id": "u",
+        "content": content, "msg_id": "m", "msg_timestamp": 1, "nonce": "", "self_id": "b",
+        "extra": {"type": type_, "guild_id": "g", "mention": list(mention), "author": {"id": "u"}},
+        "message_type": "private" if private else "group", "sub_type": "kmarkdown" if type_ == 9 else "text"})
+
+
+def _check(event):
+    asyncio.run(_check_addressing(_bot(), event))
+    return event
+
+
+@pytest.mark.parametrize("content, plain", [
+    (f"(met){ME}(met) hi", "hi"),
+    (f"(met){ME}(met)(met){ME}(met) hi", "hi"),
+    (f"hi (met){ME}(met)", "hi"),
+    ("bot, hi", "hi"),
+    ("BOT hi", "hi"),
+])
+def test_addressed_messages_are_stripped(content, plain):
+    event = _check(_event(content))
+    assert event.to_me
+    assert event.get_plaintext() == plain
+
+
+def test_mention_only_message_keeps_a_text_segment():
+    event = _check(_event(f"(met){ME}(met)"))
+    assert event.to_me
+    assert len(event.message) == 1 and event.message[0].is_text()
+    assert event.get_plaintext() == ""
+
+
+def test_other_mentions_and_text_are_kept():
+    event = _check(_event("(met)2000000000(met) bottle"))
+    assert not event.to_me
+    assert event.message[0].type == "mention"
+    assert event.get_plaintext() == " bottle"
+
+
+def test_extra_mention_and_private_messages_are_to_me():
+    assert _check(_event(f"hi (met){ME}(met) there", mention=[ME])).to_me
+    assert _check(_event("hi", type_=1, private=True)).to_me
+
+
+def test_messages_before_me_is_loaded_wait_for_it():
+    calls = []
+
+    async def user_me():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return User.parse_obj({"id": ME})
+
+    bot = _bot()
+    bot.state.me = None
+    bot.user_me = user_me
+
+    async def main():
+        events = [_event(f"(met){ME}(met) hi"), _event("hi", mention=[ME])]
+        await asyncio.gather(*(_check_addressing(bot, event) for event in events))
+        return events
+
+    assert all(event.to_me for event in asyncio.run(main()))
+    assert calls == [1]
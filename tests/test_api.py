@@ -0,0 +1,76 @@
+import json
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila.api import Page, GuildUserList, MessageDetail, MessageCreateResult
+from nonebot_adapter_kaiheila.event import Guild
+from nonebot_adapter_kaiheila.exception import ActionFailed, NetworkError
+
+from bots import FakeSession, make_bot
+
+
+def _ok(data):
+    return 200, json.dumps({"code": 0, "message": "", "data": data}).encode()
+
+
+def _call(bot, *responses, method="user_me", **kwargs):
+    bot.client_session = FakeSession(*responses)
+    return asyncio.run(getattr(bot, method)(**kwargs))
+
+
+def test_get_methods_send_params_and_parse_the_result(monkeypatch):
+    bot = make_bot(monkeypatch)
+    user = _call(bot, _ok({"id": "1", "username": "bot", "bot": True}), method="user_view", user_id="1")
+    assert user.id_ == "1" and user.bot
+    method, url, params, body = bot.client_session.requests[0]
+    assert (method, url, body) == ("GET", f"{bot.base_url}/user/view", None)
+    assert params == {"user_id": "1"}  # 未给出的可选参数不发送
+
+
+def test_post_methods_send_json(monkeypatch):
+    bot = make_bot(monkeypatch)
+    result = _call(bot, _ok({"msg_id": "m", "msg_timestamp": 1, "nonce": ""}), method="message_create",
+                   target_id="c", content="hi", type_=1)
+    assert isinstance(result, MessageCreateResult) and result.msg_id == "m"
+    method, _, params, body = bot.client_session.requests[0]
+    assert method == "POST" and params is None
+    assert body == {"target_id": "c", "content": "hi", "type": 1}
+
+
+def test_methods_without_result_return_none(monkeypatch):
+    bot = make_bot(monkeypatch)
+    assert _call(bot, _ok([]), method="message_delete", msg_id="m") is None
+
+
+def test_pages_are_parsed_with_their_item_type(monkeypatch):
+    bot = make_bot(monkeypatch)
+    page = _call(bot, _ok({"items": [{"id": "g1", "name": "a"}, {"id": "g2", "name": "b"}],
+                           "meta": {"page": 1, "page_total": 3, "page_size": 2, "total": 5}}),
+                 method="guild_list", page_size=2)
+    assert isinstance(page, Page) and all(isinstance(guild, Guild) for guild in page.items)
+    assert [guild.id_ for guild in page.items] == ["g1", "g2"]
+    assert page.meta.page_total == 3 and page.meta.total == 5
+
+    users = _call(bot, _ok({"items": [{"id": "u1"}], "meta": {"page": 1, "page_total": 1},
+                            "user_count": 1, "online_count": 1, "offline_count": 0}),
+                  method="guild_user_list", guild_id="g1")
+    assert isinstance(users, GuildUserList) and users.items[0].id_ == "u1" and users.online_count == 1
+
+    messages = _call(bot, _ok({"items": [{"id": "m1", "type": 1, "content": "hi", "embeds": []}]}),
+                     method="message_list", target_id="c")
+    assert isinstance(messages.items[0], MessageDetail) and messages.meta is None
+    assert messages.items[0].embeds == []  # 未声明的字段保留
+
+
+def test_action_failed(monkeypatch):
+    bot = make_bot(monkeypatch)
+    with pytest.raises(ActionFailed):
+        _call(bot, (200, b'{"code": 40100, "message": "no permission", "data": {}}'))
+
+
+def test_non_json_success_body_is_a_network_error(monkeypatch):
+    bot = make_bot(monkeypatch)
+    with pytest.raises(NetworkError):
+        _call(bot, (200, b"<html>maintenance</html>"))
+    assert bot.retry_policy.failed == 1 and bot.retry_policy.attempts == 1
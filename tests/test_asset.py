@@ -0,0 +1,131 @@
+import io
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from nonebot_adapter_kaiheila import utils
+from nonebot_adapter_kaiheila.asset import AssetIndex
+from nonebot_adapter_kaiheila.exception import ActionFailed, NetworkError
+from nonebot_adapter_kaiheila.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """替换真正的上传，记录每次上传的文件名与内容"""
+    calls = []
+
+    async def upload(bot, chunks, filename, digest=None):
+        data = b""
+        async for chunk in chunks:
+            data += bytes(chunk)
+            if digest is not None:
+                digest.update(chunk)
+        await asyncio.sleep(0.01)
+        calls.append((filename, data))
+        return f"https://img.kaiheila.cn/assets/{len(calls)}", len(data)
+
+    monkeypatch.setattr(utils, "_upload", upload)
+    return calls
+
+
+def _bot(path=None):
+    return SimpleNamespace(asset_index=AssetIndex(path), kaiheila_config=SimpleNamespace(upload_chunk_size=4))
+
+
+def test_str_is_returned_as_url(uploads):
+    url = "https://img.kaiheila.cn/assets/a.png"
+    assert asyncio.run(utils.ensure_url(url, _bot())) == url
+    assert uploads == []
+
+
+def test_same_content_is_uploaded_once(tmp_path, uploads):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"0123456789")
+    bot = _bot(tmp_path / "assets.json")
+
+    async def main():
+        return await asyncio.gather(utils.ensure_url(path, bot), utils.ensure_url(b"0123456789", bot),
+                                    utils.ensure_url(io.BytesIO(b"0123456789"), bot))
+
+    assert len(set(asyncio.run(main()))) == 1
+    assert [data for _, data in uploads] == [b"0123456789"]
+    # 索引持久化后 重启也不再上传
+    assert asyncio.run(utils.ensure_url(b"0123456789", _bot(tmp_path / "assets.json"))) == \
+        "https://img.kaiheila.cn/assets/1"
+    assert len(uploads) == 1
+
+
+def test_streamed_content_is_indexed_after_upload(uploads):
+    bot = _bot()
+
+    async def chunks():
+        yield b"0123"
+        yield b"456"
+
+    async def main():
+        first = await utils.ensure_url(chunks(), bot, filename="s.bin")
+        return first, await utils.ensure_url(b"0123456", bot)
+
+    first, second = asyncio.run(main())
+    assert first == second and len(uploads) == 1
+
+
+def test_file_objects_are_hashed_off_the_event_loop():
+    threads = []
+
+    class File(io.BytesIO):
+        def read(self, *args):
+            threads.append(threading.current_thread())
+            return super().read(*args)
+
+    file = File(b"0123456789")
+    file.seek(2)
+    digest = asyncio.run(utils._content_digest(file, 4))
+    assert digest == hashlib.sha256(b"23456789").hexdigest()
+    assert file.tell() == 2
+    assert threads and threading.main_thread() not in threads
+
+
+class _Response:
+    def __init__(self, status, body):
+        self.status = status
+        self.headers = {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def _upload_bot(status, body):
+    return SimpleNamespace(base_url="https://www.kaiheila.cn/api/v3", auth_headers={},
+                           rate_limiter=RateLimiter(),
+                           client_session=SimpleNamespace(post=lambda *args, **kwargs: _Response(status, body)))
+
+
+async def _chunks():
+    yield b"0123"
+
+
+@pytest.mark.parametrize("status, body, error", [
+    (502, b"<html>Bad Gateway</html>", NetworkError),
+    (200, b"<html>not json</html>", NetworkError),
+    (200, b'{"code": 40000, "message": "too large", "data": {}}', ActionFailed),
+])
+def test_upload_errors(status, body, error):
+    with pytest.raises(error):
+        asyncio.run(utils._upload(_upload_bot(status, body), _chunks(), "a.bin"))
+
+
+def test_upload_returns_url():
+    body = b'{"code": 0, "message": "", "data": {"url": "https://img.kaiheila.cn/assets/a.bin"}}'
+    assert asyncio.run(utils._upload(_upload_bot(200, body), _chunks(), "a.bin"))[0] == \
+        "https://img.kaiheila.cn/assets/a.bin"
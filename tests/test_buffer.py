@@ -0,0 +1,87 @@
+import asyncio
+
+from nonebot_adapter_kaiheila.bot import Buffer
+
+
+def _frame(sn):
+    return {"s": 0, "sn": sn, "d": {"sn": sn}}
+
+
+def _drain(buffer):
+    items = []
+    while not buffer._queue.empty():
+        items.append(buffer._queue.get_nowait()["sn"])
+    return items
+
+
+def test_reorders_out_of_order_frames():
+    async def main():
+        buffer = Buffer(max_depth=10, gap_timeout=None)
+        for sn in (1, 3, 5, 2, 4, 6):
+            buffer.add_result(_frame(sn))
+        assert _drain(buffer) == [1, 2, 3, 4, 5, 6]
+        assert buffer.depth == 0
+        assert buffer.stats["peak_depth"] == 3  # 3, 5 与刚到达的 2
+
+    asyncio.run(main())
+
+
+def test_drops_duplicated_and_stale_frames():
+    async def main():
+        buffer = Buffer(max_depth=10, gap_timeout=None)
+        for sn in (1, 2, 4, 2, 4, 1):
+            buffer.add_result(_frame(sn))
+        assert _drain(buffer) == [1, 2]
+        assert buffer.depth == 1
+        assert buffer.duplicated == 3
+
+    asyncio.run(main())
+
+
+def test_max_depth_skips_the_gap():
+    async def main():
+        buffer = Buffer(max_depth=3, gap_timeout=None)
+        for sn in (1, 3, 4, 5, 6):
+            buffer.add_result(_frame(sn))
+        assert _drain(buffer) == [1, 3, 4, 5, 6]
+        assert (buffer.gaps, buffer.skipped) == (1, 1)
+
+    asyncio.run(main())
+
+
+def test_gap_timeout_skips_the_gap():
+    async def main():
+        buffer = Buffer(max_depth=10, gap_timeout=0.05)
+        for sn in (1, 4, 5):
+            buffer.add_result(_frame(sn))
+        assert _drain(buffer) == [1]
+        await asyncio.sleep(0.1)
+        assert _drain(buffer) == [4, 5]
+        assert (buffer.gaps, buffer.skipped) == (1, 2)
+
+    asyncio.run(main())
+
+
+def test_late_frame_cancels_gap_timer():
+    async def main():
+        buffer = Buffer(max_depth=10, gap_timeout=0.05)
+        for sn in (1, 3, 2):
+            buffer.add_result(_frame(sn))
+        await asyncio.sleep(0.1)
+        assert _drain(buffer) == [1, 2, 3]
+        assert buffer.gaps == 0
+
+    asyncio.run(main())
+
+
+def test_reconnect_resets_start_sn():
+    async def main():
+        buffer = Buffer(max_depth=10, gap_timeout=None)
+        for sn in (1, 3):
+            buffer.add_result(_frame(sn))
+        buffer.add_result({"s": 5, "d": {"code": 41008}})
+        buffer.add_result(_frame(1))
+        assert _drain(buffer) == [1, 1]
+        assert buffer.depth == 0 and buffer.resyncs == 1
+
+    asyncio.run(main())
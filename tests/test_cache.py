@@ -0,0 +1,152 @@
+import time
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila.cache import LRUCache, MessageCache, StateCache
+from nonebot_adapter_kaiheila.event import User, Guild, Reply
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_lru_entries_expire(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=10, ttl=5.)
+    cache.set("a", 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert "a" not in cache
+    assert cache.stats["misses"] == 1
+
+
+def test_state_cache_indexes_guild_channels_and_roles():
+    state = StateCache()
+    state.put_guild(Guild.parse_obj({"id": "g", "roles": [{"role_id": 1, "name": "admin"}],
+                                     "channels": [{"id": "c1"}, {"id": "c2", "guild_id": "g"}]}))
+    assert [channel.id_ for channel in state.get_channels("g")] == ["c1", "c2"]
+    assert state.get_role("g", 1).name == "admin"
+    state.remove_guild("g")
+    assert state.get_channel("c1") is None and state.get_roles("g") == []
+
+
+def _reply(msg_id):
+    return Reply.parse_obj({"id": msg_id})
+
+
+def test_message_cache_bounds_channels_and_messages():
+    cache = MessageCache(per_channel=2, max_channels=2)
+    for msg_id in ("1", "2", "3"):
+        cache.add("a", _reply(msg_id))
+    assert cache.get("1") is None and cache.get("3").id_ == "3"
+    cache.add("b", _reply("4"))
+    cache.add("c", _reply("5"))  # 频道 a 最久未使用，被整体淘汰
+    assert cache.get("3") is None
+    assert cache.stats["channels"] == 2 and cache.stats["messages"] == 2
+
+
+def test_concurrent_fetches_share_one_load():
+    async def main():
+        cache = MessageCache()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return _reply("m")
+
+        results = await asyncio.gather(*(cache.fetch("m", "a", load) for _ in range(5)))
+        assert {reply.id_ for reply in results} == {"m"}
+        assert calls == 1 and cache.shared == 4
+        assert (await cache.fetch("m", "a", load)).id_ == "m" and calls == 1
+
+    asyncio.run(main())
+
+
+def test_failed_fetch_reaches_every_waiter():
+    async def main():
+        cache = MessageCache()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise LookupError("gone")
+
+        results = await asyncio.gather(*(cache.fetch("m", "a", load) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, LookupError) for result in results)
+        assert cache.stats["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_loader_does_not_strand_waiters():
+    async def main():
+        cache = MessageCache()
+
+        async def load():
+            await asyncio.sleep(0.05)
+            return _reply("m")
+
+        leader = asyncio.create_task(cache.fetch("m", "a", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.fetch("m", "a", load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert (await asyncio.wait_for(waiter, 1)).id_ == "m"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert cache.stats["inflight"] == 0
+
+    asyncio.run(main())
+
+
+class FillBot:
+    """列表接口返回 ``count`` 个服务器，``/guild/view`` 记录并发数，``failing`` 中的服务器查询失败"""
+
+    def __init__(self, count, failing=()):
+        self.count = count
+        self.failing = set(failing)
+        self.viewed = []
+        self.running = self.peak = 0
+
+    async def iter_guilds(self):
+        for i in range(self.count):
+            yield Guild.parse_obj({"id": f"g{i}", "name": f"guild {i}"})
+
+    async def user_me(self):
+        return User.parse_obj({"id": "me"})
+
+    async def call_api(self, endpoint, params=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        guild_id = params["guild_id"]
+        self.viewed.append(guild_id)
+        if guild_id in self.failing:
+            raise RuntimeError("view failed")
+        return {"id": guild_id, "name": "viewed", "channels": [{"id": f"{guild_id}-c", "guild_id": guild_id}]}
+
+
+def test_fill_bounds_concurrency_and_caps_viewed_guilds():
+    state, bot = StateCache(), FillBot(10, failing={"g1"})
+    asyncio.run(state.fill(bot, concurrency=3, max_guilds=5))
+    assert state.ready and state.me.id_ == "me"
+    assert bot.peak == 3
+    assert sorted(bot.viewed) == [f"g{i}" for i in range(5)]
+    assert len(state.guilds) == 10
+    assert state.get_guild("g0").name == "viewed" and state.get_channel("g0-c") is not None
+    # 查询失败与超出上限的服务器只有列表中的信息
+    assert state.get_guild("g1").name == "guild 1"
+    assert state.get_guild("g9").name == "guild 9"
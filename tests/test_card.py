@@ -0,0 +1,41 @@
+import json
+
+from nonebot_adapter_kaiheila.card import Card, CardTemplate, var, plain_text
+from nonebot_adapter_kaiheila.message import MessageSegment
+
+
+def test_card_template_renders_escaped_values():
+    template = CardTemplate(Card().section(var("name")))
+    rendered = MessageSegment.card(template, {"name": 'a "quoted" name'})
+    assert rendered.type == 10
+    assert '"a \\"quoted\\" name"' in rendered.data["content"]
+
+
+def test_card_serializes_to_kaiheila_json():
+    card = Card(theme="primary").header("Title").section("**hi**").divider().images("http://x/a.png")
+    content = json.loads(MessageSegment.card(card).data["content"])
+    assert content[0]["type"] == "card" and content[0]["theme"] == "primary"
+    assert [module["type"] for module in content[0]["modules"]] == ["header", "section", "divider", "image-group"]
+
+
+def test_template_matches_direct_serialization():
+    card = Card().header(var("title")).section(var("body"))
+    direct = Card().header("T").section("B")
+    assert json.loads(card.compile().render({"title": "T", "body": "B"})) == json.loads(
+        MessageSegment.card(direct).data["content"])
+
+
+def test_whole_field_placeholders_render_as_json_values():
+    card = Card().section(plain_text(var("text"), emoji=var("emoji"))).countdown(var("end"))
+    template = card.compile()
+    content = json.loads(template.render(text='hi "there"', emoji=False, end=1613998052318))
+    assert content[0]["modules"][0]["text"] == {"type": "plain-text", "content": 'hi "there"', "emoji": False}
+    assert content[0]["modules"][1]["endTime"] == 1613998052318
+
+
+def test_embedded_placeholders_render_as_strings():
+    # 被转义的引号不是字符串边界
+    template = Card().header(f"{var('n')} 个").section(f'"{var("m")}"').compile()
+    content = json.loads(template.render(n=3, m=True))
+    assert content[0]["modules"][0]["text"]["content"] == "3 个"
+    assert content[0]["modules"][1]["text"]["content"] == '"True"'
@@ -0,0 +1,83 @@
+import uuid
+import asyncio
+
+from nonebot_adapter_kaiheila.event import ReactionBatchEvent, GroupMessageEvent, GuildMemberPresenceBatchEvent
+
+from bots import make_bot
+from frames import FRAMES
+
+
+def _frame(template, **body):
+    frame = {**template, "msg_id": str(uuid.uuid4()), "extra": {**template["extra"]}}
+    frame["extra"]["body"] = {**template["extra"]["body"], **body}
+    return frame
+
+
+def _reaction(user_id, added=True, emoji="[#128077;]", msg_id="m1"):
+    frame = _frame(FRAMES[3], user_id=user_id, msg_id=msg_id, emoji={"id": emoji, "name": emoji})
+    frame["extra"]["type"] = "added_reaction" if added else "deleted_reaction"
+    return frame
+
+
+def _presence(user_id, online=True, guild_id="6016000000"):
+    frame = _frame(FRAMES[4], user_id=user_id)
+    frame["target_id"] = guild_id
+    frame["extra"]["type"] = "guild_member_online" if online else "guild_member_offline"
+    return frame
+
+
+def _run(monkeypatch, frames, **config):
+    """依次处理 ``frames``，等窗口结束后返回投递给 nonebot 的事件"""
+    bot = make_bot(monkeypatch, **config)
+    delivered = []
+
+    async def deliver(event):
+        delivered.append(event)
+
+    bot._deliver_event = deliver
+
+    async def main():
+        for frame in frames:
+            await bot._handle_event_data(frame)
+        await asyncio.sleep(0.05)
+        bot.ingest_queue.stop()
+
+    asyncio.run(main())
+    return bot, delivered
+
+
+def test_reactions_are_batched_per_channel(monkeypatch):
+    frames = [_reaction("u1"), _reaction("u1", added=False),  # 抵消
+              _reaction("u2"), _reaction("u3", added=False), _reaction("u2", emoji="[#10084;]")]
+    bot, delivered = _run(monkeypatch, frames, coalesce_window=0.01)
+    assert len(delivered) == 1
+    event = delivered[0]
+    assert isinstance(event, ReactionBatchEvent) and event.collapsed == 1
+    changes = {change.emoji.id_: (change.added, change.deleted) for change in event.changes}
+    assert changes == {"[#128077;]": (["u2"], ["u3"]), "[#10084;]": (["u2"], [])}
+    assert bot.coalescer.stats == {"received": 5, "collapsed": 1, "batches": 1, "pending": 0}
+
+
+def test_presence_is_batched_per_guild(monkeypatch):
+    frames = [_presence("u1"), _presence("u1", online=False),  # 抵消
+              _presence("u2"), _presence("u3", online=False), _presence("u3"), _presence("u3", online=False),
+              _presence("u4", guild_id="6016000001")]
+    _, delivered = _run(monkeypatch, frames, coalesce_window=0.01)
+    assert all(isinstance(event, GuildMemberPresenceBatchEvent) for event in delivered)
+    guilds = {event.target_id: event for event in delivered}
+    assert {change.user_id: change.online for change in guilds["6016000000"].changes} == {"u2": True, "u3": False}
+    assert guilds["6016000000"].collapsed == 1
+    assert [change.user_id for change in guilds["6016000001"].changes] == ["u4"]
+
+
+def test_full_window_is_flushed_early(monkeypatch):
+    frames = [_presence(f"u{i}") for i in range(5)]
+    bot, delivered = _run(monkeypatch, frames, coalesce_window=60., coalesce_max_pending=2)
+    assert sum(len(event.changes) for event in delivered) == 4  # 第 5 个还在窗口中
+    assert bot.coalescer.stats["pending"] == 1
+
+
+def test_other_events_are_not_coalesced(monkeypatch):
+    _, delivered = _run(monkeypatch, [FRAMES[0], _reaction("u1")])
+    assert isinstance(delivered[0], GroupMessageEvent)
+    assert delivered[1].get_event_name() == "notice.channel.added_reaction"
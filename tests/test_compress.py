@@ -0,0 +1,79 @@
+import json
+import zlib
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila.compress import ZLIB_SUFFIX, Inflater
+
+from bots import make_bot
+from frames import FRAMES
+
+PAYLOADS = [json.dumps({"s": 0, "sn": sn, "d": frame}).encode() for sn, frame in enumerate(FRAMES, 1)]
+
+
+def test_independent_frames_round_trip():
+    inflater = Inflater()
+    for payload in PAYLOADS:
+        compressed = zlib.compress(payload)
+        assert Inflater.is_compressed(compressed)
+        assert inflater.feed(compressed) == payload
+    assert inflater.stats["frames"] == len(PAYLOADS)
+    assert inflater.stats["bytes_out"] == sum(map(len, PAYLOADS))
+
+
+def test_zlib_stream_shares_context_across_frames():
+    compressor = zlib.compressobj()
+    inflater = Inflater()
+    for payload in PAYLOADS:
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        assert data.endswith(ZLIB_SUFFIX)
+        assert inflater.feed(data) == payload
+
+
+def test_zlib_stream_frame_split_across_messages():
+    compressor = zlib.compressobj()
+    data = compressor.compress(PAYLOADS[0]) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    inflater = Inflater()
+    assert inflater.feed(data[:len(data) // 2]) is None
+    assert inflater.feed(data[len(data) // 2:]) == PAYLOADS[0]
+
+
+def test_uncompressed_frames_are_detected():
+    assert not Inflater.is_compressed(PAYLOADS[0])
+
+
+def test_reset_after_corrupted_data():
+    inflater = Inflater()
+    with pytest.raises(zlib.error):
+        inflater.feed(b"\x78\x9cnot zlib" + ZLIB_SUFFIX)
+    inflater.reset()
+    assert inflater.feed(zlib.compress(PAYLOADS[0])) == PAYLOADS[0]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_malformed_frames_are_dropped(monkeypatch, compress):
+    bot = make_bot(monkeypatch, compress=compress)
+
+    async def feed():
+        for frame in (b'{"s":0, bad', b"[1, 2]", PAYLOADS[0]):
+            await bot.handle_message(zlib.compress(frame) if compress else frame)
+
+    asyncio.run(feed())
+    assert bot.buffer.stats["received"] == 1
+
+
+def test_inflate_is_chosen_per_connection(monkeypatch):
+    """zlib-stream 的后续分片可能以 { 开头，不能逐帧判断是否压缩"""
+    compressor = zlib.compressobj()
+    chunks = [compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH) for payload in PAYLOADS]
+    bot = make_bot(monkeypatch, compress=True)
+
+    async def feed():
+        for chunk in chunks:
+            await bot.handle_message(chunk)
+
+    asyncio.run(feed())
+    assert bot.inflater.stats["frames"] == len(PAYLOADS)
+    assert bot.buffer.stats["received"] == len(PAYLOADS)
+    assert make_bot(monkeypatch).inflater is None
@@ -0,0 +1,79 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from nonebot_adapter_kaiheila.bot import _complete_event_data
+from nonebot_adapter_kaiheila.decoder import FastDecodeError, json_loads, construct_model
+from nonebot_adapter_kaiheila.event import (Extra, LazyExtra, GroupMessageEvent, PrivateMessageEvent,
+                                            get_event_model)
+
+from frames import FRAMES
+
+BOT = SimpleNamespace(self_id="1000000000")
+
+
+def _decode(frame):
+    """与网关相同：从 bytes 解码并补全 onebot 字段"""
+    data = json_loads(json.dumps(frame).encode())
+    return get_event_model(_complete_event_data(BOT, data))[0], data
+
+
+@pytest.mark.parametrize("frame", FRAMES, ids=lambda frame: str(frame["extra"]["type"]))
+def test_fast_decoder_matches_parse_obj(frame):
+    model, data = _decode(frame)
+    assert model.__event__ != ""  # 解析到具体的事件类型
+    parsed = model.parse_obj(data)
+    constructed = construct_model(model, data)
+    assert type(constructed) is type(parsed)
+    assert constructed.dict() == parsed.dict()
+    assert constructed.get_event_name() == parsed.get_event_name()
+    if parsed.post_type == "message":
+        assert constructed.get_message() == parsed.get_message()
+
+
+@pytest.mark.parametrize("frame", FRAMES, ids=lambda frame: str(frame["extra"]["type"]))
+def test_lazy_extra_matches_extra(frame):
+    model, data = _decode(frame)
+    full = model.parse_obj(data).extra
+    LazyExtra.enabled = True
+    try:
+        for event in (model.parse_obj(data), construct_model(model, data)):
+            assert isinstance(event.extra, LazyExtra)
+            for name in Extra.__fields__:
+                assert getattr(event.extra, name) == getattr(full, name), name
+    finally:
+        LazyExtra.enabled = False
+
+
+def _message_frame(**extra):
+    model, data = _decode(FRAMES[0])
+    data["extra"] = {**data["extra"], **extra}
+    return model, data
+
+
+def test_literal_discriminators_are_checked():
+    model, data = _decode(FRAMES[0])
+    other = PrivateMessageEvent if model is GroupMessageEvent else GroupMessageEvent
+    with pytest.raises(FastDecodeError):
+        construct_model(other, data)
+    with pytest.raises(FastDecodeError):
+        construct_model(model, {**data, "channel_type": "SOMETHING"})
+
+
+def test_field_validators_are_kept():
+    model, data = _message_frame(body={"msg_id": "m"})  # 非系统消息不应该有 body
+    with pytest.raises(FastDecodeError):
+        construct_model(model, data)
+    with pytest.raises(ValidationError):
+        model.parse_obj(data)
+
+
+@pytest.mark.parametrize("extra", [{"author": "not an object"}, {"quote": ["not", "an", "object"]}])
+def test_non_object_sub_models_fall_back(extra):
+    model, data = _message_frame(**extra)
+    with pytest.raises(FastDecodeError):
+        construct_model(model, data)
+    with pytest.raises(FastDecodeError):
+        construct_model(model, {**data, "extra": "not an object"})
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from nonebot_adapter_kaiheila.dedup import BloomFilter, Deduplicator, event_key
+
+from frames import FRAMES
+
+
+@pytest.mark.parametrize("rate", [None, 0.001])
+def test_duplicates_are_dropped(rate):
+    dedup = Deduplicator(window=600., capacity=1000, false_positive_rate=rate)
+    assert [dedup.check(key) for key in ("a", "b", "a", "c", "b")] == [True, True, False, True, False]
+    assert dedup.stats["dropped"] == 2
+
+
+def test_capacity_rotates_generations():
+    dedup = Deduplicator(window=600., capacity=4)
+    for key in "abcdef":
+        assert dedup.check(key)
+    # 每代 2 个：当前 {e, f}，上一代 {c, d}，a, b 已被淘汰
+    assert dedup.stats["size"] <= 4
+    assert not dedup.check("d") and not dedup.check("f")
+    assert dedup.check("a")
+    assert dedup.rotations >= 2
+
+
+def test_window_rotates_generations(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    dedup = Deduplicator(window=10., capacity=1000)
+    dedup.check("a")
+    now[0] += 6
+    dedup.check("b")  # 超过 window / 2，a 所在的一代变为上一代
+    assert not dedup.check("a")
+    now[0] += 6
+    dedup.check("c")
+    assert dedup.check("a")  # 两代之外，已被遗忘
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"in{i}")
+    assert all(f"in{i}" in bloom for i in range(10000))
+    false_positives = sum(f"out{i}" in bloom for i in range(10000))
+    assert false_positives < 200
+
+
+def test_event_key():
+    assert event_key(FRAMES[0]) == FRAMES[0]["msg_id"]
+    without_id = {**FRAMES[0], "msg_id": ""}
+    assert event_key(without_id) == event_key(dict(without_id))
+    assert event_key(without_id) != event_key({**without_id, "msg_timestamp": 1})
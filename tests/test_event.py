@@ -0,0 +1,21 @@
+from nonebot_adapter_kaiheila.event import (Event, MessageEvent, GroupMessageEvent, PrivateMessageEvent, NoticeEvent,
+                                            ChannelEvent, AddedReactionEvent, GuildMemberOnlineEvent,
+                                            get_event_model, get_notice_type)
+
+
+def test_longest_prefix_first_and_event_last():
+    assert get_event_model("notice.channel.added_reaction") == (AddedReactionEvent, ChannelEvent, NoticeEvent, Event)
+    assert get_event_model("message.group.kmarkdown") == (GroupMessageEvent, MessageEvent, Event)
+    assert get_event_model("message.private.text") == (PrivateMessageEvent, MessageEvent, Event)
+
+
+def test_unknown_events_fall_back():
+    assert get_event_model("notice.channel.some_new_event") == (ChannelEvent, NoticeEvent, Event)
+    assert get_event_model("notice.unknown.x") == (NoticeEvent, Event)
+    assert get_event_model("meta_event") == (Event,)
+
+
+def test_notice_type_of_system_messages():
+    assert get_notice_type("added_reaction") == "channel"
+    assert get_notice_type("guild_member_online") == GuildMemberOnlineEvent.__fields__["notice_type"].default
+    assert get_notice_type("not_an_event") is None
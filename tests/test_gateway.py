@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila import bot as bot_module
+from nonebot_adapter_kaiheila.bot import Bot
+
+from bots import SELF_ID, make_bot
+
+BOT = {"client_id": SELF_ID, "token": "token"}
+URL = "wss://ws.kaiheila.cn/gateway?compress=1&token=t"
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """替换网关查询，``answers`` 中的异常依次抛出，之后返回 ``URL``；不真的等待重试间隔"""
+    state = {"answers": [], "calls": 0, "delays": []}
+
+    async def get_gateway(token, compress=False):
+        state["calls"] += 1
+        if state["answers"]:
+            raise state["answers"].pop(0)
+        return URL
+
+    async def sleep(delay):
+        state["delays"].append(delay)
+
+    monkeypatch.setattr(Bot, "get_gateway", get_gateway)
+    monkeypatch.setattr(bot_module.asyncio, "sleep", sleep)
+    return state
+
+
+def test_gateway_is_cached_within_ttl(monkeypatch, gateway):
+    make_bot(monkeypatch, gateway_cache_ttl=60.)
+    assert asyncio.run(Bot._resolve_gateway(BOT)) == URL
+    Bot._unconfirmed_gateways.discard(SELF_ID)  # 收到 hello
+    assert asyncio.run(Bot._resolve_gateway(BOT)) == URL
+    assert gateway["calls"] == 1
+
+
+def test_expired_gateway_is_fetched_again(monkeypatch, gateway):
+    make_bot(monkeypatch, gateway_cache_ttl=60.)
+    asyncio.run(Bot._resolve_gateway(BOT))
+    Bot._unconfirmed_gateways.discard(SELF_ID)
+    Bot.session_store._sessions[SELF_ID]["gateway"]["fetched_at"] -= 61
+    asyncio.run(Bot._resolve_gateway(BOT))
+    assert gateway["calls"] == 2
+
+
+def test_unconfirmed_gateway_is_invalidated(monkeypatch, gateway):
+    bot = make_bot(monkeypatch, gateway_cache_ttl=60.)
+    asyncio.run(Bot._resolve_gateway(BOT))
+    # 没收到 hello 就断开，缓存的地址可能已失效
+    asyncio.run(Bot._resolve_gateway(BOT))
+    assert gateway["calls"] == 2
+    asyncio.run(bot.handle_message(b'{"s": 1, "d": {"code": 0, "session_id": "s"}}'))
+    assert SELF_ID not in Bot._unconfirmed_gateways
+    asyncio.run(Bot._resolve_gateway(BOT))
+    assert gateway["calls"] == 2
+
+
+def test_failures_are_retried_with_exponential_backoff(monkeypatch, gateway):
+    make_bot(monkeypatch, reconnect_interval=1.)
+    gateway["answers"] = [ConnectionError()] * 4 + [asyncio.TimeoutError()] * 4
+    assert asyncio.run(Bot._resolve_gateway(BOT)) == URL
+    assert gateway["calls"] == 9
+    assert gateway["delays"] == [1., 2., 4., 8., 16., 32., 60., 60.]
+
+
+def test_slow_gateway_times_out(monkeypatch, gateway):
+    make_bot(monkeypatch, gateway_timeout=0.01)
+    calls = []
+
+    async def get_gateway(token, compress=False):
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.Event().wait()
+        return URL
+
+    monkeypatch.setattr(Bot, "get_gateway", get_gateway)
+    assert asyncio.run(Bot._resolve_gateway(BOT)) == URL
+    assert len(calls) == 2 and gateway["delays"] == [1.]
@@ -0,0 +1,81 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from nonebot_adapter_kaiheila.heartbeat import Heartbeat
+from nonebot_adapter_kaiheila.session import SessionStore
+
+from bots import SELF_ID, FakeWebSocket
+
+
+class PongWebSocket(FakeWebSocket):
+    """按 ``answers`` 依次决定是否回应每个 ping，用完后连接断开"""
+
+    def __init__(self, answers):
+        super().__init__()
+        self.answers = list(answers)
+        self.heartbeat = None
+
+    async def send(self, data):
+        if not self.answers:
+            raise ConnectionResetError
+        await super().send(data)
+        if self.answers.pop(0):
+            asyncio.get_event_loop().call_soon(self.heartbeat.on_pong)
+
+
+def _heartbeat(answers, max_missed=3):
+    bot = SimpleNamespace(self_id=SELF_ID, session_id="s", request=PongWebSocket(answers),
+                          buffer=SimpleNamespace(sn=7), session_store=SessionStore())
+    heartbeat = bot.request.heartbeat = Heartbeat(bot, interval=30., timeout=0.01, max_missed=max_missed)
+    return heartbeat
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录 run() 中的等待时间而不真的等待"""
+    delays = []
+    sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_ping_carries_latest_sn():
+    heartbeat = _heartbeat([True])
+    assert asyncio.run(heartbeat.ping())
+    assert json.loads(heartbeat.bot.request.sent[0]) == {"s": 2, "sn": 7}
+
+
+def test_missed_pongs_back_off_then_close(sleeps):
+    heartbeat = _heartbeat([False] * 5, max_missed=3)
+    asyncio.run(heartbeat.run())
+    assert heartbeat.dead and heartbeat.bot.request.closed
+    assert heartbeat.pings == 3 and heartbeat.missed == 3 and heartbeat.pongs == 0
+    assert sleeps == [2, 4]
+
+
+def test_pong_resets_missed_count_and_saves_checkpoint(sleeps):
+    heartbeat = _heartbeat([False, False, True, False, False, True])
+    asyncio.run(heartbeat.run())
+    assert not heartbeat.dead
+    assert heartbeat.missed == 4 and heartbeat.pongs == 2
+    assert sleeps == [2, 4, 30., 2, 4, 30.]
+    assert heartbeat.bot.session_store.get(SELF_ID)["sn"] == 7
+
+
+def test_rtt_histogram():
+    heartbeat = _heartbeat([])
+    heartbeat._rtts.extend([10., 60., 80., 150., 700., 7000.])
+    stats = heartbeat.stats
+    assert stats["histogram"] == {"<=50ms": 1, "<=100ms": 2, "<=200ms": 1, "<=500ms": 0, "<=1000ms": 1,
+                                  "<=2000ms": 0, "<=6000ms": 0, ">6000ms": 1}
+    assert stats["min_rtt"] == 10. and stats["max_rtt"] == 7000.
+    assert stats["p50_rtt"] == 150.
+    assert _heartbeat([]).stats["avg_rtt"] is None
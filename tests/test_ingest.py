@@ -0,0 +1,144 @@
+import asyncio
+
+from nonebot_adapter_kaiheila.ingest import IngestQueue, lane_of
+
+
+def test_lane_of():
+    assert lane_of({"post_type": "message"}) == "message"
+    assert lane_of({"post_type": "notice", "sub_type": "added_reaction"}) == "reaction"
+    assert lane_of({"post_type": "notice", "sub_type": "guild_member_online"}) == "presence"
+    assert lane_of({"post_type": "notice", "sub_type": "updated_channel"}) == "notice"
+
+
+def test_higher_priority_lanes_are_handled_first():
+    async def main():
+        queue = IngestQueue(workers=1, max_depth={})
+        handled = []
+
+        def handler(name):
+            async def handle():
+                handled.append(name)
+            return handle
+
+        gate = asyncio.Event()
+        await queue.put("notice", gate.wait)  # 占住唯一的工作协程
+        await asyncio.sleep(0)
+        for lane in ("presence", "reaction", "notice", "message"):
+            await queue.put(lane, handler(lane))
+        gate.set()
+        while queue.depth or queue.busy:
+            await asyncio.sleep(0.001)
+        queue.stop()
+        assert handled == ["message", "notice", "reaction", "presence"]
+
+    asyncio.run(main())
+
+
+def test_shed_lanes_drop_oldest_events():
+    async def main():
+        queue = IngestQueue(workers=1, max_depth={"presence": 2})
+        handled = []
+        gate = asyncio.Event()
+        await queue.put("notice", gate.wait)
+        await asyncio.sleep(0)
+        for i in range(5):
+            async def handle(i=i):
+                handled.append(i)
+            await queue.put("presence", handle)
+        gate.set()
+        while queue.depth or queue.busy:
+            await asyncio.sleep(0.001)
+        queue.stop()
+        assert handled == [3, 4]
+        assert queue.stats["lanes"]["presence"]["shed"] == 3
+
+    asyncio.run(main())
+
+
+def test_full_lanes_block_producers():
+    async def main():
+        queue = IngestQueue(workers=1, max_depth={"message": 2})
+        gate = asyncio.Event()
+        await queue.put("message", gate.wait)
+        await asyncio.sleep(0)
+        for _ in range(2):
+            await queue.put("message", gate.wait)
+        blocked = asyncio.create_task(queue.put("message", gate.wait))
+        await asyncio.sleep(0.02)
+        assert not blocked.done()  # 通道已满 投递被阻塞 形成背压
+        gate.set()
+        await asyncio.wait_for(blocked, 1)
+        queue.stop()
+        lane = queue.stats["lanes"]["message"]
+        assert lane["blocked_time"] > 0.01 and lane["shed"] == 0
+
+    asyncio.run(main())
+
+
+def test_handler_errors_do_not_stop_workers():
+    async def main():
+        queue = IngestQueue(workers=2, max_depth={})
+        handled = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def ok():
+            handled.append(True)
+
+        await queue.put("message", fail)
+        await queue.put("message", ok)
+        while queue.depth or queue.busy:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        queue.stop()
+        assert handled == [True]
+
+    asyncio.run(main())
+
+
+def test_same_key_events_are_handled_in_order():
+    async def main():
+        queue = IngestQueue(workers=4, max_depth={})
+        handled = {"a": [], "b": []}
+
+        def handler(key, i):
+            async def handle():
+                # 先入队的事件处理得更慢，不按 key 串行时会乱序
+                await asyncio.sleep(0.001 * (10 - i))
+                handled[key].append(i)
+            return handle
+
+        for i in range(10):
+            await queue.put("message", handler("a", i), "a")
+            await queue.put("message", handler("b", i), "b")
+        while queue.depth or queue.busy:
+            await asyncio.sleep(0.001)
+        queue.stop()
+        assert handled == {"a": list(range(10)), "b": list(range(10))}
+        assert queue.stats["lanes"]["message"]["handled"] == 20 and queue.deferred == 0
+
+    asyncio.run(main())
+
+
+def test_other_keys_are_not_blocked():
+    async def main():
+        queue = IngestQueue(workers=2, max_depth={})
+        handled = []
+        gate = asyncio.Event()
+
+        async def ok():
+            handled.append("b")
+
+        await queue.put("message", gate.wait, "a")
+        await queue.put("message", gate.wait, "a")
+        await queue.put("message", ok, "b")
+        await asyncio.sleep(0.01)
+        assert handled == ["b"]  # a 的第二个事件排在第一个之后，不占用工作协程
+        assert queue.stats["deferred"] == 1 and queue.depth == 1
+        gate.set()
+        while queue.depth or queue.busy:
+            await asyncio.sleep(0.001)
+        queue.stop()
+
+    asyncio.run(main())
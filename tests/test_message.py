@@ -0,0 +1,59 @@
+import pytest
+
+from nonebot_adapter_kaiheila.message import Message, MessageSegment
+
+KMARKDOWN = [
+    "plain text",
+    "1-6 and a (b) c",
+    "**bold** text",
+    "> quote\nnext line",
+    "(met)1000000000(met) hi (met)all(met)",
+    "(rol)12(rol) see (chn)6177000000(chn)",
+    "(emj)smile(emj)[6016000000/abc] done",
+    "`inline` and ```python\nprint(1)\n```",
+    "[docs](https://developer.kaiheila.cn/doc) \\*not bold\\*",
+    "**(met)1000000000(met) hi**",
+]
+
+
+@pytest.mark.parametrize("content", KMARKDOWN)
+def test_kmarkdown_round_trip(content):
+    message = Message.from_content(9, content)
+    again = Message.from_content(9, message.to_kmarkdown())
+    assert [(seg.type, seg.data) for seg in again] == [(seg.type, seg.data) for seg in message]
+    assert again.extract_plain_text() == message.extract_plain_text()
+
+
+def test_elements_are_split_into_segments():
+    message = Message.from_content(9, "(met)1(met) hi (chn)2(chn)`x`[a](http://b)(emj)e(emj)[3]")
+    assert [seg.type for seg in message] == ["mention", 1, "channel", "code", "link", "emoji"]
+    assert message.mentions == ["1"]
+
+
+def test_plain_text_is_text_even_with_special_characters():
+    message = Message.from_content(9, "/roll 1-6 (d6)")
+    assert len(message) == 1 and message[0].is_text()
+    assert message.extract_plain_text() == "/roll 1-6 (d6)"
+    assert message.to_kmarkdown() == "/roll 1\\-6 \\(d6\\)"
+
+
+def test_plain_text_strips_markup_and_escapes():
+    message = Message.from_content(9, "**bold** ~~gone~~ (spl)secret(spl) \\*star\\*")
+    assert message.extract_plain_text() == "bold gone secret *star*"
+
+
+def test_text_messages_only_split_mentions():
+    message = Message.from_content(1, "**not markdown** (met)1(met)")
+    assert [(seg.type, seg.data) for seg in message] == [(1, {"content": "**not markdown** "}),
+                                                         ("mention", {"user_id": "1"})]
+
+
+def test_building_a_message_escapes_text():
+    message = MessageSegment.mention("1") + " 50% off *today*" + MessageSegment.link("a]b", "http://x")
+    assert message.to_kmarkdown() == "(met)1(met) 50% off \\*today\\*[a\\]b](http://x)"
+
+
+def test_media_segments_cannot_be_written_as_kmarkdown():
+    with pytest.raises(ValueError, match="type 2"):
+        Message([MessageSegment.text("a"), MessageSegment.image("http://x/a.png")]).to_kmarkdown()
+
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+from pydantic import BaseModel
+
+from nonebot_adapter_kaiheila.paginate import paginate
+
+
+class Item(BaseModel):
+    id: int
+
+
+def _bot(page_total=4, page_size=2):
+    """每页 ``page_size`` 个条目；页码越大响应越快，不按顺序完成"""
+    state = SimpleNamespace(started=[], finished=[], cancelled=[])
+
+    async def call_api(endpoint, params):
+        page = params["page"]
+        state.started.append(page)
+        try:
+            await asyncio.sleep(0.001 * (page_total - page))
+        except asyncio.CancelledError:
+            state.cancelled.append(page)
+            raise
+        state.finished.append(page)
+        return {"items": [{"id": (page - 1) * page_size + i} for i in range(page_size)],
+                "meta": {"page": page, "page_total": page_total, "page_size": page_size}}
+
+    bot = SimpleNamespace(call_api=call_api, _parse_model=lambda model, data: model.parse_obj(data))
+    return bot, state
+
+
+def test_items_are_yielded_in_page_order():
+    bot, state = _bot()
+
+    async def main():
+        return [item.id async for item in paginate(bot, "/guild/list", Item, page_size=2, concurrency=3)]
+
+    assert asyncio.run(main()) == list(range(8))
+    assert sorted(state.started) == [1, 2, 3, 4]
+    assert state.finished[1:] == [4, 3, 2]  # 后续页面并发请求，完成顺序与产生顺序无关
+
+
+def test_next_page_is_prefetched():
+    bot, state = _bot()
+
+    async def main():
+        pages = paginate(bot, "/guild/list", Item, page_size=2)
+        await pages.__anext__()
+        await asyncio.sleep(0.01)
+        # 还在消费第一页时第二页已经请求完成，但不会多取
+        assert state.finished == [1, 2]
+        await pages.aclose()
+
+    asyncio.run(main())
+
+
+def test_early_exit_cancels_pending_pages():
+    bot, state = _bot(page_total=10)
+
+    async def main():
+        pages = paginate(bot, "/guild/list", Item, page_size=2, concurrency=4)
+        async for item in pages:
+            if item.id == 2:
+                await asyncio.sleep(0.001)  # 让补上的页面开始请求
+                break
+        await pages.aclose()
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        return tasks
+
+    assert asyncio.run(main()) == set()
+    # 第二页取出后补上第 6 页，提前结束时它还在请求中
+    assert state.started == [1, 2, 3, 4, 5, 6] and state.cancelled == [6]
@@ -0,0 +1,81 @@
+import asyncio
+
+from aiohttp import web
+
+from nonebot_adapter_kaiheila.pool import HTTPPool
+
+
+async def _serve():
+    async def index(request):
+        return web.json_response({"code": 0})
+
+    app = web.Application()
+    app.router.add_get("/", index)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+def test_stats_before_first_request():
+    stats = HTTPPool(limit=10).stats
+    assert stats["limit"] == 10 and stats["in_use"] == 0 and stats["idle"] == 0
+    assert stats["requests"] == 0 and stats["reuse_ratio"] is None
+
+
+def test_keepalive_connections_are_reused():
+    pool = HTTPPool(limit=10, dns_cache_ttl=None)
+
+    async def main():
+        runner, url = await _serve()
+        try:
+            for _ in range(3):
+                async with pool.session.get(url) as resp:
+                    assert (await resp.json())["code"] == 0
+            return pool.stats
+        finally:
+            await pool.close()
+            await runner.cleanup()
+
+    stats = asyncio.run(main())
+    assert stats["requests"] == 3 and stats["failures"] == 0
+    assert stats["connections_created"] == 1 and stats["connections_reused"] == 2
+    assert stats["reuse_ratio"] == 2 / 3
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+
+
+def test_failed_requests_are_counted():
+    pool = HTTPPool()
+
+    async def main():
+        runner, url = await _serve()
+        await runner.cleanup()  # 端口已关闭
+        try:
+            async with pool.session.get(url):
+                pass
+        except Exception:
+            pass
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
+    assert pool.stats["requests"] == 1 and pool.stats["failures"] == 1
+
+
+def test_close_allows_a_new_session():
+    pool = HTTPPool()
+
+    async def main():
+        first = pool.session
+        assert pool.session is first
+        await pool.close()
+        assert first.closed and pool._session is None
+        second = pool.session
+        await pool.close()
+        await pool.close()  # 重复关闭无影响
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is not second and second.closed
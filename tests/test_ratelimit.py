@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+from nonebot_adapter_kaiheila.ratelimit import RateLimiter
+
+
+def _headers(remaining, reset, bucket="message/create", limit=5, **extra):
+    return {"X-Rate-Limit-Limit": str(limit), "X-Rate-Limit-Remaining": str(remaining),
+            "X-Rate-Limit-Reset": str(reset), "X-Rate-Limit-Bucket": bucket, **extra}
+
+
+def test_unknown_endpoint_does_not_wait():
+    async def main():
+        limiter = RateLimiter()
+        assert await limiter.acquire("/message/create") < 0.01
+
+    asyncio.run(main())
+
+
+def test_waits_for_reset_when_bucket_is_exhausted():
+    async def main():
+        limiter = RateLimiter()
+        limiter.update("/message/create", 200, _headers(remaining=1, reset=0.1))
+        assert await limiter.acquire("/message/create") < 0.01
+        waited = await limiter.acquire("/message/create")
+        assert 0.05 < waited < 0.5
+        assert limiter.stats["buckets"]["message/create"]["waited_calls"] == 1
+
+    asyncio.run(main())
+
+
+def test_endpoints_share_a_bucket():
+    async def main():
+        limiter = RateLimiter()
+        limiter.update("/message/create", 200, _headers(remaining=0, reset=0.1))
+        limiter.update("/message/update", 200, _headers(remaining=0, reset=0.1))
+        start = time.monotonic()
+        await asyncio.gather(limiter.acquire("/message/create"), limiter.acquire("/message/update"))
+        assert time.monotonic() - start > 0.05
+        assert list(limiter.stats["buckets"]) == ["message/create"]
+
+    asyncio.run(main())
+
+
+def test_global_limit_blocks_every_endpoint():
+    async def main():
+        limiter = RateLimiter()
+        limiter.update("/message/create", 429, _headers(remaining=0, reset=0.1, **{"X-Rate-Limit-Global": "1"}))
+        waited = await limiter.acquire("/guild/list")
+        assert waited > 0.05
+        assert (limiter.limited, limiter.global_limited) == (1, 1)
+
+    asyncio.run(main())
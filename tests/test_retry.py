@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila import retry
+from nonebot_adapter_kaiheila import bot as bot_module
+from nonebot_adapter_kaiheila.retry import RetryPolicy, CircuitBreaker
+from nonebot_adapter_kaiheila.exception import ActionFailed, NetworkError
+
+from bots import FakeSession, make_bot
+
+OK = (200, b'{"code": 0, "message": "", "data": {"id": "1"}}')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录重试间隔而不真的等待"""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(bot_module.asyncio, "sleep", sleep)
+    return delays
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.)
+    breaker.failure()
+    breaker.failure()
+    breaker.success()  # 成功后重新计数
+    for _ in range(2):
+        breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock[0] += 10
+    assert not breaker.allow() and breaker.retry_after == 20.
+    assert breaker.stats == {"state": "open", "failures": 3, "opened": 1, "rejected": 2, "retry_after": 20.}
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.)
+    breaker.failure()
+    clock[0] += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # 试探请求还没有结果
+    breaker.failure()  # 试探失败 重新打开
+    assert breaker.state == "open" and breaker.opened == 2 and not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def test_abandoned_probe_is_replaced_after_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.)
+    breaker.failure()
+    clock[0] += 30
+    assert breaker.allow()  # 试探请求被取消，没有调用 success/failure
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(backoff_base=0.5, backoff_max=5.)
+    assert [policy.backoff(retry) for retry in range(6)] == [0.5, 1., 2., 4., 5., 5.]
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: low)
+    assert policy.backoff(3) == 0.  # full jitter
+
+
+def test_disabled_breaker_always_allows():
+    policy = RetryPolicy(failure_threshold=0)
+    for _ in range(10):
+        policy.failure("/guild/list")
+    assert policy.allow("/guild/list") and policy.stats["breakers"] == {}
+
+
+def _call(bot, *responses, endpoint="/user/me", method="GET"):
+    bot.client_session = FakeSession(*responses)
+    return asyncio.run(bot.call_api(endpoint, method=method))
+
+
+def test_4xx_is_not_retried_or_counted_by_the_breaker(monkeypatch, sleeps):
+    bot = make_bot(monkeypatch, api_breaker_threshold=2)
+    for _ in range(5):
+        with pytest.raises(NetworkError):
+            _call(bot, (404, b"not found"))
+    with pytest.raises(ActionFailed):
+        _call(bot, (200, b'{"code": 40000, "message": "bad request", "data": {}}'))
+    assert bot.retry_policy.breaker("/user/me").state == "closed"
+    assert bot.retry_policy.stats["attempts"] == 6 and bot.retry_policy.stats["retries"] == 0
+    assert sleeps == []
+
+
+def test_5xx_is_retried_then_opens_the_breaker(monkeypatch, sleeps):
+    bot = make_bot(monkeypatch, api_max_retries=2, api_breaker_threshold=3)
+    assert _call(bot, (502, b""), (503, b""), OK) == {"id": "1"}
+    assert len(sleeps) == 2 and bot.retry_policy.breaker("/user/me").state == "closed"
+
+    with pytest.raises(NetworkError):
+        _call(bot, (502, b""), (502, b""), (502, b""))
+    assert bot.retry_policy.breaker("/user/me").state == "open"
+    # 熔断期间直接失败，不发出请求
+    with pytest.raises(NetworkError):
+        _call(bot)
+    assert bot.client_session.requests == []
+    assert _call(bot, OK, endpoint="/guild/list") == {"id": "1"}  # 其它接口不受影响
+
+
+def test_non_idempotent_requests_are_not_retried_on_5xx(monkeypatch, sleeps):
+    bot = make_bot(monkeypatch, api_max_retries=2)
+    with pytest.raises(NetworkError):
+        _call(bot, (502, b""), OK, endpoint="/message/create", method="POST")
+    assert len(bot.client_session.requests) == 1 and sleeps == []
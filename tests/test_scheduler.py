@@ -0,0 +1,113 @@
+import time
+import asyncio
+
+import pytest
+
+from nonebot_adapter_kaiheila.event import Channel
+from nonebot_adapter_kaiheila.scheduler import SendScheduler
+
+from bots import make_bot
+
+
+def test_lane_keeps_order_and_lanes_run_concurrently():
+    async def main():
+        scheduler = SendScheduler(max_concurrency=4)
+        sent = []
+
+        def job(target_id, i):
+            async def send():
+                await asyncio.sleep(0.01 * (3 - i))  # 先提交的更慢 也必须先发出
+                sent.append((target_id, i))
+                return i
+            return send
+
+        start = time.monotonic()
+        futures = [scheduler.submit(target_id, job(target_id, i)) for i in range(3) for target_id in "abcd"]
+        assert [await future for future in futures] == [i for i in range(3) for _ in "abcd"]
+        for target_id in "abcd":
+            assert [i for t, i in sent if t == target_id] == [0, 1, 2]
+        # 4 个通道并发，总耗时约为一个通道的耗时
+        assert time.monotonic() - start < 0.06 * 2
+
+    asyncio.run(main())
+
+
+def test_max_concurrency_across_lanes():
+    async def main():
+        scheduler = SendScheduler(max_concurrency=2)
+        running = peak = 0
+
+        async def send():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(scheduler.submit(str(i), send) for i in range(8)))
+        assert peak == 2
+
+    asyncio.run(main())
+
+
+def test_slow_mode_spaces_sends():
+    async def main():
+        scheduler = SendScheduler()
+        scheduler.set_slow_mode("a", 0.05)
+        times = []
+
+        async def send():
+            times.append(time.monotonic())
+
+        await asyncio.gather(*(scheduler.submit("a", send) for _ in range(3)))
+        assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+
+    asyncio.run(main())
+
+
+def test_failure_is_delivered_and_lane_continues():
+    async def main():
+        scheduler = SendScheduler()
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def ok():
+            return "ok"
+
+        failed, succeeded = scheduler.submit("a", fail), scheduler.submit("a", ok)
+        with pytest.raises(RuntimeError):
+            await failed
+        assert await succeeded == "ok"
+        assert scheduler.failed == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_job_does_not_stop_the_lane():
+    async def main():
+        scheduler = SendScheduler()
+        cancelled = asyncio.get_event_loop().create_future()
+        cancelled.cancel()
+
+        async def wait_cancelled():  # 如 _send_now 等待的上传被取消
+            await cancelled
+
+        async def ok():
+            return "ok"
+
+        first, second = scheduler.submit("a", wait_cancelled), scheduler.submit("a", ok)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await asyncio.wait_for(second, 1) == "ok"
+        assert scheduler.failed == 1
+
+    asyncio.run(main())
+
+
+def test_channel_slow_mode_is_in_milliseconds(monkeypatch):
+    bot = make_bot(monkeypatch)
+    bot.state.put_channel(Channel.parse_obj({"id": "c", "slow_mode": 5000}))
+    assert bot.send_scheduler._slow_mode == {"c": 5.}
+    bot.state.put_channel(Channel.parse_obj({"id": "c", "slow_mode": 0}))
+    assert bot.send_scheduler._slow_mode == {}
@@ -0,0 +1,67 @@
+import json
+import asyncio
+
+from nonebot_adapter_kaiheila.session import SessionStore
+
+from bots import SELF_ID, make_bot
+
+
+def _hello(session_id, code=0):
+    return json.dumps({"s": 1, "d": {"code": code, "session_id": session_id}}).encode()
+
+
+def _event(sn):
+    return json.dumps({"s": 0, "sn": sn, "d": {}}).encode()
+
+
+def _resuming_bot(monkeypatch, tmp_path):
+    path = tmp_path / "session.json"
+    SessionStore(path).save(SELF_ID, "old", 10)
+    bot = make_bot(monkeypatch, session_file=path)
+    assert bot.resuming and bot.buffer.sn == 10
+    return bot, path
+
+
+def test_resume_sends_sn_and_keeps_checkpoint(monkeypatch, tmp_path):
+    bot, path = _resuming_bot(monkeypatch, tmp_path)
+    asyncio.run(bot.handle_message(_hello("old")))
+    assert json.loads(bot.request.sent[-1]) == {"s": 4, "sn": 10}
+    asyncio.run(bot.handle_message(b'{"s": 6, "d": {}}'))
+    assert not bot.resuming
+    assert SessionStore(path).get(SELF_ID)["session_id"] == "old"
+
+
+def test_resume_mismatch_clears_checkpoint(monkeypatch, tmp_path):
+    bot, path = _resuming_bot(monkeypatch, tmp_path)
+    asyncio.run(bot.handle_message(_hello("new")))
+    assert bot.request.sent == []
+    assert bot.session_id == "new" and not bot.resuming and bot.buffer.sn is None
+    # 收到第一个事件之前重启，不能再 resume 已经失效的会话
+    assert SessionStore(path).get(SELF_ID) is None
+
+    async def first_event():
+        await bot.handle_message(_event(1))
+        bot.session_store.save(bot.self_id, bot.session_id, bot.buffer.sn)
+
+    asyncio.run(first_event())
+    assert SessionStore(path).get(SELF_ID)["session_id"] == "new"
+    assert SessionStore(path).get(SELF_ID)["sn"] == 1
+
+
+def test_failed_hello_drops_session_and_closes(monkeypatch, tmp_path):
+    bot, path = _resuming_bot(monkeypatch, tmp_path)
+    asyncio.run(bot.handle_message(_hello(None, code=40106)))
+    assert bot.request.closed
+    assert bot.session_id is None and not bot.resuming
+    assert SessionStore(path).get(SELF_ID) is None
+
+
+def test_clear_keeps_gateway(tmp_path):
+    store = SessionStore(tmp_path / "session.json")
+    store.save(SELF_ID, "s", 3)
+    store.save_gateway(SELF_ID, "wss://gateway", False)
+    store.clear(SELF_ID)
+    store = SessionStore(tmp_path / "session.json")
+    assert store.get(SELF_ID) is None
+    assert store.get_gateway(SELF_ID, False, 60) == "wss://gateway"
+    assert store.get_gateway(SELF_ID, True, 60) is None
@@ -0,0 +1,94 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+from nonebot_adapter_kaiheila import shard as shard_module
+from nonebot_adapter_kaiheila.shard import Supervisor, shard_of, shard_path, start_reporter
+
+
+def test_configured_shard_wins():
+    assert shard_of({"client_id": "a", "token": "t", "shard": 5}, 4) == 1
+
+
+def test_hash_assignment_is_stable_and_spread():
+    bots = [{"client_id": f"client{i}", "token": "t"} for i in range(400)]
+    shards = [shard_of(bot, 4) for bot in bots]
+    assert shards == [shard_of(bot, 4) for bot in bots]
+    assert all(60 < shards.count(shard) < 140 for shard in range(4))
+
+
+def _crash():
+    """工作进程入口：上报一次统计后以 3 退出"""
+    shard_module._metrics_queue.put({"shard_id": int(os.environ["KAIHEILA_SHARD_ID"]), "pid": os.getpid()})
+    raise SystemExit(3)
+
+
+def test_shard_path():
+    assert shard_path(None, 1) is None
+    assert shard_path(Path("data/session.json"), 2) == Path("data/session.shard2.json")
+    assert shard_path(Path("assets"), 0) == Path("assets.shard0")
+
+
+def test_quick_crashes_back_off(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(shard_module.time, "time", lambda: now[0])
+    supervisor = Supervisor(_crash, shard_count=1, restart_delay=1., max_restart_delay=4., stable_time=30.)
+    worker = supervisor.workers[0]
+    delays = []
+    for uptime in (1., 1., 1., 1., 60., 1.):
+        worker.started_at = now[0]
+        now[0] += uptime
+        worker.process = SimpleNamespace(exitcode=1)
+        supervisor._on_exit(worker)
+        delays.append(worker.restart_at - now[0])
+    assert delays == [1., 2., 4., 4., 1., 1.]
+    assert worker.exitcode == 1
+
+
+def test_exited_workers_are_restarted():
+    supervisor = Supervisor(_crash, shard_count=2, restart_delay=0.01)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline and not all(worker.restarts >= 2 and worker.metrics
+                                                 for worker in supervisor.workers):
+            time.sleep(0.05)
+    finally:
+        supervisor._running = False
+        thread.join()
+    for shard_id, stats in supervisor.stats["shards"].items():
+        assert stats["restarts"] >= 2 and stats["last_exitcode"] == 3
+        assert stats["metrics"]["shard_id"] == shard_id
+    assert all(not worker.process.is_alive() for worker in supervisor.workers)
+
+
+def test_reporter_sends_bot_stats(monkeypatch):
+    metrics = queue.Queue()
+    monkeypatch.setattr(shard_module, "_metrics_queue", metrics)
+    driver = SimpleNamespace(bots={"1": SimpleNamespace(stats={"sent": 1}), "2": object()},
+                             startup=[], shutdown=[])
+    driver.on_startup = driver.startup.append
+    driver.on_shutdown = driver.shutdown.append
+    start_reporter(driver, 3, 0.01)
+
+    async def main():
+        for hook in driver.startup:
+            await hook()
+        await asyncio.sleep(0.05)
+        for hook in driver.shutdown:
+            await hook()
+
+    asyncio.run(main())
+    report = metrics.get_nowait()
+    assert report["shard_id"] == 3 and report["pid"] == os.getpid()
+    assert report["bots"] == {"1": {"sent": 1}}
+
+
+def test_reporter_is_disabled_outside_workers():
+    driver = SimpleNamespace(on_startup=None, on_shutdown=None)
+    start_reporter(driver, 0, 1.)  # 没有 Supervisor 时不注册
@@ -0,0 +1,72 @@
+import os
+import json
+import zlib
+from base64 import b64encode
+
+import pytest
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from nonebot_adapter_kaiheila.webhook import WebhookError, WebhookDecoder
+
+from frames import FRAMES
+
+BOTS = [{"client_id": "plain", "token": "t1", "verify_token": "v1"},
+        {"client_id": "secret", "token": "t2", "verify_token": "v2", "encrypt_key": "key2"},
+        {"client_id": "ws_only", "token": "t3"}]
+
+
+def _encrypt(payload: bytes, key: str) -> str:
+    """开黑啦的加密方式：b64(iv + b64(AES-256-CBC(payload)))"""
+    iv = os.urandom(16)
+    padder = padding.PKCS7(128).padder()
+    encryptor = Cipher(algorithms.AES(key.encode().ljust(32, b"\0")), modes.CBC(iv)).encryptor()
+    ciphertext = encryptor.update(padder.update(payload) + padder.finalize()) + encryptor.finalize()
+    return b64encode(iv + b64encode(ciphertext)).decode()
+
+
+def _body(verify_token: str, **d) -> bytes:
+    return json.dumps({"s": 0, "sn": 1, "d": {**FRAMES[0], "verify_token": verify_token, **d}}).encode()
+
+
+def test_plain_body_is_routed_by_verify_token():
+    self_id, frame = WebhookDecoder(BOTS).decode(_body("v1"))
+    assert self_id == "plain" and frame["d"]["msg_id"] == FRAMES[0]["msg_id"]
+
+
+def test_compressed_and_encrypted_body():
+    encrypted = json.dumps({"encrypt": _encrypt(_body("v2"), "key2")}).encode()
+    for body in (encrypted, zlib.compress(encrypted)):
+        self_id, frame = WebhookDecoder(BOTS).decode(body)
+        assert self_id == "secret" and frame["sn"] == 1
+
+
+def test_challenge_frame():
+    body = json.dumps({"s": 0, "d": {"type": 255, "channel_type": "WEBHOOK_CHALLENGE", "challenge": "abc",
+                                     "verify_token": "v1"}}).encode()
+    _, frame = WebhookDecoder(BOTS).decode(body)
+    assert WebhookDecoder.is_challenge(frame)
+    assert not WebhookDecoder.is_challenge(json.loads(_body("v1")))
+
+
+@pytest.mark.parametrize("body, status", [
+    (b"not json", 400),
+    (b"\x78\x9cbroken", 400),
+    (_body("wrong"), 403),
+    (json.dumps({"encrypt": _encrypt(_body("v2"), "other")}).encode(), 403),
+])
+def test_rejected_bodies(body, status):
+    decoder = WebhookDecoder(BOTS)
+    with pytest.raises(WebhookError) as e:
+        decoder.decode(body)
+    assert e.value.status == status
+    assert decoder.stats["rejected"] == 1
+
+
+def test_stash_is_keyed_by_the_same_body_object():
+    decoder = WebhookDecoder(BOTS, max_pending=2)
+    body = _body("v1")
+    decoder.stash(body, *decoder.decode(body))
+    assert decoder.take(bytes(bytearray(body))) is None  # 内容相同但不是同一个对象
+    assert decoder.take(body)[0] == "plain"
+    assert decoder.take(body) is None